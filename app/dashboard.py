@@ -10,107 +10,30 @@ if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 from datetime import date, timedelta
 
-from services.data_service import (
-    get_kpis,
-    get_top_pages,
-    get_pages_weekly_comparison,
-    get_video_funnel,
-    get_top_countries,
-    get_top_days,
-    get_health,
-    get_yt_channel_daily,
-    get_yt_top_videos,
-    get_engagement_kpis,
-    get_engagement_series,
-    get_utm_aggregate,
-    get_comms_sessions_by_campaign,
-    get_wow_comparatives,
-    get_mtd_vs_prev_month,
-    get_7_vs_28,
-    get_yt_retention_by_video,
-    get_pages_pareto,
-    get_rd_kpis,
-    get_comms_summary,
-    get_quality_signals,
-)
+from services.data_service import get_health, get_quality_signals
+from services.snapshots import load_card
 import plotly.express as px
 from services.report_service import build_weekly_report
 from integrations.slack.client import SlackClient
-from services.ga4_refresh import (
-    refresh_sessions_last_n_days,
-    refresh_events_last_n_days,
-    refresh_pages_last_n_days,
-)
-from services.youtube_refresh import refresh_yt_channel_and_videos
+from services.jobs import ACTIVE_STATUSES, list_jobs, submit_job
 
 
 st.set_page_config(page_title="CLASSPLAY Dashboard", layout="wide")
 
 
-def main() -> None:
-    st.title("CLASSPLAY Dashboard")
-    st.caption("GA4 primeiro; YouTube e RD preparados para integração")
+# Séries acima disso (já reduzidas por LTTB no servidor) são desenhadas em WebGL
+WEBGL_MIN_POINTS = 500
 
-    st.subheader("Período")
-    col1, col2 = st.columns(2)
-    with col1:
-        end = st.date_input("Fim", value=date.today())
-    with col2:
-        start = st.date_input("Início", value=date.today() - timedelta(days=7))
-    if start > end:
-        st.error("Data inicial maior que final")
-        return
+SECTIONS = ["Executivo", "Aquisição & CRM", "Conteúdo & Retenção", "Operação & Saúde"]
 
-    start_s, end_s = start.isoformat(), end.isoformat()
 
+# Cada seção é um fragmento: widgets internos reexecutam só a própria seção, e apenas a seção
+# selecionada é renderizada (as demais não consultam o warehouse nem montam gráficos).
+@st.fragment
+def section_executivo(start_s: str, end_s: str) -> None:
     st.header("KPIs Principais")
-    if st.button("Atualizar dados GA4 (últimos 30 dias)"):
-        try:
-            msgs = []
-            msgs.append(refresh_sessions_last_n_days(30))
-            msgs.append(refresh_events_last_n_days(30))
-            msgs.append(refresh_pages_last_n_days(30))
-            for m in msgs:
-                st.success(m)
-        except Exception as e:
-            st.error(f"Falha ao atualizar GA4: {e}")
-
-    st.subheader("YouTube")
-    colyt1, colyt2 = st.columns(2)
-    with colyt1:
-        yt_days = st.number_input("Dias (YT)", min_value=7, max_value=60, value=30)
-    with colyt2:
-        if st.button("Atualizar YouTube (últimos N dias)"):
-            try:
-                msg = refresh_yt_channel_and_videos(int(yt_days))
-                st.success(msg)
-            except Exception as e:
-                st.error(f"Falha ao atualizar YouTube: {e}")
-
-    # Cards YouTube
-    st.header("YouTube — Evolução diária (views)")
-    try:
-        yt_daily = get_yt_channel_daily(start_s, end_s)
-        if yt_daily:
-            figy = px.line(yt_daily, x="date", y="views")
-            st.plotly_chart(figy, use_container_width=True)
-        else:
-            st.info("Sem dados diários do YouTube no período.")
-    except Exception as e:
-        st.warning(f"Falha ao carregar evolução YouTube: {e}")
-
-    st.header("YouTube — Top vídeos (views)")
-    try:
-        yt_top = get_yt_top_videos(start_s, end_s, 20)
-        if yt_top:
-            figt = px.bar(yt_top, x="views", y="videoId", orientation="h")
-            st.plotly_chart(figt, use_container_width=True)
-        else:
-            st.info("Sem dados de vídeos do YouTube no período.")
-    except Exception as e:
-        st.warning(f"Falha ao carregar Top vídeos YouTube: {e}")
-    kpis = get_kpis(start_s, end_s)
-    eng = get_engagement_kpis(start_s, end_s)
+    kpis = load_card("kpis", start_s, end_s)
+    eng = load_card("engagement_kpis", start_s, end_s)
     k1, k2, k3, k4, k5 = st.columns(5)
     k1.metric("Usuários", int(kpis.get("users", 0)))
     k2.metric("Sessões", int(kpis.get("sessions", 0)))
@@ -119,9 +42,9 @@ def main() -> None:
     k5.metric("Minutos (YT)", int(eng.get("minutes", 0)))
     # Comparativos WoW, MTD e 7v28
     try:
-        wow = get_wow_comparatives(end_s)
-        mtd = get_mtd_vs_prev_month(end_s)
-        v7v28 = get_7_vs_28(end_s)
+        wow = load_card("wow", start_s, end_s)
+        mtd = load_card("mtd", start_s, end_s)
+        v7v28 = load_card("v7v28", start_s, end_s)
         st.caption(
             f"WoW – Sessões: {wow['sessions']['delta_pct']}% | Minutos: {wow['minutes']['delta_pct']}%  •  "
             f"MTD vs M-1 – Sessões: {mtd['sessions']['delta_pct']}% | Minutos: {mtd['minutes']['delta_pct']}%  •  "
@@ -130,9 +53,41 @@ def main() -> None:
     except Exception as e:
         st.caption(f"Comparativos indisponíveis: {e}")
 
+    st.header("Tendência combinada (Sessões × Minutos, últimos dias)")
+    try:
+        eng_series = load_card("engagement_series", start_s, end_s)
+        if eng_series:
+            import pandas as pd
+            df = pd.DataFrame(eng_series)
+            fig_combo = px.line(
+                df,
+                x="date",
+                y=["sessions", "minutes"],
+                labels={"value": "valor", "variable": "métrica"},
+                render_mode="webgl" if len(df) > WEBGL_MIN_POINTS else "svg",
+            )
+            st.plotly_chart(fig_combo, use_container_width=True)
+        else:
+            st.info("Sem dados de engajamento no período.")
+    except Exception as e:
+        st.warning(f"Falha ao carregar tendência combinada: {e}")
+
+    st.header("YouTube — Evolução diária (views)")
+    try:
+        yt_daily = load_card("yt_channel_daily", start_s, end_s)
+        if yt_daily:
+            figy = px.line(
+                yt_daily, x="date", y="views", render_mode="webgl" if len(yt_daily) > WEBGL_MIN_POINTS else "svg"
+            )
+            st.plotly_chart(figy, use_container_width=True)
+        else:
+            st.info("Sem dados diários do YouTube no período.")
+    except Exception as e:
+        st.warning(f"Falha ao carregar evolução YouTube: {e}")
+
     st.header("Top Páginas (Top 10)")
     try:
-        pages = get_top_pages(start_s, end_s, 10)
+        pages = load_card("top_pages", start_s, end_s)
         if pages:
             fig = px.bar(pages, x="pageviews", y="page_title", orientation="h")
             st.plotly_chart(fig, use_container_width=True)
@@ -143,7 +98,7 @@ def main() -> None:
 
     st.header("Comparação Semanal (últimas 8)")
     try:
-        weekly = get_pages_weekly_comparison(8)
+        weekly = load_card("pages_weekly")
         if weekly:
             figw = px.bar(weekly, x="year_week", y="pageviews")
             st.plotly_chart(figw, use_container_width=True)
@@ -152,19 +107,46 @@ def main() -> None:
     except Exception as e:
         st.warning(f"Falha ao carregar comparação semanal: {e}")
 
-    st.header("Funil de Vídeos")
+
+@st.fragment
+def section_aquisicao(start_s: str, end_s: str) -> None:
+    st.header("Aquisição & CRM — UTM e Campanhas")
     try:
-        funnel = get_video_funnel(start_s, end_s)
-        f1, f2, f3 = st.columns(3)
-        f1.metric("Start", funnel.get("start", 0))
-        f2.metric("Progress", funnel.get("progress", 0))
-        f3.metric("Completion %", funnel.get("completion_rate", 0.0))
+        utm = load_card("utm", start_s, end_s)
+        if utm:
+            import pandas as pd
+            dfu = pd.DataFrame(utm)
+            st.bar_chart(dfu.set_index("campaign")["sessions"], use_container_width=True)
+            st.dataframe(dfu, use_container_width=True, hide_index=True)
+        else:
+            st.info("Sem dados UTM no período.")
     except Exception as e:
-        st.warning(f"Falha ao carregar Funil de Vídeos: {e}")
+        st.warning(f"Falha ao carregar UTM: {e}")
+
+    try:
+        # KPIs RD (CTR/leads)
+        rd = load_card("rd_kpis", start_s, end_s)
+        c1, c2, c3, c4, c5 = st.columns(5)
+        c1.metric("Sends", int(rd.get("sends", 0)))
+        c2.metric("Opens", int(rd.get("opens", 0)))
+        c3.metric("Clicks", int(rd.get("clicks", 0)))
+        c4.metric("CTR %", rd.get("ctr_pct", 0.0))
+        c5.metric("Leads (webhook)", int(rd.get("leads", 0)))
+
+        # Resumo D-1/D0/D0–D+2 por campanha
+        summary = load_card("comms_summary")
+        if summary:
+            import pandas as pd
+            dfs = pd.DataFrame(summary)
+            st.dataframe(dfs, use_container_width=True, hide_index=True)
+        else:
+            st.info("Sem resumo de impacto de campanhas (ver mapeamento UTM e dados RD).")
+    except Exception as e:
+        st.warning(f"Falha ao carregar impacto de campanhas: {e}")
 
     st.header("Top Países")
     try:
-        countries = get_top_countries(start_s, end_s, 10)
+        countries = load_card("top_countries", start_s, end_s)
         if countries:
             figc = px.bar(countries, x="users", y="country_id", orientation="h")
             st.plotly_chart(figc, use_container_width=True)
@@ -175,7 +157,7 @@ def main() -> None:
 
     st.header("Top Dias da Semana")
     try:
-        days = get_top_days(start_s, end_s)
+        days = load_card("top_days", start_s, end_s)
         if days:
             figd = px.bar(days, x="weekday", y="users")
             st.plotly_chart(figd, use_container_width=True)
@@ -184,11 +166,25 @@ def main() -> None:
     except Exception as e:
         st.warning(f"Falha ao carregar Top Dias: {e}")
 
+
+@st.fragment
+def section_conteudo(start_s: str, end_s: str) -> None:
+    st.header("YouTube — Top vídeos (views)")
+    try:
+        yt_top = load_card("yt_top_videos", start_s, end_s)
+        if yt_top:
+            figt = px.bar(yt_top, x="views", y="title", orientation="h", hover_data=["videoId"])
+            st.plotly_chart(figt, use_container_width=True)
+        else:
+            st.info("Sem dados de vídeos do YouTube no período.")
+    except Exception as e:
+        st.warning(f"Falha ao carregar Top vídeos YouTube: {e}")
+
     st.header("Conteúdo & Retenção")
     colc1, colc2 = st.columns(2)
     with colc1:
         try:
-            ret = get_yt_retention_by_video(start_s, end_s, 20)
+            ret = load_card("yt_retention", start_s, end_s)
             if ret:
                 import pandas as pd
                 dfr = pd.DataFrame(ret)
@@ -201,7 +197,7 @@ def main() -> None:
             st.warning(f"Falha na retenção YT: {e}")
     with colc2:
         try:
-            pareto = get_pages_pareto(start_s, end_s, 20)
+            pareto = load_card("pages_pareto", start_s, end_s)
             if pareto:
                 import pandas as pd
                 dfp = pd.DataFrame(pareto)
@@ -211,43 +207,70 @@ def main() -> None:
         except Exception as e:
             st.warning(f"Falha no Pareto de páginas: {e}")
 
-    # Aquisição & CRM (MVP)
-    st.header("Aquisição & CRM — UTM e Campanhas")
+    st.header("Funil de Vídeos")
     try:
-        utm = get_utm_aggregate(start_s, end_s, 20)
-        if utm:
-            import pandas as pd
-            dfu = pd.DataFrame(utm)
-            st.bar_chart(dfu.set_index("campaign")["sessions"], use_container_width=True)
-            st.dataframe(dfu, use_container_width=True, hide_index=True)
-        else:
-            st.info("Sem dados UTM no período.")
+        funnel = load_card("video_funnel", start_s, end_s)
+        f1, f2, f3 = st.columns(3)
+        f1.metric("Start", funnel.get("start", 0))
+        f2.metric("Progress", funnel.get("progress", 0))
+        f3.metric("Completion %", funnel.get("completion_rate", 0.0))
     except Exception as e:
-        st.warning(f"Falha ao carregar UTM: {e}")
+        st.warning(f"Falha ao carregar Funil de Vídeos: {e}")
 
-    try:
-        # KPIs RD (CTR/leads)
-        rd = get_rd_kpis(start_s, end_s)
-        c1, c2, c3, c4 = st.columns(4)
-        c1.metric("Sends", int(rd.get("sends", 0)))
-        c2.metric("Opens", int(rd.get("opens", 0)))
-        c3.metric("Clicks", int(rd.get("clicks", 0)))
-        c4.metric("CTR %", rd.get("ctr_pct", 0.0))
+    st.header("Análise de Classes (/classes)")
+    st.caption("Em breve: filtro e ranking específico de páginas de classes.")
 
-        # Resumo D-1/D0/D0–D+2 por campanha
-        summary = get_comms_summary(10)
-        if summary:
-            import pandas as pd
-            dfs = pd.DataFrame(summary)
-            st.dataframe(dfs, use_container_width=True, hide_index=True)
+
+@st.fragment
+def section_refresh() -> None:
+    st.header("Atualização de dados")
+    st.caption("Os refreshes rodam em segundo plano (um por vez); o progresso aparece no topo da página.")
+    if st.button("Atualizar dados GA4 (últimos 30 dias)"):
+        try:
+            job = submit_job("ga4", days=30)
+            st.success(f"GA4: job {job['id']} ({job['status']})")
+        except Exception as e:
+            st.error(f"Falha ao enfileirar GA4: {e}")
+
+    colyt1, colyt2 = st.columns(2)
+    with colyt1:
+        yt_days = st.number_input("Dias (YT)", min_value=7, max_value=60, value=30)
+    with colyt2:
+        if st.button("Atualizar YouTube (últimos N dias)"):
+            try:
+                job = submit_job("youtube", days=int(yt_days))
+                st.success(f"YouTube: job {job['id']} ({job['status']})")
+            except Exception as e:
+                st.error(f"Falha ao enfileirar YouTube: {e}")
+
+
+@st.fragment(run_every="3s")
+def job_status() -> None:
+    """Progresso dos refreshes em segundo plano (de qualquer sessão); recarrega a página ao concluir."""
+    try:
+        jobs = list_jobs(limit=10)
+    except Exception:
+        return
+    for j in jobs:
+        if j["status"] in ACTIVE_STATUSES:
+            st.info(f"Refresh {j['kind']} — {j['status']}: {j.get('step') or 'na fila'}")
+    finished = {j["id"] for j in jobs if j["status"] not in ACTIVE_STATUSES}
+    seen = st.session_state.get("jobs_finished")
+    st.session_state["jobs_finished"] = finished
+    if seen is not None and finished - seen:
+        st.session_state["jobs_notice"] = [j for j in jobs if j["id"] in finished - seen]
+        # Dados novos no warehouse: reexecuta a página inteira para atualizar os cards
+        st.rerun()
+    # Aviso exibido uma vez (na recarga que o job concluído provocou), não em toda reexecução seguinte
+    for j in st.session_state.pop("jobs_notice", []):
+        if j["status"] == "done":
+            st.success(f"Refresh {j['kind']} concluído: {j['message']}")
         else:
-            st.info("Sem resumo de impacto de campanhas (ver mapeamento UTM e dados RD).")
-    except Exception as e:
-        st.warning(f"Falha ao carregar impacto de campanhas: {e}")
+            st.error(f"Refresh {j['kind']} falhou: {j['message']}")
 
-    st.header("Análise de Classes (/classes)")
-    st.caption("Em breve: filtro e ranking específico de páginas de classes.")
 
+@st.fragment
+def section_health(end: date) -> None:
     st.header("Informações dos Dados")
     h = get_health()
     st.json(h)
@@ -289,6 +312,9 @@ def main() -> None:
     except Exception:
         pass
 
+
+@st.fragment
+def section_report(start_s: str, end_s: str) -> None:
     st.header("Envio de Relatório (Slack)")
     top_n = st.number_input("Top N páginas", min_value=5, max_value=20, value=10)
     try:
@@ -307,21 +333,36 @@ def main() -> None:
         except Exception as e:
             st.error(f"Erro no envio Slack: {e}")
 
-    st.header("Tendência combinada (Sessões × Minutos, últimos dias)")
-    try:
-        eng_series = get_engagement_series(start_s, end_s)
-        if eng_series:
-            import pandas as pd
-            df = pd.DataFrame(eng_series)
-            fig_combo = px.line(df, x="date", y=["sessions", "minutes"], labels={"value": "valor", "variable": "métrica"})
-            st.plotly_chart(fig_combo, use_container_width=True)
-        else:
-            st.info("Sem dados de engajamento no período.")
-    except Exception as e:
-        st.warning(f"Falha ao carregar tendência combinada: {e}")
 
+def main() -> None:
+    st.title("CLASSPLAY Dashboard")
+    st.caption("GA4 primeiro; YouTube e RD preparados para integração")
 
-if __name__ == "__main__":
-    main()
+    st.subheader("Período")
+    col1, col2 = st.columns(2)
+    with col1:
+        end = st.date_input("Fim", value=date.today())
+    with col2:
+        start = st.date_input("Início", value=date.today() - timedelta(days=7))
+    if start > end:
+        st.error("Data inicial maior que final")
+        return
+
+    start_s, end_s = start.isoformat(), end.isoformat()
+
+    job_status()
+    section = st.radio("Seção", SECTIONS, horizontal=True, label_visibility="collapsed")
+    if section == "Executivo":
+        section_executivo(start_s, end_s)
+    elif section == "Aquisição & CRM":
+        section_aquisicao(start_s, end_s)
+    elif section == "Conteúdo & Retenção":
+        section_conteudo(start_s, end_s)
+    else:
+        section_refresh()
+        section_health(end)
+        section_report(start_s, end_s)
 
 
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
 from .settings import get_settings
+from .datasets import get_dataset, load_datasets, natural_key
 
-# Espaço reservado para carregadores de config YAML (datasets/views)
-
+# Espaço reservado para carregadores de config YAML (views)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List
+
+import yaml
+
+
+DATASETS_PATH = Path(__file__).resolve().parent / "datasets.yml"
+
+
+@lru_cache(maxsize=1)
+def load_datasets() -> Dict[str, Dict[str, Any]]:
+    """Lê configs/datasets.yml e indexa os datasets por id."""
+    raw = yaml.safe_load(DATASETS_PATH.read_text(encoding="utf-8")) or []
+    return {d["id"]: d for d in raw}
+
+
+def get_dataset(dataset_id: str) -> Dict[str, Any]:
+    datasets = load_datasets()
+    if dataset_id not in datasets:
+        raise KeyError(f"Dataset não registrado em datasets.yml: {dataset_id}")
+    return datasets[dataset_id]
+
+
+def natural_key(dataset_id: str) -> List[str]:
+    """Chave natural do dataset, tomada do check `unique` em datasets.yml."""
+    ds = get_dataset(dataset_id)
+    key = (ds.get("quality_checks") or {}).get("unique") or []
+    if not key:
+        raise ValueError(f"Dataset {dataset_id} sem quality_checks.unique (chave natural)")
+    return list(key)
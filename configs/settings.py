@@ -40,6 +40,9 @@ class Settings:
     rd_token_path: Path | None = (
         Path(os.getenv("RD_TOKEN_PATH")).resolve() if os.getenv("RD_TOKEN_PATH") else None
     )
+    rd_webhook_secret: str | None = os.getenv("RD_WEBHOOK_SECRET")
+    # Campanhas enviadas há mais que isso, com métricas estáveis, deixam de ser consultadas
+    rd_campaign_settle_days: int = int(os.getenv("RD_CAMPAIGN_SETTLE_DAYS", "7"))
     slack_webhook_url: str | None = os.getenv("SLACK_WEBHOOK_URL")
     openrouter_api_key: str | None = os.getenv("OPENROUTER_API_KEY")
 
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from datetime import timezone
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# Renova quando faltar menos que isso para expirar (antes da primeira chamada falhar)
+REFRESH_SKEW_SECONDS = 300
+LOCK_TIMEOUT_SECONDS = 60
+LOCK_STALE_SECONDS = 120
+
+
+@contextmanager
+def file_lock(path: Path, timeout: float = LOCK_TIMEOUT_SECONDS, stale: float = LOCK_STALE_SECONDS) -> Iterator[None]:
+    """Lock entre processos via arquivo `<path>.lock` (O_EXCL); locks abandonados expiram após `stale`."""
+    lock = path.with_name(path.name + ".lock")
+    lock.parent.mkdir(parents=True, exist_ok=True)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(str(lock), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode("ascii"))
+            os.close(fd)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock.stat().st_mtime > stale:
+                    lock.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Timeout aguardando lock {lock}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            lock.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class CredentialManager:
+    """Token OAuth em memória com renovação proativa e single-flight.
+
+    `get()` só lê memória enquanto o token está válido. Perto de expirar (REFRESH_SKEW_SECONDS), uma
+    única thread renova sob o lock do processo e o lock de arquivo: antes de chamar o provedor,
+    relê o arquivo, pois outro processo pode já ter renovado. O token novo é gravado com rename
+    atômico e os ouvintes (`on_rotate`) são notificados para trocar sessões/clientes em cache.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        load: Callable[[Path], Any],
+        refresh: Callable[[Any], Any],
+        dump: Callable[[Any], str],
+        expires_at: Callable[[Any], Optional[float]],
+        skew: float = REFRESH_SKEW_SECONDS,
+    ) -> None:
+        self.path = Path(path)
+        self._load = load
+        self._refresh = refresh
+        self._dump = dump
+        self._expires_at = expires_at
+        self.skew = skew
+        self._token: Any = None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Any], None]] = []
+
+    def _fresh(self, token: Any) -> bool:
+        exp = self._expires_at(token)
+        return exp is None or time.time() < exp - self.skew
+
+    def _read(self) -> Any:
+        if not self.path.exists():
+            raise RuntimeError(f"Token ausente em {self.path}. Execute o fluxo OAuth.")
+        return self._load(self.path)
+
+    def on_rotate(self, listener: Callable[[Any], None]) -> None:
+        with self._lock:
+            self._listeners.append(listener)
+
+    def get(self) -> Any:
+        token = self._token
+        if token is not None and self._fresh(token):
+            return token
+        rotated = False
+        with self._lock:
+            token = self._token
+            if token is None:
+                token = self._read()
+            if not self._fresh(token):
+                with file_lock(self.path):
+                    disk = self._read()
+                    if self._fresh(disk):
+                        token = disk
+                    else:
+                        token = self._refresh(disk)
+                        write_atomic(self.path, self._dump(token))
+                rotated = self._token is not None
+            self._token = token
+            listeners = list(self._listeners)
+        if rotated:
+            for listener in listeners:
+                listener(token)
+        return token
+
+
+_managers: Dict[Tuple[str, str], CredentialManager] = {}
+_managers_lock = threading.Lock()
+
+
+def _shared(kind: str, path: Path, factory: Callable[[], CredentialManager]) -> CredentialManager:
+    key = (kind, str(Path(path).resolve()))
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = factory()
+        return _managers[key]
+
+
+def google_credentials(token_path: Path) -> CredentialManager:
+    """Gerenciador compartilhado para tokens OAuth Google (authorized_user JSON: GA4 e YouTube)."""
+
+    def load(path: Path) -> Any:
+        from google.oauth2.credentials import Credentials
+
+        return Credentials.from_authorized_user_file(str(path))
+
+    def refresh(creds: Any) -> Any:
+        from google.auth.transport.requests import Request
+
+        if not creds.refresh_token:
+            return creds
+        creds.refresh(Request())
+        return creds
+
+    def expires_at(creds: Any) -> Optional[float]:
+        if creds.expiry is None:
+            # Validade desconhecida (arquivo sem "expiry"): renova uma vez aqui, sob o lock e com gravação
+            # atômica, em vez de deixar o transporte do google-auth renovar por conta própria
+            return 0.0 if creds.refresh_token else None
+        # google-auth usa datetime ingênuo em UTC
+        return creds.expiry.replace(tzinfo=timezone.utc).timestamp()
+
+    return _shared(
+        "google",
+        token_path,
+        lambda: CredentialManager(token_path, load=load, refresh=refresh, dump=lambda c: c.to_json(), expires_at=expires_at),
+    )
+
+
+RD_TOKEN_ENDPOINT = "https://api.rd.services/auth/token"
+
+
+def rd_credentials(token_path: Path, client_id: str, client_secret: str) -> CredentialManager:
+    """Gerenciador compartilhado para o token OAuth do RD Station (JSON com expires_at)."""
+
+    def load(path: Path) -> Dict[str, Any]:
+        tok = json.loads(path.read_text(encoding="utf-8"))
+        if not tok:
+            raise RuntimeError("Token RD Station ausente. Execute o fluxo OAuth.")
+        return tok
+
+    def refresh(tok: Dict[str, Any]) -> Dict[str, Any]:
+        import requests
+
+        payload = {
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "refresh_token": tok.get("refresh_token"),
+            "grant_type": "refresh_token",
+        }
+        resp = requests.post(RD_TOKEN_ENDPOINT, json=payload, timeout=30)
+        resp.raise_for_status()
+        data = resp.json()
+        new_tok = {
+            "access_token": data.get("access_token"),
+            "refresh_token": data.get("refresh_token", tok.get("refresh_token")),
+            "expires_in": data.get("expires_in"),
+        }
+        if new_tok.get("expires_in"):
+            new_tok["expires_at"] = int(time.time()) + int(new_tok["expires_in"])
+        return new_tok
+
+    def expires_at(tok: Dict[str, Any]) -> Optional[float]:
+        # Sem expires_at conhecido, força renovação (mesmo comportamento do cliente anterior)
+        return float(tok["expires_at"]) if tok.get("expires_at") else 0.0
+
+    return _shared(
+        "rd",
+        token_path,
+        lambda: CredentialManager(
+            token_path,
+            load=load,
+            refresh=refresh,
+            dump=lambda t: json.dumps(t, ensure_ascii=False, indent=2),
+            expires_at=expires_at,
+        ),
+    )
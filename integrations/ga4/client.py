@@ -1,26 +1,26 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Set
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set
 
 import polars as pl
-from google.analytics.data_v1beta import BetaAnalyticsDataClient
-from google.analytics.data_v1beta.types import DateRange, Dimension, Metric, RunReportRequest
-from google.analytics.data_v1beta.types import GetMetadataRequest
-from google.analytics.admin_v1beta import AnalyticsAdminServiceClient
 
 from configs.settings import get_settings
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
+from integrations.auth import CredentialManager, google_credentials
 from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type
 
+if TYPE_CHECKING:
+    from google.analytics.data_v1beta import BetaAnalyticsDataClient
+
 
 @dataclass
 class GA4Client:
     property_id: str
     cache_dir: Path
+    _auth: Optional[CredentialManager] = field(default=None, init=False, repr=False)
+    _data_client: Optional[BetaAnalyticsDataClient] = field(default=None, init=False, repr=False)
 
     @classmethod
     def from_env(cls) -> "GA4Client":
@@ -34,13 +34,27 @@ class GA4Client:
     def _client(self) -> BetaAnalyticsDataClient:
         # Preferência: Service Account via GOOGLE_APPLICATION_CREDENTIALS
         # Alternativa: OAuth Installed App via GA4_OAUTH_TOKEN_PATH
-        token_path = os.getenv("GA4_OAUTH_TOKEN_PATH")
-        if token_path and Path(token_path).exists():
-            creds = Credentials.from_authorized_user_file(token_path)
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            return BetaAnalyticsDataClient(credentials=creds)
-        return BetaAnalyticsDataClient()
+        # O cliente gRPC é reutilizado; só é recriado quando o gerenciador de credenciais rotaciona o token.
+        # SDK importado no primeiro uso: quem só lê o warehouse não paga o custo do gRPC/protobuf.
+        from google.analytics.data_v1beta import BetaAnalyticsDataClient
+
+        if self._auth is None and self._data_client is None:
+            token_path = os.getenv("GA4_OAUTH_TOKEN_PATH")
+            if token_path and Path(token_path).exists():
+                self._auth = google_credentials(Path(token_path))
+                self._auth.on_rotate(self._on_rotate)
+            else:
+                self._data_client = BetaAnalyticsDataClient()
+        if self._auth is None:
+            return self._data_client
+        creds = self._auth.get()
+        client = self._data_client
+        if client is None:
+            client = self._data_client = BetaAnalyticsDataClient(credentials=creds)
+        return client
+
+    def _on_rotate(self, creds: Any) -> None:
+        self._data_client = None
 
     # Cache simples dos metadados (dimensões/métricas válidas)
     _dims_cache: Optional[Set[str]] = None
@@ -74,6 +88,8 @@ class GA4Client:
         retry=retry_if_exception_type((Exception,)),
     )
     def _run_report_once(self, *, dimensions: List[str], metrics: List[str], start_date: str, end_date: str, offset: int, limit: int) -> Any:
+        from google.analytics.data_v1beta.types import DateRange, Dimension, Metric, RunReportRequest
+
         client = self._client()
         request = RunReportRequest(
             property=f"properties/{self.property_id}",
@@ -158,6 +174,8 @@ class GA4Client:
         return target
 
     def fetch_metadata(self) -> Dict[str, Any]:
+        from google.analytics.data_v1beta.types import GetMetadataRequest
+
         client = self._client()
         req = GetMetadataRequest(name=f"properties/{self.property_id}/metadata")
         md = client.get_metadata(req)
@@ -166,6 +184,8 @@ class GA4Client:
         return {"dimensions": dims, "metrics": mets}
 
     def fetch_custom_definitions(self) -> Dict[str, Any]:
+        from google.analytics.admin_v1beta import AnalyticsAdminServiceClient
+
         admin = AnalyticsAdminServiceClient()
         prop = f"properties/{self.property_id}"
         custom_dims = [
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Optional, Iterable, List
+from typing import Any, Dict, Iterator, Optional, Iterable, List, Tuple
 import json
+import os
+import threading
 import time
 import requests
+from requests.adapters import HTTPAdapter
 
 from configs.settings import get_settings
+from integrations.auth import CredentialManager, rd_credentials, write_atomic
+from integrations.rd.rate_limit import AdaptiveRateLimiter, limiter_for
+
+
+# Validade da descoberta de endpoint/dialeto de filtros persistida por conta
+DISCOVERY_TTL_SECONDS = 7 * 24 * 3600
+# Respostas que indicam endpoint/dialeto não suportado (ou recurso inexistente) nesta conta
+REJECTED_STATUSES = (400, 404, 422)
 
 
 @dataclass
@@ -17,6 +29,15 @@ class RDClient:
     redirect_uri: Optional[str] = None
     token_path: Optional[Path] = None
     base_url: str = "https://api.rd.services"
+    max_workers: int = 8
+    # Sessão keep-alive e credenciais compartilhadas pelas threads de um refresh
+    _session: Optional[requests.Session] = field(default=None, init=False, repr=False)
+    _auth: Optional[CredentialManager] = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    discovery_path: Optional[Path] = None
+    # Limitador por conta (client_id), compartilhado por todas as instâncias/threads do processo
+    limiter: Optional[AdaptiveRateLimiter] = None
+    _discovery: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False)
 
     @classmethod
     def from_env(cls) -> "RDClient":
@@ -28,16 +49,13 @@ class RDClient:
             client_secret=s.rd_client_secret,
             redirect_uri=s.rd_redirect_uri,
             token_path=s.rd_token_path,
+            discovery_path=s.data_dir / "api_cache" / "rd" / "discovery.json",
         )
 
     def fetch_leads(self) -> Dict[str, Any]:
         raise NotImplementedError
 
     # --- OAuth helpers ---
-    @staticmethod
-    def _token_endpoint() -> str:
-        return "https://api.rd.services/auth/token"
-
     def load_token(self) -> Dict[str, Any]:
         if not self.token_path or not self.token_path.exists():
             return {}
@@ -49,81 +67,175 @@ class RDClient:
     def save_token(self, token: Dict[str, Any]) -> None:
         if not self.token_path:
             return
-        self.token_path.parent.mkdir(parents=True, exist_ok=True)
-        self.token_path.write_text(json.dumps(token, ensure_ascii=False, indent=2), encoding="utf-8")
+        write_atomic(self.token_path, json.dumps(token, ensure_ascii=False, indent=2))
+
+    def _credentials(self) -> CredentialManager:
+        with self._lock:
+            if self._auth is None:
+                if not self.token_path:
+                    raise RuntimeError("Token RD Station ausente. Execute o fluxo OAuth.")
+                self._auth = rd_credentials(self.token_path, self.client_id, self.client_secret)
+            return self._auth
 
     def _refresh_token_if_needed(self) -> Dict[str, Any]:
-        tok = self.load_token()
-        if not tok:
-            raise RuntimeError("Token RD Station ausente. Execute o fluxo OAuth.")
-        expires_at = tok.get("expires_at")
-        if expires_at and time.time() < expires_at - 60:
-            return tok
-        # refresh
-        payload = {
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "refresh_token": tok.get("refresh_token"),
-            "grant_type": "refresh_token",
-        }
-        resp = requests.post(self._token_endpoint(), json=payload, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-        new_tok = {
-            "access_token": data.get("access_token"),
-            "refresh_token": data.get("refresh_token", tok.get("refresh_token")),
-            "expires_in": data.get("expires_in"),
-        }
-        if new_tok.get("expires_in"):
-            new_tok["expires_at"] = int(time.time()) + int(new_tok["expires_in"])
-        self.save_token(new_tok)
-        return new_tok
+        return self._credentials().get()
 
     def authorized_session(self) -> requests.Session:
-        tok = self._refresh_token_if_needed()
-        s = requests.Session()
-        s.headers.update({"Authorization": f"Bearer {tok.get('access_token')}"})
-        return s
+        """Sessão única por cliente (pool de conexões do tamanho de `max_workers`).
+
+        O token vem do gerenciador compartilhado (memória); a renovação acontece uma única vez,
+        antes de expirar, mesmo com várias threads/processos.
+        """
+        token = self._refresh_token_if_needed()
+        with self._lock:
+            if self._session is None:
+                sess = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(self.max_workers, 10))
+                sess.mount("https://", adapter)
+                sess.mount("http://", adapter)
+                self._session = sess
+            self._session.headers["Authorization"] = f"Bearer {token.get('access_token')}"
+            return self._session
+
+    def _get(
+        self,
+        url: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        attempts: int = 6,
+    ) -> requests.Response:
+        """GET na sessão compartilhada, cadenciado pelo limitador da conta.
+
+        Em 429 o limitador reduz a taxa e pausa pelo Retry-After (para todas as threads); a chamada é
+        refeita até `attempts` vezes antes de devolver a resposta 429 ao chamador.
+        """
+        if self.limiter is None:
+            self.limiter = limiter_for(self.client_id)
+        resp: Optional[requests.Response] = None
+        for _ in range(attempts):
+            self.limiter.acquire()
+            resp = self.authorized_session().get(url, params=params, headers=headers, timeout=30)
+            self.limiter.observe(resp.status_code, resp.headers)
+            if resp.status_code != 429:
+                return resp
+        assert resp is not None
+        return resp
+
+    # --- Descoberta persistida de endpoints (api_cache/rd/discovery.json) ---
+    def _discovered(self, kind: str) -> Optional[Dict[str, Any]]:
+        """Endpoint/variante que já funcionou para `kind`, se ainda dentro do TTL."""
+        with self._lock:
+            if self._discovery is None:
+                self._discovery = {}
+                if self.discovery_path and self.discovery_path.exists():
+                    try:
+                        self._discovery = json.loads(self.discovery_path.read_text(encoding="utf-8"))
+                    except Exception:
+                        self._discovery = {}
+            entry = self._discovery.get(kind)
+        if entry and time.time() - float(entry.get("saved_at", 0)) < DISCOVERY_TTL_SECONDS:
+            return entry
+        return None
+
+    def _save_discovery(self, kind: str, entry: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            disc = dict(self._discovery or {})
+            if entry is None:
+                if kind not in disc:
+                    return
+                disc.pop(kind)
+            else:
+                current = disc.get(kind) or {}
+                if current.get("value") == entry and time.time() - float(current.get("saved_at", 0)) < DISCOVERY_TTL_SECONDS:
+                    return
+                disc[kind] = {"value": entry, "saved_at": int(time.time())}
+            self._discovery = disc
+            if not self.discovery_path:
+                return
+            self.discovery_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.discovery_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(disc, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp, self.discovery_path)
 
     # --- High-level fetchers (best-effort; endpoints podem variar por plano/versionamento) ---
-    def fetch_contacts_paginated(
+    def iter_contact_pages(
         self,
         *,
         updated_start_iso: str,
         updated_end_iso: str,
         page_size: int = 100,
-        max_pages: int = 50,
-    ) -> List[Dict[str, Any]]:
-        """Busca contatos/lead em páginas, filtrando por intervalo de atualização quando suportado.
+        max_pages: Optional[int] = None,
+        start_page: int = 1,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Gera páginas de contatos/leads, filtrando por intervalo de atualização quando suportado.
 
-        Nota: O endpoint e parâmetros podem variar. Tentamos com /platform/contacts e caímos em uma variante comum.
+        Sem limite de páginas por padrão: o consumidor processa cada página e a descarta, então a
+        memória não cresce com o tamanho da base. `start_page` permite retomar uma sincronização.
+        Nota: O endpoint e parâmetros podem variar. Tentamos com /platform/contacts.
         """
-        sess = self.authorized_session()
-        contacts: List[Dict[str, Any]] = []
-        # Tenta endpoint v2
         url = f"{self.base_url}/platform/contacts"
         params = {
-            "page": 1,
+            "page": start_page,
             "size": page_size,
             # Filtros comuns; algumas versões usam updated_at[start]/[end]
             "updated_at[start]": updated_start_iso,
             "updated_at[end]": updated_end_iso,
         }
-        for _ in range(max_pages):
-            resp = sess.get(url, params=params, timeout=30)
+        pages = 0
+        while max_pages is None or pages < max_pages:
+            resp = self._get(url, params=params)
             if resp.status_code == 404:
-                break
+                return
             resp.raise_for_status()
             data = resp.json()
             items = data if isinstance(data, list) else data.get("items") or data.get("contacts") or []
             if not items:
-                break
-            contacts.extend(items)
+                return
+            yield items
+            pages += 1
+            if len(items) < page_size:
+                return
             params["page"] = int(params.get("page", 1)) + 1
-        return contacts
 
+    def fetch_contacts_paginated(
+        self,
+        *,
+        updated_start_iso: str,
+        updated_end_iso: str,
+        page_size: int = 100,
+        max_pages: Optional[int] = 50,
+    ) -> List[Dict[str, Any]]:
+        """Versão em lista de `iter_contact_pages` (carrega tudo em memória; prefira o gerador)."""
+        return [
+            c
+            for page in self.iter_contact_pages(
+                updated_start_iso=updated_start_iso,
+                updated_end_iso=updated_end_iso,
+                page_size=page_size,
+                max_pages=max_pages,
+            )
+            for c in page
+        ]
 
     # --- Email campaigns (best-effort; endpoints podem variar por plano/versionamento) ---
+    def _campaign_pages(self, url: str, params: Dict[str, Any], max_pages: int) -> tuple:
+        """Pagina uma variante. Retorna (itens, status de erro 400/404/422 ou None)."""
+        items_all: List[Dict[str, Any]] = []
+        params = dict(params)
+        for _ in range(max_pages):
+            resp = self._get(url, params=params)
+            if resp.status_code in REJECTED_STATUSES:
+                return items_all, resp.status_code
+            resp.raise_for_status()
+            data = resp.json()
+            items = data if isinstance(data, list) else data.get("items") or data.get("campaigns") or []
+            if not items:
+                break
+            items_all.extend(items)
+            params["page"] = int(params.get("page", 1)) + 1
+        return items_all, None
+
     def fetch_email_campaigns(
         self,
         *,
@@ -132,61 +244,121 @@ class RDClient:
         page_size: int = 100,
         max_pages: int = 50,
     ) -> List[Dict[str, Any]]:
-        sess = self.authorized_session()
-        campaigns: List[Dict[str, Any]] = []
+        """Campanhas de e-mail na janela.
 
-        candidates = [
+        Endpoint base e dialeto do filtro de datas variam por conta/plano. A combinação que funcionou
+        fica em api_cache/rd/discovery.json (TTL DISCOVERY_TTL_SECONDS) e é usada direto nas próximas
+        execuções; só um 400/404/422 nela volta a sondar as alternativas.
+        """
+        bases = [
             f"{self.base_url}/platform/emails/campaigns",
             f"{self.base_url}/marketing/email/campaigns",
         ]
-        for base in candidates:
-            # Tentar múltiplas variantes de filtros de data; se falhar, tentar sem filtro
-            param_variants = [
-                {"page": 1, "size": page_size, "start_date": start_iso, "end_date": end_iso},
-                {"page": 1, "size": page_size, "sent_at[start]": start_iso, "sent_at[end]": end_iso},
-            ]
-            ok = False
-            for variant in param_variants + [{"page": 1, "size": page_size}]:
-                params = dict(variant)
-                for _ in range(max_pages):
-                    resp = sess.get(base, params=params, timeout=30)
-                    if resp.status_code in (400, 422):
-                        # Troca de variante de parâmetros
-                        break
-                    if resp.status_code == 404:
-                        # Tenta próximo endpoint base
-                        break
-                    resp.raise_for_status()
-                    data = resp.json()
-                    items = data if isinstance(data, list) else data.get("items") or data.get("campaigns") or []
-                    if not items:
-                        break
-                    campaigns.extend(items)
-                    params["page"] = int(params.get("page", 1)) + 1
-                    ok = True
-                if ok:
+        # Tentar múltiplas variantes de filtros de data; se falhar, tentar sem filtro
+        variants = {
+            "start_end_date": {"start_date": start_iso, "end_date": end_iso},
+            "sent_at": {"sent_at[start]": start_iso, "sent_at[end]": end_iso},
+            "unfiltered": {},
+        }
+        cached = self._discovered("email_campaigns")
+        if cached:
+            base, variant = cached["value"].get("base"), cached["value"].get("variant")
+            if base in bases and variant in variants:
+                items, err = self._campaign_pages(base, {"page": 1, "size": page_size, **variants[variant]}, max_pages)
+                if err is None:
+                    return items
+            self._save_discovery("email_campaigns", None)
+
+        for base in bases:
+            for name, filters in variants.items():
+                items, err = self._campaign_pages(base, {"page": 1, "size": page_size, **filters}, max_pages)
+                if err == 404:
+                    # Tenta próximo endpoint base
                     break
-            if ok:
-                break
-        return campaigns
+                if err is None and items:
+                    self._save_discovery("email_campaigns", {"base": base, "variant": name})
+                    return items
+        return []
 
-    def fetch_email_metrics(self, campaign_id: str) -> Dict[str, int]:
-        sess = self.authorized_session()
-        endpoints = [
-            f"{self.base_url}/platform/emails/campaigns/{campaign_id}/metrics",
-            f"{self.base_url}/marketing/email/campaigns/{campaign_id}/metrics",
+    @staticmethod
+    def _normalize_metrics(data: Dict[str, Any]) -> Dict[str, int]:
+        # Normaliza chaves comuns
+        sends = data.get("sends") or data.get("delivered") or data.get("sent") or 0
+        opens = data.get("opens") or data.get("unique_opens") or 0
+        clicks = data.get("clicks") or data.get("unique_clicks") or 0
+        return {"sends": int(sends or 0), "opens": int(opens or 0), "clicks": int(clicks or 0)}
+
+    def fetch_email_metrics_conditional(
+        self, campaign_id: str, validators: Optional[Dict[str, Optional[str]]] = None
+    ) -> Tuple[Optional[Dict[str, int]], Optional[Dict[str, Optional[str]]]]:
+        """Métricas com requisição condicional (If-None-Match / If-Modified-Since).
+
+        Retorna (métricas, validadores da resposta); métricas é None quando a API responde 304
+        (inalterado desde os validadores informados). Sem suporte no endpoint, vira um GET comum.
+        Se todos os endpoints recusam a campanha (400/404/422), retorna (None, None): não há
+        métricas a gravar, e a recusa não deve ser confundida com zeros nem com 304.
+        """
+        validators = validators or {}
+        headers: Dict[str, str] = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = str(validators["etag"])
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = str(validators["last_modified"])
+        templates = [
+            f"{self.base_url}/platform/emails/campaigns/{{cid}}/metrics",
+            f"{self.base_url}/marketing/email/campaigns/{{cid}}/metrics",
         ]
-        for url in endpoints:
-            resp = sess.get(url, timeout=30)
-            if resp.status_code == 404:
+        # Endpoint que já respondeu nesta conta é tentado primeiro (evita sondar dois por campanha)
+        cached = self._discovered("email_metrics")
+        known = cached["value"].get("template") if cached else None
+        if known in templates:
+            templates.remove(known)
+            templates.insert(0, known)
+        for tpl in templates:
+            resp = self._get(tpl.format(cid=campaign_id), headers=headers or None)
+            # Recusa pode ser só desta campanha (ex.: removida): o template conhecido só é
+            # substituído quando a alternativa responde para ela
+            if resp.status_code in REJECTED_STATUSES:
                 continue
+            if resp.status_code == 304:
+                return None, dict(validators)
             resp.raise_for_status()
-            data = resp.json()
-            # Normaliza chaves comuns
-            sends = data.get("sends") or data.get("delivered") or data.get("sent") or 0
-            opens = data.get("opens") or data.get("unique_opens") or 0
-            clicks = data.get("clicks") or data.get("unique_clicks") or 0
-            return {"sends": int(sends or 0), "opens": int(opens or 0), "clicks": int(clicks or 0)}
-        return {"sends": 0, "opens": 0, "clicks": 0}
+            self._save_discovery("email_metrics", {"template": tpl})
+            fresh = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+            return self._normalize_metrics(resp.json()), fresh
+        return None, None
+
+    def fetch_email_metrics(self, campaign_id: str) -> Dict[str, int]:
+        metrics, _ = self.fetch_email_metrics_conditional(campaign_id)
+        return metrics or {"sends": 0, "opens": 0, "clicks": 0}
+
+    def fetch_email_metrics_many_conditional(
+        self, validators: Dict[str, Dict[str, Optional[str]]], *, max_workers: Optional[int] = None
+    ) -> Dict[str, Tuple[Optional[Dict[str, int]], Optional[Dict[str, Optional[str]]]]]:
+        """`fetch_email_metrics_conditional` para várias campanhas ({campaignId: validadores}) em paralelo.
 
+        O número de chamadas simultâneas é limitado por `max_workers` (padrão do cliente) para
+        respeitar o rate limit do RD; o ritmo efetivo é o do limitador adaptativo da conta.
+        """
+        ids = [c for c in validators if c]
+        if not ids:
+            return {}
 
+        def one(cid: str) -> Tuple[Optional[Dict[str, int]], Optional[Dict[str, Optional[str]]]]:
+            return self.fetch_email_metrics_conditional(cid, validators.get(cid))
+
+        # Primeira chamada sequencial: autentica e fixa o endpoint antes de abrir o paralelismo
+        out = {ids[0]: one(ids[0])}
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as pool:
+            for cid, res in zip(ids[1:], pool.map(one, ids[1:])):
+                out[cid] = res
+        return out
+
+    def fetch_email_metrics_many(
+        self, campaign_ids: Iterable[str], *, max_workers: Optional[int] = None
+    ) -> Dict[str, Dict[str, int]]:
+        """Métricas de várias campanhas em paralelo, na mesma sessão keep-alive."""
+        res = self.fetch_email_metrics_many_conditional(
+            {c: {} for c in dict.fromkeys(campaign_ids) if c}, max_workers=max_workers
+        )
+        return {cid: m or {"sends": 0, "opens": 0, "clicks": 0} for cid, (m, _) in res.items()}
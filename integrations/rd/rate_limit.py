@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import threading
+import time
+from typing import Callable, Dict, Mapping, Optional
+
+
+def _header_float(headers: Mapping[str, str], *names: str) -> Optional[float]:
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """Retry-After em segundos: aceita delta-seconds ou HTTP-date (RFC 9110)."""
+    seconds = _header_float(headers, "Retry-After")
+    if seconds is not None:
+        return seconds
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class AdaptiveRateLimiter:
+    """Token bucket thread-safe com ajuste AIMD da taxa.
+
+    `acquire()` bloqueia até haver token. `observe()` recebe o status/headers de cada resposta:
+    429 reduz a taxa pela metade e pausa pelo Retry-After; headers de limite com saldo zerado
+    pausam até o reset; respostas bem-sucedidas sobem a taxa aos poucos até `max_rate`.
+    """
+
+    def __init__(
+        self,
+        rate: float = 5.0,
+        burst: int = 10,
+        *,
+        min_rate: float = 0.5,
+        max_rate: float = 30.0,
+        increase: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                else:
+                    wait = (1.0 - self._tokens) / self.rate
+            self._sleep(wait)
+
+    def observe(self, status: int, headers: Optional[Mapping[str, str]] = None) -> None:
+        headers = headers or {}
+        with self._lock:
+            now = self._clock()
+            if status == 429:
+                self.rate = max(self.min_rate, self.rate / 2.0)
+                self._tokens = 0.0
+                retry_after = _retry_after_seconds(headers)
+                pause = retry_after if retry_after is not None else 1.0 / self.rate
+                self._blocked_until = max(self._blocked_until, now + pause)
+                return
+            remaining = _header_float(headers, "RateLimit-Remaining", "X-RateLimit-Remaining")
+            if remaining is not None and remaining <= 0:
+                reset = _header_float(headers, "RateLimit-Reset", "X-RateLimit-Reset")
+                if reset is not None:
+                    # Alguns provedores enviam epoch; converte para segundos restantes
+                    seconds = reset - time.time() if reset > 1e9 else reset
+                    self._blocked_until = max(self._blocked_until, now + max(seconds, 0.0))
+                return
+            if status < 400:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(account: str) -> AdaptiveRateLimiter:
+    """Limitador compartilhado por conta RD (todas as instâncias/threads do processo)."""
+    with _limiters_lock:
+        if account not in _limiters:
+            _limiters[account] = AdaptiveRateLimiter()
+        return _limiters[account]
@@ -5,8 +5,6 @@ import json
 import os
 from typing import Any, Dict
 
-import requests
-
 
 @dataclass
 class SlackClient:
@@ -20,6 +18,8 @@ class SlackClient:
         return cls(webhook_url=url)
 
     def send_text(self, text: str, **kwargs: Any) -> Dict[str, Any]:
+        import requests  # carregado só no envio (o dashboard importa este módulo na inicialização)
+
         payload = {"text": text}
         payload.update(kwargs)
         resp = requests.post(self.webhook_url, data=json.dumps(payload), headers={"Content-Type": "application/json"})
@@ -1,22 +1,182 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
 from pathlib import Path
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 import polars as pl
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
 
 from configs.settings import get_settings
+from integrations.auth import CredentialManager, google_credentials
 
-from configs.settings import get_settings
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+
+DISCOVERY_URLS = {
+    ("youtubeAnalytics", "v2"): "https://youtubeanalytics.googleapis.com/$discovery/rest?version=v2",
+    ("youtube", "v3"): "https://youtube.googleapis.com/$discovery/rest?version=v3",
+}
+VIDEO_METRICS = "views,estimatedMinutesWatched,averageViewDuration"
+# Limite da Analytics API para relatórios de top vídeos (dimensions=video)
+TOP_VIDEOS_PAGE_SIZE = 200
+# Limite de IDs por chamada de videos.list (Data API)
+VIDEOS_LIST_BATCH = 50
+_ISO_DURATION = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?")
+
+
+def _duration_seconds(value: Optional[str]) -> Optional[int]:
+    """Converte duração ISO 8601 do YouTube (ex.: PT1H2M3S) em segundos."""
+    m = _ISO_DURATION.fullmatch(value or "")
+    if not m:
+        return None
+    d, h, mi, sec = (int(x or 0) for x in m.groups())
+    return ((d * 24 + h) * 60 + mi) * 60 + sec
+
+
+# Cache Parquet: dados do YouTube Analytics assentam em ~48–72h. Dados buscados depois disso são
+# definitivos; antes, valem por YT_RECENT_TTL_HOURS.
+YT_SETTLE_HOURS = 72
+YT_RECENT_TTL_HOURS = 6
+# Os dias dos relatórios do YouTube Analytics seguem o horário do Pacífico
+try:
+    YT_TZ: tzinfo = ZoneInfo("America/Los_Angeles")
+except ZoneInfoNotFoundError:  # sem base de fusos (ex.: Windows sem tzdata): PST, o fim de dia mais tardio
+    YT_TZ = timezone(timedelta(hours=-8))
+
+
+def _data_valid(fetched_at: Optional[datetime], day: date, *, settle_hours: int, ttl_hours: int) -> bool:
+    """Dado do `day` do YouTube buscado em `fetched_at` (com fuso) ainda vale?"""
+    if fetched_at is None:
+        return False
+    day_end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=YT_TZ)
+    if fetched_at - day_end >= timedelta(hours=settle_hours):
+        return True
+    return datetime.now(timezone.utc) - fetched_at < timedelta(hours=ttl_hours)
+
+
+def _parse_fetched_at(value: Any) -> Optional[datetime]:
+    try:
+        ts = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else None
+
+
+def _meta_path(path: Path) -> Path:
+    return path.with_name(f"{path.stem}.meta.json")
+
+
+def _shard_fetched_at(path: Path) -> Optional[datetime]:
+    """Momento da busca gravado junto ao shard (o mtime muda em regravações e não serve para isso)."""
+    if not path.exists():
+        return None
+    try:
+        return _parse_fetched_at(json.loads(_meta_path(path).read_text(encoding="utf-8"))["fetched_at"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _write_json_atomic(obj: Any, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(json.dumps(obj), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _write_parquet_atomic(df: pl.DataFrame, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    df.write_parquet(tmp)
+    os.replace(tmp, path)
+
+
+def _write_shard(df: pl.DataFrame, path: Path, fetched_at: datetime) -> None:
+    _write_parquet_atomic(df, path)
+    _write_json_atomic({"fetched_at": fetched_at.isoformat()}, _meta_path(path))
+
+
+def _read_parquet_or_empty(path: Path) -> pl.DataFrame:
+    # Parquet sem colunas marca resposta vazia (mesma convenção do cache GA4)
+    return pl.read_parquet(path) if pl.read_parquet_schema(path) else pl.DataFrame()
+
+
+def _day_range(start_date: str, end_date: str) -> List[date]:
+    d0, d1 = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    return [d0 + timedelta(days=i) for i in range((d1 - d0).days + 1)]
+
+
+def _contiguous(days: List[date]) -> List[tuple]:
+    """Agrupa dias ordenados em intervalos contíguos [(início, fim), ...]."""
+    ranges: List[tuple] = []
+    for d in days:
+        if ranges and d == ranges[-1][1] + timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], d)
+        else:
+            ranges.append((d, d))
+    return ranges
+
+
+# Métricas fracionárias da Analytics API; as demais são contagens (Int64)
+FLOAT_METRICS = {"averageViewDuration", "averageViewPercentage", "averageTimeInPlaylist", "viewerPercentage"}
+
+
+@dataclass
+class ReportSpec:
+    """Consulta da YouTube Analytics API (reports.query) identificada por `name`."""
+
+    name: str
+    dimensions: str
+    metrics: str = VIDEO_METRICS
+    sort: Optional[str] = None
+    filters: Optional[str] = None
+    max_results: Optional[int] = None
+
+    def cache_key(self) -> str:
+        raw = json.dumps([self.dimensions, self.metrics, self.sort, self.filters, self.max_results])
+        return f"{self.name}__{hashlib.sha1(raw.encode('utf-8')).hexdigest()[:10]}"
+
+    @property
+    def by_day(self) -> bool:
+        return self.dimensions.split(",")[0].strip() == "day"
+
+
+def _typed_frame(resp: Dict[str, Any]) -> pl.DataFrame:
+    """Converte a resposta em DataFrame tipado a partir de columnHeaders (DIMENSION → Utf8)."""
+    rows: List[List[Any]] = resp.get("rows", [])
+    headers = resp.get("columnHeaders", [])
+    if not rows:
+        return pl.DataFrame()
+    schema: Dict[str, Any] = {}
+    for h in headers:
+        name = h.get("name")
+        if h.get("columnType") == "DIMENSION":
+            schema[name] = pl.Utf8
+        else:
+            schema[name] = pl.Float64 if name in FLOAT_METRICS or h.get("dataType") == "FLOAT" else pl.Int64
+    cols = list(schema)
+    return pl.DataFrame(
+        {c: [r[i] for r in rows] for i, c in enumerate(cols)}, strict=False
+    ).select([pl.col(c).cast(schema[c], strict=False) for c in cols])
 
 
 @dataclass
 class YouTubeClient:
     api_key: Optional[str] = None
     token_path: Optional[Path] = None
+    cache_dir: Optional[Path] = None
+    # Estado interno: credenciais compartilhadas e um service por thread (httplib2 não é thread-safe)
+    _auth: Optional[CredentialManager] = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _local: threading.local = field(default_factory=threading.local, init=False, repr=False)
 
     @classmethod
     def from_env(cls) -> "YouTubeClient":
@@ -24,50 +184,400 @@ class YouTubeClient:
         token_path = s.yt_oauth_token_path or Path("./yt_token.json").resolve()
         if not token_path.exists() and not s.youtube_api_key:
             raise RuntimeError("Forneça YT_OAUTH_TOKEN_PATH (OAuth) ou YOUTUBE_API_KEY")
-        return cls(api_key=s.youtube_api_key, token_path=token_path)
+        cache_dir = s.data_dir / "api_cache" / "youtube"
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        return cls(api_key=s.youtube_api_key, token_path=token_path, cache_dir=cache_dir)
+
+    def _credentials(self) -> Credentials:
+        """Credenciais do gerenciador compartilhado: leitura em memória, renovação única antes de expirar."""
+        with self._lock:
+            if self._auth is None:
+                if not (self.token_path and Path(self.token_path).exists()):
+                    # Sem OAuth, não é possível usar a Analytics API. O fallback por API key é apenas para Data API.
+                    raise RuntimeError("YouTube Analytics requer OAuth (defina YT_OAUTH_TOKEN_PATH)")
+                self._auth = google_credentials(Path(self.token_path))
+                self._auth.on_rotate(self._on_rotate)
+            auth = self._auth
+        return auth.get()
+
+    def _on_rotate(self, creds: Credentials) -> None:
+        # Token novo (talvez renovado por outro processo): os services de cada thread são recriados
+        self._local = threading.local()
+
+    def _discovery_document(self, api: str, version: str) -> str:
+        """Documento de discovery em cache local (api_cache/youtube), baixado uma única vez."""
+        cache_dir = self.cache_dir or (get_settings().data_dir / "api_cache" / "youtube")
+        path = cache_dir / f"{api}_{version}_discovery.json"
+        if not path.exists():
+            import requests
+
+            resp = requests.get(DISCOVERY_URLS[(api, version)], timeout=30)
+            resp.raise_for_status()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(resp.text, encoding="utf-8")
+            os.replace(tmp, path)
+        return path.read_text(encoding="utf-8")
+
+    def _service(self, api: str, version: str):
+        """Service reutilizado por thread; sem rede para montar o discovery."""
+        from googleapiclient.discovery import build, build_from_document
+        from googleapiclient.errors import UnknownApiNameOrVersion
+
+        creds = self._credentials()
+        services: Dict[tuple, Any] = self._local.__dict__.setdefault("services", {})
+        svc = services.get((api, version))
+        if svc is None:
+            try:
+                # Documento embarcado no google-api-python-client (>= 2.0)
+                svc = build(api, version, credentials=creds, static_discovery=True, cache_discovery=False)
+            except UnknownApiNameOrVersion:
+                svc = build_from_document(self._discovery_document(api, version), credentials=creds)
+            services[(api, version)] = svc
+        return svc
 
     def _yt_service(self):
+        return self._service("youtubeAnalytics", "v2")
+
+    def _data_service(self):
+        """Data API v3: OAuth quando houver token; senão API key (somente dados públicos)."""
         if self.token_path and Path(self.token_path).exists():
-            creds = Credentials.from_authorized_user_file(str(self.token_path))
-            return build("youtubeAnalytics", "v2", credentials=creds)
-        # Sem OAuth, não é possível usar a Analytics API. O fallback por API key é apenas para Data API.
-        raise RuntimeError("YouTube Analytics requer OAuth (defina YT_OAUTH_TOKEN_PATH)")
+            return self._service("youtube", "v3")
+        if not self.api_key:
+            raise RuntimeError("YouTube Data API requer YT_OAUTH_TOKEN_PATH ou YOUTUBE_API_KEY")
+        svc = getattr(self._local, "data_by_key", None)
+        if svc is None:
+            from googleapiclient.discovery import build, build_from_document
+            from googleapiclient.errors import UnknownApiNameOrVersion
 
-    def fetch_channel_daily(self, start_date: str, end_date: str) -> pl.DataFrame:
-        svc = self._yt_service()
-        ids_value = "channel==MINE"
-        query = svc.reports().query(
-            ids=ids_value,
-            startDate=start_date,
-            endDate=end_date,
-            dimensions="day",
-            metrics="views,estimatedMinutesWatched,averageViewDuration",
-            sort="day",
-        )
-        resp = query.execute()
-        rows: List[List[Any]] = resp.get("rows", [])
-        cols: List[str] = [h.get("name") for h in resp.get("columnHeaders", [])]
-        if not rows:
+            try:
+                svc = build("youtube", "v3", developerKey=self.api_key, static_discovery=True, cache_discovery=False)
+            except UnknownApiNameOrVersion:
+                svc = build_from_document(self._discovery_document("youtube", "v3"), developerKey=self.api_key)
+            self._local.data_by_key = svc
+        return svc
+
+    def _channel_video_count(self) -> Optional[int]:
+        """Total de vídeos do canal (Data API); None se indisponível."""
+        try:
+            resp = self._service("youtube", "v3").channels().list(part="statistics", mine=True).execute()
+            items = resp.get("items") or []
+            return int(items[0]["statistics"]["videoCount"]) if items else None
+        except Exception:
+            return None
+
+    def run_report(self, spec: ReportSpec, start_date: str, end_date: str) -> pl.DataFrame:
+        params: Dict[str, Any] = {
+            "ids": "channel==MINE",
+            "startDate": start_date,
+            "endDate": end_date,
+            "dimensions": spec.dimensions,
+            "metrics": spec.metrics,
+        }
+        if spec.sort:
+            params["sort"] = spec.sort
+        if spec.filters:
+            params["filters"] = spec.filters
+        if spec.max_results:
+            params["maxResults"] = spec.max_results
+        return _typed_frame(self._yt_service().reports().query(**params).execute())
+
+    def _cache_root(self) -> Path:
+        return self.cache_dir or (get_settings().data_dir / "api_cache" / "youtube")
+
+    def run_report_cached(
+        self,
+        spec: ReportSpec,
+        start_date: str,
+        end_date: str,
+        *,
+        force: bool = False,
+        settle_hours: int = YT_SETTLE_HOURS,
+        ttl_hours: int = YT_RECENT_TTL_HOURS,
+    ) -> pl.DataFrame:
+        """`run_report` com cache Parquet em api_cache/youtube (equivalente ao `run_report_cached` do GA4).
+
+        Relatórios com dimensão `day` são fatiados por dia: janelas repetidas ou sobrepostas leem os
+        dias em cache e só consultam os dias ausentes ou vencidos (agrupados em intervalos contíguos).
+        Demais relatórios usam um arquivo por janela, com a mesma regra de validade pela data final.
+        """
+        root = self._cache_root() / "reports" / spec.cache_key()
+        if not spec.by_day:
+            target = root / f"{start_date}_{end_date}.parquet"
+            if force or not _data_valid(
+                _shard_fetched_at(target), date.fromisoformat(end_date), settle_hours=settle_hours, ttl_hours=ttl_hours
+            ):
+                fetched_at = datetime.now(timezone.utc)
+                _write_shard(self.run_report(spec, start_date, end_date), target, fetched_at)
+            return _read_parquet_or_empty(target)
+
+        days = _day_range(start_date, end_date)
+        stale = [
+            d for d in days
+            if force or not _data_valid(
+                _shard_fetched_at(root / f"{d}.parquet"), d, settle_hours=settle_hours, ttl_hours=ttl_hours
+            )
+        ]
+        for r0, r1 in _contiguous(stale):
+            fetched_at = datetime.now(timezone.utc)
+            df = self.run_report(spec, r0.isoformat(), r1.isoformat())
+            for d in _day_range(r0.isoformat(), r1.isoformat()):
+                part = df.filter(pl.col("day") == d.isoformat()) if df.width else df
+                _write_shard(part, root / f"{d}.parquet", fetched_at)
+        frames = [f for f in (_read_parquet_or_empty(root / f"{d}.parquet") for d in days) if f.height]
+        if not frames:
             return pl.DataFrame()
-        return pl.DataFrame(rows, schema=cols)
+        return pl.concat(frames, how="vertical_relaxed").sort("day")
+
+    def run_reports(
+        self,
+        specs: Iterable[ReportSpec],
+        start_date: str,
+        end_date: str,
+        *,
+        max_workers: int = 4,
+        on_result: Optional[Callable[[str, pl.DataFrame], None]] = None,
+        cached: bool = True,
+    ) -> Dict[str, pl.DataFrame]:
+        """Executa vários relatórios em paralelo (um service por thread) e devolve {nome: DataFrame}.
 
-    def fetch_top_videos_period(self, start_date: str, end_date: str, max_results: int = 50) -> pl.DataFrame:
-        svc = self._yt_service()
-        ids_value = "channel==MINE"
-        query = svc.reports().query(
-            ids=ids_value,
+        `on_result(nome, df)` é chamado na thread chamadora à medida que cada relatório conclui, de
+        modo que a latência total acompanha o relatório mais lento, não a soma deles. Com `cached`,
+        passa por `run_report_cached`.
+        """
+        specs = list(specs)
+        results: Dict[str, pl.DataFrame] = {}
+        if not specs:
+            return results
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(specs))) as pool:
+            fn = self.run_report_cached if cached else self.run_report
+            futures = {pool.submit(fn, sp, start_date, end_date): sp.name for sp in specs}
+            for fut in as_completed(futures):
+                name = futures[fut]
+                results[name] = fut.result()
+                if on_result:
+                    on_result(name, results[name])
+        return results
+
+    def fetch_channel_daily(self, start_date: str, end_date: str) -> pl.DataFrame:
+        return self.run_report(ReportSpec("channel_daily", dimensions="day", sort="day"), start_date, end_date)
+
+    def _top_videos_page(self, start_date: str, end_date: str, start_index: int, page_size: int) -> tuple:
+        resp = self._yt_service().reports().query(
+            ids="channel==MINE",
             startDate=start_date,
             endDate=end_date,
             dimensions="video",
-            metrics="views,estimatedMinutesWatched,averageViewDuration",
+            metrics=VIDEO_METRICS,
             sort="-views",
-            maxResults=max_results,
-        )
-        resp = query.execute()
-        rows: List[List[Any]] = resp.get("rows", [])
+            maxResults=page_size,
+            startIndex=start_index,
+        ).execute()
         cols: List[str] = [h.get("name") for h in resp.get("columnHeaders", [])]
-        if not rows:
+        return cols, resp.get("rows", [])
+
+    def fetch_top_videos_period(
+        self,
+        start_date: str,
+        end_date: str,
+        max_results: Optional[int] = None,
+        *,
+        page_size: int = TOP_VIDEOS_PAGE_SIZE,
+        max_workers: int = 4,
+        on_page: Optional[Callable[[pl.DataFrame], None]] = None,
+    ) -> pl.DataFrame:
+        """Métricas por vídeo no período, paginando por todo o catálogo (startIndex).
+
+        A primeira página é sequencial; se vier cheia, o total de vídeos do canal (Data API) define
+        as páginas restantes, buscadas em paralelo com no máximo `max_workers` consultas simultâneas
+        (quota). Sem o total, segue sequencialmente até uma página incompleta. `on_page` recebe cada
+        página na thread chamadora, permitindo gravar incrementalmente. `max_results` limita o total.
+        """
+        limit = max_results
+        size = min(page_size, limit) if limit else page_size
+        cols, first = self._top_videos_page(start_date, end_date, 1, size)
+        if not first:
+            return pl.DataFrame()
+
+        frames: List[pl.DataFrame] = []
+
+        def emit(rows: List[List[Any]]) -> None:
+            if not rows:
+                return
+            df = pl.DataFrame(rows, schema=cols, orient="row")
+            frames.append(df)
+            if on_page:
+                on_page(df)
+
+        emit(first)
+        next_index = len(first) + 1
+        more = len(first) == size and (limit is None or len(first) < limit)
+        if more:
+            total = self._channel_video_count()
+            if limit is not None:
+                total = min(total, limit) if total is not None else limit
+            if total is not None and total >= next_index:
+                starts = list(range(next_index, total + 1, size))
+                with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                    futures = [
+                        pool.submit(self._top_videos_page, start_date, end_date, i, min(size, total - i + 1))
+                        for i in starts
+                    ]
+                    for fut in as_completed(futures):
+                        emit(fut.result()[1])
+                    last_full = len(futures[-1].result()[1]) == min(size, total - starts[-1] + 1)
+                next_index = total + 1
+                more = last_full
+            # Cauda sequencial: total desconhecido ou desatualizado (ex.: vídeos não listados com views)
+            while more and (limit is None or next_index <= limit):
+                n = size if limit is None else min(size, limit - next_index + 1)
+                _, rows = self._top_videos_page(start_date, end_date, next_index, n)
+                emit(rows)
+                if len(rows) < n:
+                    break
+                next_index += n
+
+        df_all = pl.concat(frames, how="vertical_relaxed")
+        # Páginas paralelas podem se sobrepor se o ranking mudar entre consultas
+        df_all = df_all.sort("views", descending=True).unique(subset=["video"], keep="first", maintain_order=True)
+        return df_all.head(limit) if limit else df_all
+
+    def fetch_video_daily(
+        self,
+        start_date: str,
+        end_date: str,
+        video_ids: Iterable[str],
+        *,
+        chunk_size: int = 200,
+        max_workers: int = 4,
+        force: bool = False,
+    ) -> pl.DataFrame:
+        """Métricas diárias por vídeo (colunas: day, video, views, estimatedMinutesWatched, averageViewDuration).
+
+        Relatórios de canal não combinam as dimensões day e video; cada consulta cobre um dia e um
+        lote de até `chunk_size` vídeos (filters=video==id1,id2,...). As consultas rodam em paralelo,
+        cada worker com seu próprio service (o cliente HTTP do googleapiclient não é thread-safe;
+        `_yt_service` mantém um por thread). Cache Parquet por dia em api_cache/youtube/video_daily,
+        com a lista de vídeos cobertos: só são consultados dias vencidos ou vídeos novos no dia.
+        """
+        ids = sorted({v for v in video_ids if v})
+        if not ids:
+            return pl.DataFrame()
+        schema = {
+            "day": pl.Utf8,
+            "video": pl.Utf8,
+            "views": pl.Float64,
+            "estimatedMinutesWatched": pl.Float64,
+            "averageViewDuration": pl.Float64,
+        }
+        root = self._cache_root() / "video_daily"
+        days = _day_range(start_date, end_date)
+
+        # Por dia: o índice {vídeo: momento da busca} diz quais linhas do shard ainda valem; só são
+        # consultados vídeos novos no dia ou cujo dado venceu (a validade é por vídeo, não pelo arquivo)
+        cached: Dict[date, pl.DataFrame] = {}
+        index: Dict[date, Dict[str, str]] = {}
+        missing: Dict[date, List[str]] = {}
+        for d in days:
+            shard = root / f"{d}.parquet"
+            index[d] = {} if force or not shard.exists() else self._video_daily_index(root / f"{d}.ids.json")
+            if index[d]:
+                cached[d] = _read_parquet_or_empty(shard)
+            todo = [
+                v for v in ids
+                if not _data_valid(
+                    _parse_fetched_at(index[d].get(v)), d, settle_hours=YT_SETTLE_HOURS, ttl_hours=YT_RECENT_TTL_HOURS
+                )
+            ]
+            if todo:
+                missing[d] = todo
+
+        def run(task: tuple) -> List[List[Any]]:
+            day, chunk = task
+            svc = self._yt_service()
+            resp = svc.reports().query(
+                ids="channel==MINE",
+                startDate=day.isoformat(),
+                endDate=day.isoformat(),
+                dimensions="video",
+                metrics=VIDEO_METRICS,
+                filters="video==" + ",".join(chunk),
+                # Relatórios com dimensions=video exigem sort e maxResults (como em _top_videos_page)
+                sort="-views",
+                maxResults=len(chunk),
+            ).execute()
+            return [[day.isoformat()] + list(r) for r in resp.get("rows", [])]
+
+        tasks = [
+            (d, todo[i : i + chunk_size]) for d, todo in missing.items() for i in range(0, len(todo), chunk_size)
+        ]
+        fetched: Dict[date, List[List[Any]]] = {d: [] for d in missing}
+        fetched_at = datetime.now(timezone.utc).isoformat()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for (d, _), part in zip(tasks, pool.map(run, tasks)):
+                fetched[d].extend(part)
+
+        for d, todo in missing.items():
+            new = pl.DataFrame(fetched[d], schema=schema, orient="row")
+            old = cached.get(d)
+            if old is not None and old.height:
+                # Linhas reconsultadas saem mesmo se o vídeo não voltou na resposta (sem views no dia)
+                new = pl.concat([old.filter(~pl.col("video").is_in(todo)), new], how="vertical_relaxed")
+            _write_parquet_atomic(new, root / f"{d}.parquet")
+            index[d] = {**index[d], **{v: fetched_at for v in todo}}
+            _write_json_atomic(index[d], root / f"{d}.ids.json")
+            cached[d] = new
+
+        frames = [f for f in (cached.get(d) for d in days) if f is not None and f.height]
+        if not frames:
+            return pl.DataFrame()
+        return (
+            pl.concat(frames, how="vertical_relaxed")
+            .cast(schema)
+            .filter(pl.col("video").is_in(ids))
+            .sort(["day", "video"])
+        )
+
+    @staticmethod
+    def _video_daily_index(path: Path) -> Dict[str, str]:
+        try:
+            idx = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        # Formato antigo (lista de IDs sem momento da busca) é tratado como vencido
+        return idx if isinstance(idx, dict) else {}
+
+    def fetch_video_metadata(self, video_ids: Iterable[str], *, max_workers: int = 4) -> pl.DataFrame:
+        """Título, duração e publicação via videos.list, em lotes de 50 IDs por chamada.
+
+        Colunas: videoId, title, duration_sec, published_at (ISO 8601). IDs não retornados
+        (removidos/privados) ficam de fora.
+        """
+        ids = sorted({v for v in video_ids if v})
+        if not ids:
             return pl.DataFrame()
-        return pl.DataFrame(rows, schema=cols)
+        batches = [ids[i : i + VIDEOS_LIST_BATCH] for i in range(0, len(ids), VIDEOS_LIST_BATCH)]
 
+        def run(batch: List[str]) -> List[List[Any]]:
+            resp = self._data_service().videos().list(
+                part="snippet,contentDetails", id=",".join(batch), maxResults=len(batch)
+            ).execute()
+            return [
+                [
+                    it.get("id"),
+                    (it.get("snippet") or {}).get("title"),
+                    _duration_seconds((it.get("contentDetails") or {}).get("duration")),
+                    (it.get("snippet") or {}).get("publishedAt"),
+                ]
+                for it in resp.get("items", [])
+            ]
 
+        rows: List[List[Any]] = []
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for part in pool.map(run, batches):
+                rows.extend(part)
+        return pl.DataFrame(
+            rows,
+            schema={"videoId": pl.Utf8, "title": pl.Utf8, "duration_sec": pl.Int64, "published_at": pl.Utf8},
+            orient="row",
+        )
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+# Garantir que o diretório raiz do projeto esteja no PYTHONPATH
+CURRENT_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+from configs.settings import get_settings
+from services.api_server import ReadOnlyPool, make_api_server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="API HTTP somente leitura dos getters do data_service (JSON/Arrow, ETag, gzip).")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Endereço de escuta (padrão: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8052, help="Porta (padrão: 8052)")
+    parser.add_argument("--idle", type=float, default=5.0, help="Segundos ociosos até liberar o arquivo do warehouse (padrão: 5)")
+    args = parser.parse_args()
+
+    s = get_settings()
+    pool = ReadOnlyPool(s.data_dir / "warehouse" / "warehouse.duckdb", idle_seconds=args.idle)
+    srv = make_api_server(pool, host=args.host, port=args.port)
+    print(f"API em http://{args.host}:{args.port}/api (Ctrl+C para sair)")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
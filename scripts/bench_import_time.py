@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Garantir que o diretório raiz do projeto esteja no PYTHONPATH
+CURRENT_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+
+
+# Módulos carregados na inicialização do dashboard/CLI e orçamento de importação (ms, cumulativo)
+BUDGETS_MS: Dict[str, float] = {
+    "configs.settings": 150,
+    "services.data_service": 400,
+    "services.snapshots": 450,
+    "services.jobs": 250,
+    "services.report_service": 450,
+    "integrations.slack.client": 100,
+}
+# SDKs pesados que esses módulos não podem carregar na importação (só no primeiro uso)
+FORBIDDEN = ("google", "googleapiclient", "grpc", "requests", "polars", "numpy", "pyarrow", "pandas", "tenacity")
+
+
+def profile(module: str) -> Tuple[float, List[Tuple[str, float, float]]]:
+    """Importa `module` num processo novo com -X importtime.
+
+    Retorna (ms cumulativos do módulo, [(módulo, ms próprios, ms cumulativos), ...]).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {module}: {proc.stderr.strip().splitlines()[-1]}")
+    rows: List[Tuple[str, float, float]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us) / 1000.0, int(cum_us) / 1000.0))
+    total = next((cum for name, _, cum in rows if name == module), 0.0)
+    return total, rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Perfil de importação (-X importtime) dos módulos de inicialização.")
+    parser.add_argument("--module", action="append", help="Módulo extra a perfilar (pode repetir)")
+    parser.add_argument("--top", type=int, default=8, help="Dependências mais lentas listadas por módulo (padrão: 8)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplica os orçamentos (máquinas lentas/CI)")
+    parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    args = parser.parse_args()
+
+    modules = dict(BUDGETS_MS)
+    for m in args.module or []:
+        modules.setdefault(m, float("inf"))
+
+    report = []
+    failures: List[str] = []
+    for module, budget in modules.items():
+        total, rows = profile(module)
+        loaded = {name.split(".")[0] for name, _, _ in rows}
+        heavy = sorted(loaded.intersection(FORBIDDEN)) if module in BUDGETS_MS else []
+        over = total > budget * args.scale
+        if over:
+            failures.append(f"{module}: {total:.0f} ms > orçamento {budget * args.scale:.0f} ms")
+        if heavy:
+            failures.append(f"{module}: carrega {', '.join(heavy)} na importação")
+        slowest = sorted(rows, key=lambda r: r[1], reverse=True)[: args.top]
+        report.append({"module": module, "ms": round(total, 1), "budget_ms": budget, "heavy": heavy, "slowest": slowest})
+
+    if args.json:
+        print(json.dumps({"modules": report, "failures": failures}, ensure_ascii=False, indent=2))
+    else:
+        for r in report:
+            print(f"{r['module']:<28} {r['ms']:8.1f} ms  (orçamento {r['budget_ms']:.0f} ms)")
+            for name, self_ms, cum_ms in r["slowest"]:
+                print(f"    {name:<40} {self_ms:7.1f} ms próprio  {cum_ms:8.1f} ms cumulativo")
+        for f in failures:
+            print(f"FALHA: {f}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ if ROOT_DIR not in sys.path:
 
 from configs.settings import get_settings
 from integrations.ga4.csv_fallback import import_ga4_csvs
+from services.warehouse import upsert_dataset
 
 
 def normalize(df: pl.DataFrame) -> pl.DataFrame:
@@ -35,7 +36,11 @@ def to_warehouse(df: pl.DataFrame) -> None:
     con.execute("CREATE TABLE IF NOT EXISTS fact_sessions_by_country (date DATE, country_id TEXT, users BIGINT);")
     con.register("_tmp", df.to_pandas())
     con.execute("INSERT OR REPLACE INTO dim_country SELECT DISTINCT country_id FROM _tmp;")
-    con.execute("INSERT INTO fact_sessions_by_country(date, country_id, users) SELECT CURRENT_DATE, country_id, users FROM _tmp;")
+    upsert_dataset(
+        con,
+        "ga4_sessions_by_country_csv",
+        "SELECT CURRENT_DATE AS date, CAST(country_id AS TEXT) AS country_id, CAST(SUM(users) AS BIGINT) AS users FROM _tmp GROUP BY 2",
+    )
     con.close()
 
 
@@ -15,6 +15,7 @@ if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
 from configs.settings import get_settings
+from services.warehouse import create_table_sql, upsert_dataset
 
 
 RE_TOTAL = re.compile(r"^total( geral)?$", re.IGNORECASE)
@@ -46,16 +47,23 @@ def to_warehouse(df: pl.DataFrame) -> None:
     db_path = s.data_dir / "warehouse" / "warehouse.duckdb"
     con = duckdb.connect(str(db_path))
     con.execute("CREATE TABLE IF NOT EXISTS dim_page (page_path TEXT PRIMARY KEY, page_title TEXT);")
-    con.execute(
-        "CREATE TABLE IF NOT EXISTS fact_sessions (date DATE, pageviews BIGINT, sessions BIGINT, users BIGINT, avg_session_duration DOUBLE);"
-    )
-    # Derivar date se presente
+    con.execute(create_table_sql("ga4_pages_csv"))
     cols = [c for c in ["page_path", "page_title", "pageviews", "users", "avg_session_duration"] if c in df.columns]
     con.register("_tmp", df.select(cols).to_pandas())
     con.execute("INSERT OR REPLACE INTO dim_page SELECT DISTINCT page_path, page_title FROM _tmp;")
-    # Para fact_sessions: sem sessões via CSV, manter NULL; acrescentar por pageviews/users
-    con.execute(
-        "INSERT INTO fact_sessions(date, pageviews, sessions, users, avg_session_duration) SELECT CURRENT_DATE, pageviews, NULL, users, avg_session_duration FROM _tmp;"
+    # Totais do CSV ficam em tabela própria (snapshot do dia por página): gravá-los em fact_sessions
+    # sobrescreveria a linha do GA4 de hoje, que tem a mesma chave natural (date)
+    upsert_dataset(
+        con,
+        "ga4_pages_csv",
+        """
+        SELECT CURRENT_DATE AS date, CAST(page_path AS TEXT) AS page_path, MAX(CAST(page_title AS TEXT)) AS page_title,
+               CAST(SUM(pageviews) AS BIGINT) AS pageviews, CAST(MAX(users) AS BIGINT) AS users,
+               AVG(avg_session_duration) AS avg_session_duration
+        FROM _tmp
+        WHERE page_path IS NOT NULL
+        GROUP BY page_path
+        """,
     )
     con.close()
 
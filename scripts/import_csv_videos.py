@@ -15,6 +15,7 @@ if ROOT_DIR not in sys.path:
 
 from configs.settings import get_settings
 from integrations.ga4.csv_fallback import import_ga4_csvs
+from services.warehouse import upsert_dataset
 
 
 def normalize(df: pl.DataFrame, event_name: str) -> pl.DataFrame:
@@ -35,11 +36,20 @@ def to_warehouse(df: pl.DataFrame) -> None:
     s = get_settings()
     db_path = s.data_dir / "warehouse" / "warehouse.duckdb"
     con = duckdb.connect(str(db_path))
-    con.execute("CREATE TABLE IF NOT EXISTS dim_video (video_title TEXT PRIMARY KEY);")
     con.execute("CREATE TABLE IF NOT EXISTS fact_events (date DATE, event_name TEXT, event_count BIGINT, video_title TEXT);")
     con.register("_tmp", df.to_pandas())
-    con.execute("INSERT OR REPLACE INTO dim_video SELECT DISTINCT video_title FROM _tmp;")
-    con.execute("INSERT INTO fact_events(date, event_name, event_count, video_title) SELECT CURRENT_DATE, event_name, event_count, video_title FROM _tmp;")
+    # fact_events criada pelo init_warehouse não tem video_title (parte da chave natural)
+    con.execute("ALTER TABLE fact_events ADD COLUMN IF NOT EXISTS video_title TEXT;")
+    upsert_dataset(
+        con,
+        "ga4_video_events_csv",
+        """
+        SELECT CURRENT_DATE AS date, CAST(event_name AS TEXT) AS event_name, CAST(video_title AS TEXT) AS video_title,
+               CAST(SUM(event_count) AS BIGINT) AS event_count
+        FROM _tmp
+        GROUP BY 2, 3
+        """,
+    )
     con.close()
 
 
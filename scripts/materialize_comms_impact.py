@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import argparse
 import os
 import sys
 
@@ -19,8 +20,11 @@ from services.comms_impact_refresh import materialize_comms_impact_daily, materi
 
 
 def main() -> None:
-    print(materialize_comms_impact_daily())
-    print(materialize_comms_impact_summary())
+    parser = argparse.ArgumentParser(description="Materializa impacto de campanhas (incremental por padrão).")
+    parser.add_argument("--full", action="store_true", help="Recalcula todas as datas/campanhas")
+    args = parser.parse_args()
+    print(materialize_comms_impact_daily(full=args.full))
+    print(materialize_comms_impact_summary(full=args.full))
 
 
 if __name__ == "__main__":
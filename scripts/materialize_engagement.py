@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import argparse
 import os
 import sys
 
@@ -19,7 +20,10 @@ from services.engagement_refresh import materialize_engagement_daily
 
 
 def main() -> None:
-    print(materialize_engagement_daily())
+    parser = argparse.ArgumentParser(description="Materializa fact_engagement_daily (incremental por padrão).")
+    parser.add_argument("--full", action="store_true", help="Recalcula todo o calendário em vez das datas alteradas")
+    args = parser.parse_args()
+    print(materialize_engagement_daily(full=args.full))
 
 
 if __name__ == "__main__":
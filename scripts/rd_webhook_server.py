@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+# Garantir que o diretório raiz do projeto esteja no PYTHONPATH
+CURRENT_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+from configs.settings import get_settings
+from services.rd_webhook import WEBHOOK_PATH, WebhookFlusher, WebhookLog, make_webhook_server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Receptor local de webhooks do RD Station (conversões, estágio, e-mail).")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Endereço de escuta (padrão: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8051, help="Porta (padrão: 8051)")
+    parser.add_argument("--interval", type=float, default=5.0, help="Segundos entre descargas no warehouse (padrão: 5)")
+    args = parser.parse_args()
+
+    s = get_settings()
+    log = WebhookLog()
+    # Lotes pendentes de uma execução anterior são descarregados já no primeiro ciclo
+    flusher = WebhookFlusher(
+        log,
+        interval=args.interval,
+        on_flush=lambda n: print(f"{n} eventos gravados no warehouse"),
+        on_error=lambda e: print(f"Falha ao descarregar webhooks RD: {type(e).__name__}: {e}", file=sys.stderr),
+    )
+    srv = make_webhook_server(log, host=args.host, port=args.port, secret=s.rd_webhook_secret)
+    flusher.start()
+    print(f"Recebendo webhooks em http://{args.host}:{args.port}{WEBHOOK_PATH}?type=conversion (Ctrl+C para sair)")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+        flusher.stop()
+        flusher.join(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+# Garantir que o diretório raiz do projeto esteja no PYTHONPATH
+CURRENT_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+from services.refresh_dag import default_nodes, run_dag
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Refresh completo (GA4, YouTube, RD, mapeamento UTM e materializações) via DAG.")
+    parser.add_argument("--days", type=int, default=30, help="Número de dias a atualizar (padrão: 30)")
+    parser.add_argument("--workers", type=int, default=4, help="Nós executados em paralelo (padrão: 4)")
+    parser.add_argument("--map-path", type=str, default=None, help="CSV de map_utm_campaign (padrão: catalog/map_utm_campaign.csv)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    results = run_dag(
+        default_nodes(days=args.days, map_csv_path=args.map_path),
+        max_workers=args.workers,
+        on_result=lambda r: print(f"[{r.status:>7}] {r.name:<18} {r.seconds:6.2f}s  {r.message}"),
+    )
+    failed = [r.name for r in results.values() if r.status == "error"]
+    print(f"Refresh concluído em {time.perf_counter() - t0:.2f}s" + (f" — falhas: {', '.join(failed)}" if failed else ""))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,6 @@ from __future__ import annotations
 
 from datetime import date, timedelta
 
-import duckdb
-import polars as pl
 import os
 import sys
 
@@ -13,14 +11,12 @@ ROOT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
-from configs.settings import get_settings
 from integrations.ga4.client import GA4Client
 from services.ga4_refresh import refresh_events_last_n_days, refresh_pages_last_n_days
-from integrations.youtube.client import YouTubeClient
+from services.warehouse import get_con, load_parquet_dataset, report_fields
 
 
 def main() -> None:
-    s = get_settings()
     client = GA4Client.from_env()
 
     # Últimos 30 dias como exemplo inicial
@@ -29,41 +25,21 @@ def main() -> None:
     start_s, end_s = start.isoformat(), end.isoformat()
 
     # Consulta básica: usuários, sessões, pageviews por data
+    dimensions, metrics = report_fields("ga4_sessions_daily")
     parquet_path = client.run_report_cached(
-        dimensions=["date"],
-        metrics=["totalUsers", "sessions", "screenPageViews"],
+        dimensions=dimensions,
+        metrics=metrics,
         start_date=start_s,
         end_date=end_s,
     )
-    df = pl.read_parquet(parquet_path)
-    if df.is_empty():
-        print("Nenhum dado retornado do GA4.")
-        return
 
-    # Normalização: renomear colunas para o warehouse
-    df = df.rename({
-        "date": "date",
-        "totalUsers": "users",
-        "sessions": "sessions",
-        "screenPageViews": "pageviews",
-    })
-    # Converter YYYYMMDD para YYYY-MM-DD
-    if "date" in df.columns:
-        df = df.with_columns(
-            pl.col("date")
-            .cast(pl.Utf8)
-            .str.strptime(pl.Date, format="%Y%m%d", strict=False)
-            .dt.strftime("%Y-%m-%d")
-        )
-
-    # Persistir no DuckDB
-    db_path = s.data_dir / "warehouse" / "warehouse.duckdb"
-    con = duckdb.connect(str(db_path))
-    con.execute("CREATE TABLE IF NOT EXISTS fact_sessions (date DATE, pageviews BIGINT, sessions BIGINT, users BIGINT);")
-    con.execute("DELETE FROM fact_sessions WHERE date BETWEEN ? AND ?;", [start_s, end_s])
-    con.register("_tmp", df.to_pandas())
-    con.execute("INSERT INTO fact_sessions SELECT CAST(date AS DATE), pageviews, sessions, users FROM _tmp;")
+    # Persistir no DuckDB direto do Parquet (renomes/casts definidos em configs/datasets.yml)
+    con = get_con()
+    n = load_parquet_dataset(con, "ga4_sessions_daily", parquet_path, window=(start_s, end_s))
     con.close()
+    if n is None:
+        print("Nenhum dado retornado do GA4.")
+        return
     print(f"Atualizado fact_sessions para {start_s}..{end_s}")
 
     # Materializações adicionais da Fase 1
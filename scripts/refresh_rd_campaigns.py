@@ -22,8 +22,9 @@ from services.rd_refresh import refresh_rd_email_campaign_last_n_days
 def main() -> None:
     parser = argparse.ArgumentParser(description="Atualiza fact_rd_email_campaign para os últimos N dias.")
     parser.add_argument("--days", type=int, default=30, help="Número de dias a atualizar (padrão: 30)")
+    parser.add_argument("--full", action="store_true", help="Ignora o cursor de sincronização e refaz os últimos N dias")
     args = parser.parse_args()
-    msg = refresh_rd_email_campaign_last_n_days(args.days)
+    msg = refresh_rd_email_campaign_last_n_days(args.days, full=args.full)
     print(msg)
 
 
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import inspect
+import json
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import duckdb
+
+from services import data_service
+from services.warehouse import warehouse_version
+
+
+API_PREFIX = "/api/"
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+# Respostas menores que isso não compensam a compressão
+GZIP_MIN_BYTES = 1024
+
+# Getters expostos: /api/<nome> → data_service.get_<nome>
+GETTERS: Dict[str, Callable[..., Any]] = {
+    name[len("get_"):]: fn
+    for name, fn in vars(data_service).items()
+    if name.startswith("get_") and inspect.isfunction(fn) and fn.__module__ == data_service.__name__
+}
+
+
+class ReadOnlyPool:
+    """Conexão DuckDB somente leitura compartilhada; cada requisição usa cursores próprios.
+
+    A conexão é aberta no primeiro uso e fechada após `idle_seconds` sem requisições, liberando o
+    arquivo para os processos de refresh (o DuckDB não aceita escrita com leitores de outro processo).
+    """
+
+    def __init__(self, db_path: Path, idle_seconds: float = 5.0) -> None:
+        self.db_path = db_path
+        self.idle_seconds = idle_seconds
+        self._con: Optional[duckdb.DuckDBPyConnection] = None
+        self._active = 0
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        threading.Thread(target=self._reap, name="api-pool-reaper", daemon=True).start()
+
+    def acquire(self) -> duckdb.DuckDBPyConnection:
+        with self._lock:
+            if self._con is None:
+                self._con = duckdb.connect(str(self.db_path), read_only=True)
+            self._active += 1
+            return self._con
+
+    def release(self) -> None:
+        with self._lock:
+            self._active -= 1
+            self._last_used = time.monotonic()
+
+    def _reap(self) -> None:
+        while not self._closed.wait(min(1.0, self.idle_seconds)):
+            with self._lock:
+                if self._con is not None and self._active == 0 and time.monotonic() - self._last_used > self.idle_seconds:
+                    self._con.close()
+                    self._con = None
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+
+def _parse_params(fn: Callable[..., Any], qs: Dict[str, list]) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {}
+    for p in inspect.signature(fn).parameters.values():
+        if p.name in qs:
+            raw = qs[p.name][0]
+            kwargs[p.name] = int(raw) if "int" in str(p.annotation) else raw
+        elif p.default is inspect.Parameter.empty:
+            raise ValueError(f"Parâmetro obrigatório ausente: {p.name}")
+    return kwargs
+
+
+def _to_arrow(result: Any) -> bytes:
+    import pyarrow as pa
+
+    rows = result if isinstance(result, list) else [result]
+    table = pa.Table.from_pylist(rows)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def make_api_server(
+    pool: ReadOnlyPool, host: str = "127.0.0.1", port: int = 8052, gzip_min_bytes: int = GZIP_MIN_BYTES
+) -> ThreadingHTTPServer:
+    """Servidor HTTP de leitura: GET /api/<getter>?param=... devolve o resultado do data_service.
+
+    JSON por padrão; Arrow IPC (stream) com `?format=arrow` ou `Accept: application/vnd.apache.arrow.stream`.
+    O ETag combina a versão do warehouse (etl_change_log) com a consulta, então `If-None-Match`
+    responde 304 sem executar o getter enquanto nada mudou. gzip quando o cliente aceita.
+    """
+
+    class _ApiHandler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> None:
+            self.send_response(code)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json_error(self, code: int, message: str) -> None:
+            body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+            self._reply(code, body, {"Content-Type": "application/json; charset=utf-8"})
+
+        def _resolve(self) -> Optional[Tuple[Callable[..., Any], Dict[str, Any], str]]:
+            parsed = urlparse(self.path)
+            qs = parse_qs(parsed.query)
+            fn = GETTERS.get(parsed.path[len(API_PREFIX):])
+            if fn is None:
+                self._json_error(404, "Endpoint inexistente (veja GET /api)")
+                return None
+            fmt = (qs.pop("format", [None])[0] or "").lower()
+            if not fmt:
+                fmt = "arrow" if ARROW_MIME in (self.headers.get("Accept") or "") else "json"
+            if fmt not in ("json", "arrow"):
+                self._json_error(400, "format deve ser json ou arrow")
+                return None
+            try:
+                kwargs = _parse_params(fn, qs)
+            except ValueError as e:
+                self._json_error(400, str(e))
+                return None
+            return fn, kwargs, fmt
+
+        def do_GET(self):  # type: ignore[override]
+            path = urlparse(self.path).path
+            if path == "/health":
+                self._reply(200, b"ok")
+                return
+            if path in ("/api", API_PREFIX):
+                index = {name: list(inspect.signature(fn).parameters) for name, fn in sorted(GETTERS.items())}
+                self._reply(200, json.dumps(index).encode("utf-8"), {"Content-Type": "application/json"})
+                return
+            if not path.startswith(API_PREFIX):
+                self._json_error(404, "Not Found")
+                return
+            resolved = self._resolve()
+            if resolved is None:
+                return
+            fn, kwargs, fmt = resolved
+            gz = "gzip" in (self.headers.get("Accept-Encoding") or "")
+            try:
+                con = pool.acquire()
+            except duckdb.Error as e:
+                # Arquivo bloqueado por um refresh em andamento (ou warehouse ainda inexistente)
+                self._reply(503, str(e).encode("utf-8"), {"Retry-After": "5"})
+                return
+            try:
+                cur = con.cursor()
+                try:
+                    version = warehouse_version(cur)
+                finally:
+                    cur.close()
+                key = json.dumps([path, sorted(kwargs.items()), fmt], default=str)
+                # Fraco: o mesmo conteúdo pode sair com ou sem gzip
+                etag = f'W/"{version}-{hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]}"'
+                base_headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+                if etag in [t.strip() for t in (self.headers.get("If-None-Match") or "").split(",")]:
+                    self._reply(304, b"", base_headers)
+                    return
+                with data_service.using_connection_factory(con.cursor):
+                    result = fn(**kwargs)
+            except Exception as e:
+                self._json_error(500, f"{type(e).__name__}: {e}")
+                return
+            finally:
+                pool.release()
+
+            if fmt == "arrow":
+                body, ctype = _to_arrow(result), ARROW_MIME
+            else:
+                body, ctype = json.dumps(result, ensure_ascii=False, default=str).encode("utf-8"), "application/json; charset=utf-8"
+            headers = dict(base_headers, **{"Content-Type": ctype})
+            if gz and len(body) >= gzip_min_bytes:
+                body = gzip.compress(body, compresslevel=6)
+                headers["Content-Encoding"] = "gzip"
+            self._reply(200, body, headers)
+
+        def log_message(self, format: str, *args: Any) -> None:  # silencia o log padrão por requisição
+            return
+
+    return ThreadingHTTPServer((host, port), _ApiHandler)
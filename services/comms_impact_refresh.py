@@ -1,21 +1,40 @@
 from __future__ import annotations
 
-import duckdb
+from services.warehouse import advance_watermark, changes_since, delete_missing, get_con, upsert_dataset
 
-from configs.settings import get_settings
+
+DAILY_UPSTREAM_TABLES = ["fact_ga4_sessions_by_utm_daily", "map_utm_campaign"]
+SUMMARY_UPSTREAM_TABLES = ["fact_comms_impact_daily", "fact_rd_email_campaign"]
 
 
 def _get_con():
-    s = get_settings()
-    db_path = s.data_dir / "warehouse" / "warehouse.duckdb"
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    return duckdb.connect(str(db_path))
+    # Mesma conexão de escrita do warehouse: roda também como job dentro do processo do dashboard
+    return get_con()
+
+
+def _comms_daily_sql(date_filter: str) -> str:
+    return f"""
+        SELECT
+          g.date,
+          m.campaignId,
+          SUM(g.sessions) AS sessions,
+          SUM(g.users) AS users
+        FROM fact_ga4_sessions_by_utm_daily g
+        LEFT JOIN map_utm_campaign m
+          ON lower(trim(g.campaign)) = m.utm_campaign_norm
+         AND lower(trim(g.source)) = m.utm_source_norm
+         AND lower(trim(g.medium)) = m.utm_medium_norm
+        WHERE m.campaignId IS NOT NULL AND ({date_filter})
+        GROUP BY 1,2
+    """
 
 
-def materialize_comms_impact_daily() -> str:
+def materialize_comms_impact_daily(full: bool = False) -> str:
     """Cria/atualiza fact_comms_impact_daily a partir de GA4 UTM + mapping UTM/campanha.
 
     Escopo MVP: GA4 sessões por campanha/data. (YT por campanha pode ser adicionado depois.)
+    Incremental: recalcula só as datas UTM alteradas desde a última execução; uma nova importação
+    de map_utm_campaign (ou `full=True`) recalcula tudo.
     """
     con = _get_con()
     con.execute(
@@ -30,39 +49,84 @@ def materialize_comms_impact_daily() -> str:
     )
     con.execute("BEGIN TRANSACTION;")
     try:
-        con.execute("DELETE FROM fact_comms_impact_daily;")
-        con.execute(
-            """
-            INSERT INTO fact_comms_impact_daily
-            SELECT
-              g.date,
-              m.campaignId,
-              SUM(g.sessions) AS sessions,
-              SUM(g.users) AS users
-            FROM fact_ga4_sessions_by_utm_daily g
-            LEFT JOIN map_utm_campaign m
-              ON lower(trim(g.campaign)) = m.utm_campaign_norm
-             AND lower(trim(g.source)) = m.utm_source_norm
-             AND lower(trim(g.medium)) = m.utm_medium_norm
-            WHERE m.campaignId IS NOT NULL
-            GROUP BY 1,2
-            ;
-            """
-        )
+        dates, seq = changes_since(con, "comms_impact_daily", DAILY_UPSTREAM_TABLES)
+        if full or dates is None:
+            date_filter, params, scope = "TRUE", [], "completo"
+        elif dates:
+            date_filter = "g.date IN (SELECT CAST(unnest(?) AS DATE))"
+            params = [[d.isoformat() for d in dates]]
+            scope = f"{len(dates)} datas ({dates[0]}..{dates[-1]})"
+        else:
+            date_filter, params, scope = "", [], "sem mudanças"
+        n = 0
+        if date_filter:
+            src = _comms_daily_sql(date_filter)
+            scope_sql = "TRUE" if not params else "date IN (SELECT CAST(unnest(?) AS DATE))"
+            n += delete_missing(
+                con, "fact_comms_impact_daily", ["date", "campaignId"], src, params, scope_sql, params
+            )
+            n += upsert_dataset(con, "comms_impact_daily", src, params)
+        advance_watermark(con, "comms_impact_daily", seq)
         con.execute("COMMIT;")
     except Exception:
         con.execute("ROLLBACK;")
         con.close()
         raise
     con.close()
-    return "Materializado fact_comms_impact_daily"
+    return f"Materializado fact_comms_impact_daily ({scope}; {n} linhas alteradas)"
 
 
-def materialize_comms_impact_summary() -> str:
+def _comms_summary_sql(campaign_filter: str) -> str:
+    # Monta base com datas relativas à data de envio
+    return f"""
+        WITH camp AS (
+          SELECT * FROM fact_rd_email_campaign WHERE {campaign_filter}
+        ), base AS (
+          SELECT c.campaignId,
+                 r.date AS d,
+                 r.sessions
+          FROM fact_comms_impact_daily r
+          JOIN camp c ON c.campaignId = r.campaignId
+        ), pvt AS (
+          SELECT c.campaignId,
+                 CAST(c.date AS DATE) AS send_date,
+                 MAX(CASE WHEN b.d = (CAST(c.date AS DATE) - INTERVAL '1 day') THEN b.sessions END) AS ses_d_1,
+                 MAX(CASE WHEN b.d = CAST(c.date AS DATE) THEN b.sessions END) AS ses_d0,
+                 SUM(CASE WHEN b.d BETWEEN CAST(c.date AS DATE) AND (CAST(c.date AS DATE) + INTERVAL '2 day') THEN b.sessions END) AS ses_d0_d2
+          FROM camp c
+          LEFT JOIN base b ON b.campaignId = c.campaignId
+          GROUP BY 1,2
+        )
+        SELECT pvt.campaignId,
+               pvt.send_date,
+               CAST(COALESCE(pvt.ses_d_1, 0) AS BIGINT) AS ses_d_1,
+               CAST(COALESCE(pvt.ses_d0, 0) AS BIGINT) AS ses_d0,
+               CAST(COALESCE(pvt.ses_d0_d2, 0) AS BIGINT) AS ses_d0_d2,
+               CAST(COALESCE(pvt.ses_d0, 0) - COALESCE(pvt.ses_d_1, 0) AS BIGINT) AS uplift_abs,
+               CASE WHEN COALESCE(pvt.ses_d_1, 0) > 0 THEN (COALESCE(pvt.ses_d0, 0) - COALESCE(pvt.ses_d_1, 0)) * 100.0 / pvt.ses_d_1 ELSE 0.0 END AS uplift_pct,
+               c.sends,
+               c.opens,
+               c.clicks
+        FROM pvt
+        LEFT JOIN (
+          SELECT campaignId,
+                 SUM(sends) AS sends,
+                 SUM(opens) AS opens,
+                 SUM(clicks) AS clicks
+          FROM camp
+          GROUP BY 1
+        ) c ON c.campaignId = pvt.campaignId
+    """
+
+
+def materialize_comms_impact_summary(full: bool = False) -> str:
     """Gera resumo por campanha com janelas D-1, D0 e D0–D+2 e uplift.
 
     Requer: fact_comms_impact_daily (sessões por campanha e data) e
             fact_rd_email_campaign (send date, sends/opens/clicks).
+    Incremental: só recalcula campanhas cuja janela D-1..D+2 contém uma data alterada em
+    fact_comms_impact_daily ou cuja linha em fact_rd_email_campaign mudou; o histórico assentado
+    é mantido.
     """
     con = _get_con()
     con.execute(
@@ -83,55 +147,32 @@ def materialize_comms_impact_summary() -> str:
     )
     con.execute("BEGIN TRANSACTION;")
     try:
-        con.execute("DELETE FROM fact_comms_impact_summary;")
-        # Monta base com datas relativas à data de envio
-        con.execute(
+        dates, seq = changes_since(con, "comms_impact_summary", SUMMARY_UPSTREAM_TABLES)
+        n = 0
+        if full or dates is None:
+            src = _comms_summary_sql("TRUE")
+            n += delete_missing(con, "fact_comms_impact_summary", ["campaignId"], src)
+            n += upsert_dataset(con, "comms_impact_summary", src)
+            scope = "completo"
+        elif dates:
+            # Campanha enviada em s é afetada por uma data d se s-1 <= d <= s+2
+            affected = """
+                EXISTS (
+                  SELECT 1 FROM (SELECT CAST(unnest(?) AS DATE) AS d) ch
+                  WHERE ch.d BETWEEN CAST(date AS DATE) - INTERVAL '1 day' AND CAST(date AS DATE) + INTERVAL '2 day'
+                )
             """
-            WITH base AS (
-              SELECT c.campaignId,
-                     r.date AS d,
-                     r.sessions
-              FROM fact_comms_impact_daily r
-              JOIN fact_rd_email_campaign c ON c.campaignId = r.campaignId
-            ), pvt AS (
-              SELECT c.campaignId,
-                     CAST(c.date AS DATE) AS send_date,
-                     MAX(CASE WHEN b.d = (CAST(c.date AS DATE) - INTERVAL '1 day') THEN b.sessions END) AS ses_d_1,
-                     MAX(CASE WHEN b.d = CAST(c.date AS DATE) THEN b.sessions END) AS ses_d0,
-                     SUM(CASE WHEN b.d BETWEEN CAST(c.date AS DATE) AND (CAST(c.date AS DATE) + INTERVAL '2 day') THEN b.sessions END) AS ses_d0_d2
-              FROM fact_rd_email_campaign c
-              LEFT JOIN base b ON b.campaignId = c.campaignId
-              GROUP BY 1,2
+            n += upsert_dataset(
+                con, "comms_impact_summary", _comms_summary_sql(affected), [[d.isoformat() for d in dates]]
             )
-            INSERT INTO fact_comms_impact_summary
-            SELECT pvt.campaignId,
-                   pvt.send_date,
-                   COALESCE(pvt.ses_d_1, 0) AS ses_d_1,
-                   COALESCE(pvt.ses_d0, 0) AS ses_d0,
-                   COALESCE(pvt.ses_d0_d2, 0) AS ses_d0_d2,
-                   COALESCE(pvt.ses_d0, 0) - COALESCE(pvt.ses_d_1, 0) AS uplift_abs,
-                   CASE WHEN COALESCE(pvt.ses_d_1, 0) > 0 THEN (COALESCE(pvt.ses_d0, 0) - COALESCE(pvt.ses_d_1, 0)) * 100.0 / pvt.ses_d_1 ELSE 0.0 END AS uplift_pct,
-                   c.sends,
-                   c.opens,
-                   c.clicks
-            FROM pvt
-            LEFT JOIN (
-              SELECT campaignId,
-                     SUM(sends) AS sends,
-                     SUM(opens) AS opens,
-                     SUM(clicks) AS clicks
-              FROM fact_rd_email_campaign
-              GROUP BY 1
-            ) c ON c.campaignId = pvt.campaignId
-            ;
-            """
-        )
+            scope = f"campanhas com janela em {len(dates)} datas alteradas"
+        else:
+            scope = "sem mudanças"
+        advance_watermark(con, "comms_impact_summary", seq)
         con.execute("COMMIT;")
     except Exception:
         con.execute("ROLLBACK;")
         con.close()
         raise
     con.close()
-    return "Materializado fact_comms_impact_summary"
-
-
+    return f"Materializado fact_comms_impact_summary ({scope}; {n} linhas alteradas)"
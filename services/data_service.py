@@ -1,25 +1,38 @@
 from __future__ import annotations
 
-from pathlib import Path
-from typing import Dict, List
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
 from datetime import date, timedelta
 
 import duckdb
-import polars as pl
 
-from configs.settings import get_settings
+from services.downsample import downsample_rows
+from services.warehouse import get_read_con
 
 
-def _get_duckdb_path() -> Path:
-    settings = get_settings()
-    return settings.data_dir / "warehouse" / "warehouse.duckdb"
+# Fábrica de conexões da requisição atual (ex.: cursores do pool somente leitura do servidor de API)
+_connection_factory: ContextVar[Optional[Callable[[], duckdb.DuckDBPyConnection]]] = ContextVar(
+    "data_service_connection_factory", default=None
+)
+
+
+@contextmanager
+def using_connection_factory(factory: Callable[[], duckdb.DuckDBPyConnection]) -> Iterator[None]:
+    """Faz os getters deste módulo obterem conexões de `factory` (que eles mesmos fecham) neste contexto."""
+    token = _connection_factory.set(factory)
+    try:
+        yield
+    finally:
+        _connection_factory.reset(token)
 
 
 def _ensure_duckdb() -> duckdb.DuckDBPyConnection:
-    db_path = _get_duckdb_path()
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    con = duckdb.connect(str(db_path))
-    return con
+    factory = _connection_factory.get()
+    if factory is not None:
+        return factory()
+    # Somente leitura: o dashboard não trava o arquivo para o servidor de API (e vice-versa)
+    return get_read_con()
 
 
 def get_health() -> Dict[str, str]:
@@ -218,7 +231,8 @@ def get_top_days(start_date: str, end_date: str) -> List[Dict[str, str]]:
     return [{"weekday": r[0], "users": int(r[1] or 0)} for r in rows]
 
 
-def get_yt_channel_daily(start_date: str, end_date: str) -> List[Dict[str, str]]:
+def get_yt_channel_daily(start_date: str, end_date: str, max_points: Optional[int] = None) -> List[Dict[str, str]]:
+    """Série diária do canal; com `max_points`, reduzida por LTTB (views/minutos) para gráficos."""
     con = _ensure_duckdb()
     try:
         rows = con.execute(
@@ -234,7 +248,7 @@ def get_yt_channel_daily(start_date: str, end_date: str) -> List[Dict[str, str]]
             [start_date, end_date],
         ).fetchall()
         con.close()
-        return [
+        series = [
             {
                 "date": str(r[0]),
                 "views": int(r[1] or 0),
@@ -243,32 +257,76 @@ def get_yt_channel_daily(start_date: str, end_date: str) -> List[Dict[str, str]]
             }
             for r in rows
         ]
+        return downsample_rows(series, "date", ["views", "estimatedMinutesWatched"], max_points)
     except Exception:
         con.close()
         return []
 
 
-def get_yt_top_videos(start_date: str, end_date: str, limit: int = 20) -> List[Dict[str, str]]:
-    con = _ensure_duckdb()
+def _yt_video_aggregate(con: duckdb.DuckDBPyConnection, start_date: str, end_date: str, order_by: str, limit: int) -> List[tuple]:
+    """Agrega vídeos (views, minutos, duração média ponderada) em qualquer intervalo a partir de fact_yt_video_daily.
+
+    Fallback: fact_yt_video_period (só casa quando o intervalo coincide com a janela da coleta).
+    """
     try:
         rows = con.execute(
-            """
+            f"""
             SELECT videoId,
                    COALESCE(SUM(views),0) AS views,
                    COALESCE(SUM(estimatedMinutesWatched),0) AS minutes,
-                   AVG(averageViewDuration) AS avg_view_sec
-            FROM fact_yt_video_period
-            WHERE startDate = CAST(? AS DATE) OR endDate = CAST(? AS DATE)
+                   COALESCE(SUM(averageViewDuration * views) / NULLIF(SUM(views),0), 0.0) AS avg_view_sec
+            FROM fact_yt_video_daily
+            WHERE date BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
             GROUP BY 1
-            ORDER BY views DESC NULLS LAST
+            ORDER BY {order_by} DESC NULLS LAST
             LIMIT ?
             """,
             [start_date, end_date, limit],
         ).fetchall()
+        if rows:
+            return rows
+    except duckdb.CatalogException:
+        pass
+    return con.execute(
+        f"""
+        SELECT videoId,
+               COALESCE(SUM(views),0) AS views,
+               COALESCE(SUM(estimatedMinutesWatched),0) AS minutes,
+               AVG(averageViewDuration) AS avg_view_sec
+        FROM fact_yt_video_period
+        WHERE startDate = CAST(? AS DATE) OR endDate = CAST(? AS DATE)
+        GROUP BY 1
+        ORDER BY {order_by} DESC NULLS LAST
+        LIMIT ?
+        """,
+        [start_date, end_date, limit],
+    ).fetchall()
+
+
+def _yt_video_titles(con: duckdb.DuckDBPyConnection, video_ids: List[str]) -> Dict[str, str]:
+    """Títulos de dim_video (enriquecida pela Data API); vazio se a dimensão ainda não existe."""
+    if not video_ids:
+        return {}
+    try:
+        rows = con.execute(
+            "SELECT videoId, title FROM dim_video WHERE title IS NOT NULL AND videoId IN (SELECT unnest(?));",
+            [list(video_ids)],
+        ).fetchall()
+    except duckdb.Error:
+        return {}
+    return {r[0]: r[1] for r in rows}
+
+
+def get_yt_top_videos(start_date: str, end_date: str, limit: int = 20) -> List[Dict[str, str]]:
+    con = _ensure_duckdb()
+    try:
+        rows = _yt_video_aggregate(con, start_date, end_date, "views", limit)
+        titles = _yt_video_titles(con, [r[0] for r in rows])
         con.close()
         return [
             {
                 "videoId": r[0],
+                "title": titles.get(r[0], r[0]),
                 "views": int(r[1] or 0),
                 "estimatedMinutesWatched": int(r[2] or 0),
                 "averageViewDuration": float(r[3] or 0.0),
@@ -307,8 +365,8 @@ def get_engagement_kpis(start_date: str, end_date: str) -> Dict[str, float]:
         con.close()
 
 
-def get_engagement_series(start_date: str, end_date: str) -> List[Dict[str, str]]:
-    """Série temporal com minutos assistidos (YT) e sessões (GA4)."""
+def get_engagement_series(start_date: str, end_date: str, max_points: Optional[int] = None) -> List[Dict[str, str]]:
+    """Série temporal com minutos assistidos (YT) e sessões (GA4); `max_points` limita o payload (LTTB)."""
     con = _ensure_duckdb()
     try:
         rows = con.execute(
@@ -322,49 +380,37 @@ def get_engagement_series(start_date: str, end_date: str) -> List[Dict[str, str]
             """,
             [start_date, end_date],
         ).fetchall()
-        return [
+        series = [
             {"date": str(r[0]), "sessions": int(r[1] or 0), "minutes": int(r[2] or 0)} for r in rows
         ]
+        return downsample_rows(series, "date", ["sessions", "minutes"], max_points)
     finally:
         con.close()
 
 
 def get_yt_retention_by_video(start_date: str, end_date: str, limit: int = 20) -> List[Dict[str, str]]:
-    """Retenção por vídeo (minutos por view) a partir de fact_yt_video_period.
+    """Retenção por vídeo (minutos por view) no intervalo, a partir de fact_yt_video_daily.
 
-    Observação: a coleta atual grava períodos completos (startDate/endDate). Usamos correspondência por igualdade nas bordas.
+    Observação: sem o fato diário, cai para fact_yt_video_period (correspondência por igualdade nas bordas).
     """
     con = _ensure_duckdb()
     try:
-        rows = con.execute(
-            """
-            SELECT
-              videoId,
-              COALESCE(SUM(estimatedMinutesWatched),0) AS minutes,
-              COALESCE(SUM(views),0) AS views,
-              CASE WHEN COALESCE(SUM(views),0) > 0
-                   THEN COALESCE(SUM(estimatedMinutesWatched),0) * 1.0 / COALESCE(SUM(views),0)
-                   ELSE 0.0 END AS min_per_view
-            FROM fact_yt_video_period
-            WHERE startDate = CAST(? AS DATE) OR endDate = CAST(? AS DATE)
-            GROUP BY 1
-            ORDER BY minutes DESC NULLS LAST
-            LIMIT ?
-            """,
-            [start_date, end_date, limit],
-        ).fetchall()
+        rows = _yt_video_aggregate(con, start_date, end_date, "minutes", limit)
+        titles = _yt_video_titles(con, [r[0] for r in rows])
         return [
             {
                 "videoId": r[0],
-                "minutes": int(r[1] or 0),
-                "views": int(r[2] or 0),
-                "min_per_view": float(r[3] or 0.0),
+                "title": titles.get(r[0], r[0]),
+                "minutes": int(r[2] or 0),
+                "views": int(r[1] or 0),
+                "min_per_view": (float(r[2] or 0) / float(r[1])) if r[1] else 0.0,
             }
             for r in rows
         ]
     except Exception:
-        con.close()
         return []
+    finally:
+        con.close()
 
 
 def get_pages_pareto(start_date: str, end_date: str, limit: int = 50) -> List[Dict[str, str]]:
@@ -454,7 +500,7 @@ def get_comms_sessions_by_campaign(start_date: str, end_date: str, limit: int =
 
 
 def get_rd_kpis(start_date: str, end_date: str) -> Dict[str, float]:
-    """KPIs de campanhas RD: sends, opens, clicks (janela)."""
+    """KPIs de campanhas RD: sends, opens, clicks (janela) e leads convertidos (webhook)."""
     con = _ensure_duckdb()
     try:
         row = con.execute(
@@ -467,7 +513,24 @@ def get_rd_kpis(start_date: str, end_date: str) -> Dict[str, float]:
         ).fetchone() or (0, 0, 0)
         sends, opens, clicks = row
         ctr = (float(clicks or 0) * 100.0 / float(sends)) if sends else 0.0
-        return {"sends": float(sends or 0), "opens": float(opens or 0), "clicks": float(clicks or 0), "ctr_pct": round(ctr, 2)}
+        try:
+            # Conversões recebidas por webhook (quase em tempo real)
+            leads = (con.execute(
+                """
+                SELECT COUNT(DISTINCT contactId) FROM fact_rd_webhook_event
+                WHERE event_type = 'conversion' AND date BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
+                """,
+                [start_date, end_date],
+            ).fetchone() or (0,))[0]
+        except duckdb.CatalogException:
+            leads = 0
+        return {
+            "sends": float(sends or 0),
+            "opens": float(opens or 0),
+            "clicks": float(clicks or 0),
+            "ctr_pct": round(ctr, 2),
+            "leads": float(leads or 0),
+        }
     finally:
         con.close()
 
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Índices escolhidos pelo Largest-Triangle-Three-Buckets (preserva picos e vales).
+
+    Mantém o primeiro e o último ponto; os demais são divididos em `threshold - 2` baldes e, em
+    cada um, fica o ponto que forma o maior triângulo com o ponto anterior escolhido e a média
+    do balde seguinte. O laço é por balde (vetorizado dentro dele), não por ponto.
+    """
+    import numpy as np
+
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    out = np.empty(threshold, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def _as_number(v: Any) -> float:
+    if isinstance(v, str):
+        v = date.fromisoformat(v[:10])
+    if isinstance(v, date):
+        return float(v.toordinal())
+    return float(v)
+
+
+def downsample_rows(
+    rows: List[Dict[str, Any]], x_key: str, y_keys: Sequence[str], max_points: Optional[int]
+) -> List[Dict[str, Any]]:
+    """Reduz uma série (lista de dicts ordenada por `x_key`) a no máximo `max_points` por métrica.
+
+    Com várias métricas, une os pontos escolhidos para cada uma (o payload fica limitado a
+    `len(y_keys) * max_points`). Sem `max_points`, ou série menor, devolve as linhas intactas.
+    """
+    if not max_points or len(rows) <= max_points:
+        return rows
+    # NumPy só é carregado quando há série a reduzir
+    import numpy as np
+
+    x = np.fromiter((_as_number(r[x_key]) for r in rows), dtype=float, count=len(rows))
+    keep = np.zeros(len(rows), dtype=bool)
+    for key in y_keys:
+        y = np.fromiter((float(r.get(key) or 0) for r in rows), dtype=float, count=len(rows))
+        keep[lttb_indices(x, y, max_points)] = True
+    return [r for r, k in zip(rows, keep) if k]
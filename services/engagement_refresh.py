@@ -1,24 +1,40 @@
 from __future__ import annotations
 
-from datetime import date, timedelta
+from services.warehouse import advance_watermark, changes_since, get_con, upsert_dataset
 
-import duckdb
 
-from configs.settings import get_settings
+UPSTREAM_TABLES = ["fact_sessions", "fact_yt_channel_daily"]
 
 
 def _get_con():
-    s = get_settings()
-    db_path = s.data_dir / "warehouse" / "warehouse.duckdb"
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    return duckdb.connect(str(db_path))
+    # Mesma conexão de escrita do warehouse: roda também como job dentro do processo do dashboard
+    return get_con()
 
 
-def materialize_engagement_daily() -> str:
+def _engagement_sql(dates_filter: str) -> str:
+    return f"""
+        SELECT
+          d.date,
+          COALESCE(s.sessions, 0) AS sessions,
+          COALESCE(s.pageviews, 0) AS pageviews,
+          COALESCE(y.views, 0) AS views,
+          COALESCE(y.estimatedMinutesWatched, 0) AS estimatedMinutesWatched,
+          COALESCE(y.averageViewDuration, 0.0) AS averageViewDuration
+        FROM ({dates_filter}) d
+        LEFT JOIN fact_sessions s USING(date)
+        LEFT JOIN fact_yt_channel_daily y USING(date)
+    """
+
+
+def materialize_engagement_daily(full: bool = False) -> str:
     """Cria/atualiza fact_engagement_daily unindo GA4 e YT por data.
 
     Colunas: date, sessions, pageviews, views, estimatedMinutesWatched, averageViewDuration
     (engaged_sessions fica para futura disponibilidade)
+
+    Incremental: recalcula só as datas alteradas em fact_sessions/fact_yt_channel_daily desde a
+    última execução (etl_change_log). `full=True` (ou a primeira execução) recalcula todo o calendário;
+    linhas inalteradas não são reescritas. Nos dois casos só entram datas de dim_date.
     """
     con = _get_con()
     con.execute(
@@ -35,30 +51,29 @@ def materialize_engagement_daily() -> str:
     )
     con.execute("BEGIN TRANSACTION;")
     try:
-        con.execute("DELETE FROM fact_engagement_daily;")
-        con.execute(
-            """
-            INSERT INTO fact_engagement_daily
-            SELECT
-              d.date,
-              COALESCE(s.sessions, 0) AS sessions,
-              COALESCE(s.pageviews, 0) AS pageviews,
-              COALESCE(y.views, 0) AS views,
-              COALESCE(y.estimatedMinutesWatched, 0) AS estimatedMinutesWatched,
-              COALESCE(y.averageViewDuration, 0.0) AS averageViewDuration
-            FROM dim_date d
-            LEFT JOIN fact_sessions s USING(date)
-            LEFT JOIN fact_yt_channel_daily y USING(date)
-            ;
-            """
-        )
+        dates, seq = changes_since(con, "engagement_daily", UPSTREAM_TABLES)
+        if full or dates is None:
+            n = upsert_dataset(
+                con,
+                "engagement_daily",
+                _engagement_sql("SELECT date FROM dim_date"),
+            )
+            scope = "completo"
+        elif dates:
+            n = upsert_dataset(
+                con,
+                "engagement_daily",
+                _engagement_sql("SELECT date FROM dim_date WHERE date IN (SELECT CAST(unnest(?) AS DATE))"),
+                [[d.isoformat() for d in dates]],
+            )
+            scope = f"{len(dates)} datas ({dates[0]}..{dates[-1]})"
+        else:
+            n, scope = 0, "sem mudanças"
+        advance_watermark(con, "engagement_daily", seq)
         con.execute("COMMIT;")
     except Exception:
         con.execute("ROLLBACK;")
         con.close()
         raise
     con.close()
-    return "Materializado fact_engagement_daily"
-
-
-
+    return f"Materializado fact_engagement_daily ({scope}; {n} linhas novas/alteradas)"
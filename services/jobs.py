@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import uuid
+
+from configs.settings import get_settings
+
+
+ACTIVE_STATUSES = ("queued", "running")
+# Histórico mantido em data/jobs (os mais antigos são apagados a cada envio)
+MAX_JOBS_KEPT = 100
+
+# Um worker: refreshes rodam em fila, sem disputar o lock de escrita do DuckDB
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="refresh-job")
+_lock = threading.Lock()
+
+
+def _jobs_dir() -> Path:
+    path = get_settings().data_dir / "jobs"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _dedup_key(kind: str, params: Dict[str, Any]) -> str:
+    raw = json.dumps({"kind": kind, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _write(job: Dict[str, Any]) -> None:
+    path = _jobs_dir() / f"{job['id']}.json"
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(job, ensure_ascii=False, default=str), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _read(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        job = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    # Processo que executava o job morreu: não fica "rodando" para sempre
+    if job.get("status") in ACTIVE_STATUSES and not _pid_alive(job.get("pid")):
+        job["status"] = "error"
+        job["message"] = "interrompido (processo encerrado)"
+    return job
+
+
+class JobContext:
+    """Reporta o progresso de um job: cada `step` é persistido no arquivo do job."""
+
+    def __init__(self, job: Dict[str, Any]) -> None:
+        self.job = job
+
+    def step(self, name: str) -> None:
+        with _lock:
+            self.job["steps"].append({"name": name, "at": datetime.now().isoformat(timespec="seconds")})
+            self.job["step"] = name
+            _write(self.job)
+
+
+def _job_ga4(ctx: JobContext, days: int = 30) -> str:
+    from services.engagement_refresh import materialize_engagement_daily
+    from services.snapshots import build_snapshots
+    from services.ga4_refresh import refresh_events_last_n_days, refresh_pages_last_n_days, refresh_sessions_last_n_days
+
+    msgs = [
+        refresh_sessions_last_n_days(days, on_step=ctx.step),
+        refresh_events_last_n_days(days, on_step=ctx.step),
+        refresh_pages_last_n_days(days, on_step=ctx.step),
+    ]
+    ctx.step("materializando engajamento")
+    msgs.append(materialize_engagement_daily())
+    ctx.step("gerando snapshots do dashboard")
+    msgs.append(build_snapshots())
+    return "\n".join(msgs)
+
+
+def _job_youtube(ctx: JobContext, days: int = 30) -> str:
+    from services.engagement_refresh import materialize_engagement_daily
+    from services.snapshots import build_snapshots
+    from services.youtube_refresh import refresh_yt_channel_and_videos
+
+    msgs = [refresh_yt_channel_and_videos(days, on_step=ctx.step)]
+    ctx.step("materializando engajamento")
+    msgs.append(materialize_engagement_daily())
+    ctx.step("gerando snapshots do dashboard")
+    msgs.append(build_snapshots())
+    return "\n".join(msgs)
+
+
+JOB_KINDS: Dict[str, Callable[..., str]] = {
+    "ga4": _job_ga4,
+    "youtube": _job_youtube,
+}
+
+
+def _run(job: Dict[str, Any]) -> None:
+    ctx = JobContext(job)
+    with _lock:
+        job["status"] = "running"
+        job["started_at"] = datetime.now().isoformat(timespec="seconds")
+        _write(job)
+    try:
+        msg = JOB_KINDS[job["kind"]](ctx, **job["params"])
+        status = "done"
+    except Exception as e:
+        msg, status = f"{type(e).__name__}: {e}", "error"
+    with _lock:
+        job["status"] = status
+        job["message"] = msg
+        job["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        _write(job)
+
+
+def submit_job(kind: str, **params: Any) -> Dict[str, Any]:
+    """Enfileira um refresh em segundo plano e devolve o job (dict persistido em data/jobs).
+
+    Um job idêntico (mesmo tipo e parâmetros) ainda na fila ou rodando é reaproveitado em vez de
+    disparar outro, inclusive quando enviado por outra sessão do dashboard.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Job desconhecido: {kind}")
+    key = _dedup_key(kind, params)
+    with _lock:
+        for job in list_jobs():
+            if job.get("key") == key and job.get("status") in ACTIVE_STATUSES:
+                return job
+        job = {
+            "id": f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}",
+            "kind": kind,
+            "params": params,
+            "key": key,
+            "status": "queued",
+            "step": None,
+            "steps": [],
+            "message": "",
+            "pid": os.getpid(),
+            "submitted_at": datetime.now().isoformat(timespec="seconds"),
+            "started_at": None,
+            "finished_at": None,
+        }
+        _write(job)
+        for old in sorted(_jobs_dir().glob("*.json"), reverse=True)[MAX_JOBS_KEPT:]:
+            old.unlink(missing_ok=True)
+    _executor.submit(_run, job)
+    return job
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return _read(_jobs_dir() / f"{job_id}.json")
+
+
+def list_jobs(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Jobs mais recentes primeiro (o id começa pelo horário de envio)."""
+    paths = sorted(_jobs_dir().glob("*.json"), reverse=True)
+    if limit:
+        paths = paths[:limit]
+    return [j for j in map(_read, paths) if j]
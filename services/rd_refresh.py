@@ -1,36 +1,152 @@
 from __future__ import annotations
 
-from datetime import date, timedelta
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Optional, Tuple
+import uuid
 
 import duckdb
+import pyarrow as pa
 
 from configs.settings import get_settings
 from integrations.rd.client import RDClient
+from services.warehouse import get_con, upsert_dataset
 
 
-def refresh_rd_lead_stage_last_n_days(days: int = 30) -> str:
-    """Exemplo inicial: busca contatos atualizados e agrega por um campo de estágio, se disponível.
-    A estrutura de RD pode variar; este é um placeholder para materialização mínima.
-    """
-    s = get_settings()
-    client = RDClient.from_env()
-    end = date.today()
-    start = end - timedelta(days=days)
-    start_iso, end_iso = start.isoformat(), end.isoformat()
+# Contatos acumulados por lote antes de cada carga no warehouse (limita a memória)
+CONTACT_BATCH_ROWS = 10_000
+CONTACT_SCHEMA = pa.schema(
+    [
+        ("contactId", pa.string()),
+        ("email", pa.string()),
+        ("stage", pa.string()),
+        ("updated_at", pa.string()),
+        ("seen_on", pa.string()),
+    ]
+)
+
 
-    contacts = client.fetch_contacts_paginated(updated_start_iso=start_iso, updated_end_iso=end_iso)
+def _contact_stage(c: dict) -> str:
     # Extrair estágio se existir em um campo comum
-    stage_counts: dict[str, int] = {}
-    for c in contacts:
-        stage = (
-            c.get("lifecycle_stage")
-            or c.get("funnel_stage")
-            or c.get("status")
-            or "unknown"
-        )
-        stage_counts[stage] = stage_counts.get(stage, 0) + 1
+    return c.get("lifecycle_stage") or c.get("funnel_stage") or c.get("status") or "unknown"
+
+
+# Sobreposição ao retomar do cursor: atualizações gravadas com atraso no RD
+CONTACT_CURSOR_OVERLAP = timedelta(hours=1)
+# Métricas de e-mail continuam mudando dias após o envio
+CAMPAIGN_CURSOR_OVERLAP = timedelta(days=7)
+
+
+def _ensure_sync_state(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rd_sync_state (
+            entity TEXT PRIMARY KEY,
+            cursor TIMESTAMP,
+            window_start TIMESTAMP,
+            window_end TIMESTAMP,
+            next_page BIGINT,
+            status TEXT,
+            updated_at TIMESTAMP
+        );
+        """
+    )
+
+
+def _set_sync_state(
+    con: duckdb.DuckDBPyConnection,
+    entity: str,
+    *,
+    cursor: Optional[datetime],
+    window_start: datetime,
+    window_end: datetime,
+    next_page: int,
+    status: str,
+) -> None:
+    con.execute(
+        """
+        INSERT INTO rd_sync_state VALUES (?, ?, ?, ?, ?, ?, current_timestamp::TIMESTAMP)
+        ON CONFLICT (entity) DO UPDATE SET cursor = excluded.cursor, window_start = excluded.window_start,
+            window_end = excluded.window_end, next_page = excluded.next_page, status = excluded.status,
+            updated_at = excluded.updated_at;
+        """,
+        [entity, cursor, window_start, window_end, next_page, status],
+    )
+
+
+def _sync_window(
+    con: duckdb.DuckDBPyConnection, entity: str, days: int, overlap: timedelta, full: bool
+) -> Tuple[Optional[datetime], datetime, datetime, int, bool]:
+    """Janela da sincronização: (cursor atual, início, fim, página inicial, retomada?).
+
+    Execução interrompida (status 'running') é retomada na mesma janela e página; senão começa em
+    `cursor - overlap`. Sem cursor (ou `full=True`), usa os últimos `days` dias.
+    """
+    row = con.execute(
+        "SELECT cursor, window_start, window_end, next_page, status FROM rd_sync_state WHERE entity = ?;",
+        [entity],
+    ).fetchone()
+    cursor = row[0] if row else None
+    if row and row[4] == "running" and not full:
+        return cursor, row[1], row[2], int(row[3] or 1), True
+    end = datetime.now().replace(microsecond=0)
+    if cursor and not full:
+        start = cursor - overlap
+    else:
+        start = datetime.combine(date.today() - timedelta(days=days), time.min)
+    return cursor, start, end, 1, False
+
+
+def _load_contacts_batch(
+    con: duckdb.DuckDBPyConnection, batch: pa.Table, state: Optional[Dict[str, Any]] = None
+) -> int:
+    """Carrega um lote Arrow em fact_rd_contact (upsert por contactId), em transação própria.
 
-    con = duckdb.connect(str(s.data_dir / "warehouse" / "warehouse.duckdb"))
+    `state` (kwargs de `_set_sync_state`) é gravado na mesma transação: o progresso só avança junto
+    com os contatos efetivamente carregados.
+    """
+    tmp = f"_tmp_rd_contacts_{uuid.uuid4().hex}"
+    con.execute("BEGIN TRANSACTION;")
+    try:
+        n = 0
+        if batch.num_rows:
+            con.register(tmp, batch)
+            n = upsert_dataset(
+                con,
+                "rd_contact",
+                f"""
+                SELECT contactId, email, stage, TRY_CAST(updated_at AS TIMESTAMP) AS updated_at,
+                       CAST(seen_on AS DATE) AS seen_on
+                FROM {tmp}
+                WHERE contactId IS NOT NULL
+                """,
+                # O mesmo contato pode aparecer em duas páginas se for atualizado durante a paginação
+                dedupe_order="updated_at DESC NULLS LAST",
+            )
+            con.unregister(tmp)
+        if state:
+            _set_sync_state(con, "contacts", **state)
+        con.execute("COMMIT;")
+    except Exception:
+        con.execute("ROLLBACK;")
+        raise
+    return n
+
+
+def refresh_rd_lead_stage_last_n_days(days: int = 30, full: bool = False) -> str:
+    """Sincroniza contatos por cursor (updated_at) e gera o snapshot por estágio.
+
+    As páginas do RD são consumidas uma a uma em lotes Arrow (CONTACT_BATCH_ROWS) carregados em
+    fact_rd_contact; cada lote grava também a próxima página em rd_sync_state, então uma execução
+    interrompida retoma de onde parou. Ao concluir, o cursor avança para o fim da janela e a próxima
+    execução busca só o que mudou desde então (com CONTACT_CURSOR_OVERLAP). O snapshot por estágio
+    (contatos atualizados nos últimos `days` dias) é agregado no DuckDB a partir de fact_rd_contact.
+    A estrutura de RD pode variar; os campos de estágio são best-effort.
+    """
+    client = RDClient.from_env()
+    today_iso = date.today().isoformat()
+    stage_since = datetime.combine(date.today() - timedelta(days=days), time.min)
+
+    con = get_con()
     con.execute(
         """
         CREATE TABLE IF NOT EXISTS fact_rd_lead_stage_daily (
@@ -40,40 +156,116 @@ def refresh_rd_lead_stage_last_n_days(days: int = 30) -> str:
         );
         """
     )
-    # Inserir um snapshot agregado da janela
-    for stg, cnt in stage_counts.items():
-        con.execute(
-            "INSERT INTO fact_rd_lead_stage_daily(date, stage, count) VALUES (?, ?, ?);",
-            [end_iso, stg, cnt],
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fact_rd_contact (
+            contactId TEXT,
+            email TEXT,
+            stage TEXT,
+            updated_at TIMESTAMP,
+            seen_on DATE
+        );
+        """
+    )
+    _ensure_sync_state(con)
+    cursor, w_start, w_end, first_page, resumed = _sync_window(con, "contacts", days, CONTACT_CURSOR_OVERLAP, full)
+    window = dict(cursor=cursor, window_start=w_start, window_end=w_end)
+    _set_sync_state(con, "contacts", **window, next_page=first_page, status="running")
+
+    cols: dict[str, list] = {name: [] for name in CONTACT_SCHEMA.names}
+    n_contacts = 0
+
+    def flush(state: Dict[str, Any]) -> None:
+        _load_contacts_batch(con, pa.Table.from_pydict(cols, schema=CONTACT_SCHEMA), state)
+        for v in cols.values():
+            v.clear()
+
+    try:
+        pages = client.iter_contact_pages(
+            updated_start_iso=w_start.isoformat(), updated_end_iso=w_end.isoformat(), start_page=first_page
+        )
+        for page_no, page in enumerate(pages, start=first_page):
+            for c in page:
+                cid = c.get("uuid") or c.get("id") or c.get("email")
+                cols["contactId"].append(str(cid) if cid else None)
+                cols["email"].append(c.get("email"))
+                cols["stage"].append(str(_contact_stage(c)))
+                cols["updated_at"].append(c.get("updated_at") or c.get("last_conversion_date"))
+                cols["seen_on"].append(today_iso)
+                n_contacts += 1
+            if len(cols["contactId"]) >= CONTACT_BATCH_ROWS:
+                flush({**window, "next_page": page_no + 1, "status": "running"})
+        # Último lote e avanço do cursor na mesma transação
+        flush({**window, "cursor": w_end, "next_page": 1, "status": "done"})
+    except Exception:
+        con.close()
+        raise
+
+    # Snapshot por estágio, chaveado por (date, stage): reexecuções no mesmo dia sobrescrevem
+    con.execute("BEGIN TRANSACTION;")
+    try:
+        upsert_dataset(
+            con,
+            "rd_lead_stage_daily",
+            """
+            SELECT CAST(? AS DATE) AS date, stage, COUNT(*) AS count
+            FROM fact_rd_contact
+            WHERE COALESCE(updated_at, CAST(seen_on AS TIMESTAMP)) >= ?
+            GROUP BY stage
+            """,
+            [today_iso, stage_since],
         )
+        n_stages = (con.execute(
+            "SELECT COUNT(*) FROM fact_rd_lead_stage_daily WHERE date = CAST(? AS DATE);", [today_iso]
+        ).fetchone() or (0,))[0]
+        con.execute("COMMIT;")
+    except Exception:
+        con.execute("ROLLBACK;")
+        con.close()
+        raise
     con.close()
-    return f"RD: atualizado fact_rd_lead_stage_daily com {len(stage_counts)} estágios (janela {start_iso}..{end_iso})"
+    how = f"retomada da página {first_page}" if resumed else "incremental" if cursor and not full else "completa"
+    return (
+        f"RD: fact_rd_contact +{n_contacts} contatos ({how}, {w_start:%Y-%m-%d %H:%M}..{w_end:%Y-%m-%d %H:%M}); "
+        f"fact_rd_lead_stage_daily com {n_stages} estágios"
+    )
 
 
-def refresh_rd_email_campaign_last_n_days(days: int = 30) -> str:
+def _ensure_campaign_state(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rd_campaign_state (
+            campaignId TEXT PRIMARY KEY,
+            send_date DATE,
+            etag TEXT,
+            last_modified TEXT,
+            is_final BOOLEAN,
+            checked_at TIMESTAMP
+        );
+        """
+    )
+
+
+def refresh_rd_email_campaign_last_n_days(days: int = 30, full: bool = False) -> str:
     """Materializa campanhas de e-mail (RD) com métricas básicas em fact_rd_email_campaign.
 
     Colunas: date, campaignId, sends, opens, clicks
+    Incremental por cursor de envio (rd_sync_state): busca campanhas enviadas desde o último cursor
+    menos CAMPAIGN_CURSOR_OVERLAP (ou desde a campanha não assentada mais antiga, limitado a `days`);
+    a primeira execução (ou `full=True`) cobre os últimos `days` dias.
+    O cursor só avança após o commit, então uma execução interrompida refaz a mesma janela.
+
+    Assentamento (rd_campaign_state): campanha enviada há mais de RD_CAMPAIGN_SETTLE_DAYS dias cujas
+    métricas não mudaram na última consulta é marcada final e não é mais consultada; as demais usam
+    requisição condicional (ETag/Last-Modified). `full=True` ignora o assentamento. Campanhas que a API
+    recusa (400/404/422) não são gravadas nem assentadas: só respostas 200 ou 304 assentam.
     """
     s = get_settings()
     client = RDClient.from_env()
-    end = date.today()
-    start = end - timedelta(days=days)
-    start_iso, end_iso = start.isoformat(), end.isoformat()
-
-    campaigns = client.fetch_email_campaigns(start_iso=start_iso, end_iso=end_iso)
-    # Monta registros com data (data de envio se disponível)
-    rows: list[tuple[str, str, int, int, int]] = []
-    for c in campaigns:
-        cid = str(c.get("id") or c.get("campaignId") or c.get("uuid") or "")
-        if not cid:
-            continue
-        send_dt = c.get("send_datetime") or c.get("sent_at") or c.get("scheduled_at") or c.get("created_at")
-        send_date = (send_dt or end_iso)[:10]
-        m = client.fetch_email_metrics(cid)
-        rows.append((send_date, cid, int(m.get("sends", 0)), int(m.get("opens", 0)), int(m.get("clicks", 0))))
 
-    con = duckdb.connect(str(s.data_dir / "warehouse" / "warehouse.duckdb"))
+    con = get_con()
+    _ensure_sync_state(con)
+    _ensure_campaign_state(con)
     con.execute(
         """
         CREATE TABLE IF NOT EXISTS fact_rd_email_campaign (
@@ -85,21 +277,120 @@ def refresh_rd_email_campaign_last_n_days(days: int = 30) -> str:
         );
         """
     )
+    cursor, w_start, w_end, _, _ = _sync_window(con, "email_campaigns", days, CAMPAIGN_CURSOR_OVERLAP, full)
+    if not full:
+        # Campanhas ainda não assentadas continuam na janela, até `days` dias atrás
+        oldest = con.execute("SELECT MIN(send_date) FROM rd_campaign_state WHERE NOT is_final;").fetchone()[0]
+        if oldest is not None:
+            floor = date.today() - timedelta(days=days)
+            w_start = min(w_start, datetime.combine(max(oldest, floor), time.min))
+    _set_sync_state(
+        con, "email_campaigns", cursor=cursor, window_start=w_start, window_end=w_end, next_page=1, status="running"
+    )
+    start_iso, end_iso = w_start.date().isoformat(), w_end.date().isoformat()
+
+    try:
+        campaigns = client.fetch_email_campaigns(start_iso=start_iso, end_iso=end_iso)
+    except Exception:
+        con.close()
+        raise
+    # Data de envio por campanha (se disponível)
+    send_dates: dict[str, str] = {}
+    for c in campaigns:
+        cid = str(c.get("id") or c.get("campaignId") or c.get("uuid") or "")
+        if not cid:
+            continue
+        send_dt = c.get("send_datetime") or c.get("sent_at") or c.get("scheduled_at") or c.get("created_at")
+        send_dates[cid] = (send_dt or end_iso)[:10]
+
+    ids = list(send_dates)
+    state = {
+        r[0]: r[1:]
+        for r in con.execute(
+            "SELECT campaignId, etag, last_modified, is_final FROM rd_campaign_state WHERE campaignId IN (SELECT unnest(?));",
+            [ids],
+        ).fetchall()
+    }
+    current = {
+        r[0]: tuple(r[1:])
+        for r in con.execute(
+            "SELECT campaignId, sends, opens, clicks FROM fact_rd_email_campaign WHERE campaignId IN (SELECT unnest(?));",
+            [ids],
+        ).fetchall()
+    }
+    pending: Dict[str, Dict[str, Optional[str]]] = {}
+    for cid in ids:
+        etag, last_modified, is_final = state.get(cid, (None, None, False))
+        if full:
+            pending[cid] = {}
+        elif not is_final:
+            pending[cid] = {"etag": etag, "last_modified": last_modified} if cid in current else {}
+    # Métricas em paralelo (pool limitado) na sessão keep-alive do cliente
+    try:
+        results = client.fetch_email_metrics_many_conditional(pending)
+    except Exception:
+        con.close()
+        raise
+
+    settle_before = (date.today() - timedelta(days=s.rd_campaign_settle_days)).isoformat()
+    rows: list[tuple[str, str, int, int, int]] = []
+    state_rows: list[tuple[str, str, Optional[str], Optional[str], bool]] = []
+    not_modified = rejected = 0
+    for cid, (m, validators) in results.items():
+        send_date = send_dates[cid]
+        if validators is None:
+            # Recusada pela API (400/404/422): mantém métricas e estado atuais, sem assentar
+            rejected += 1
+            continue
+        if m is None:
+            not_modified += 1
+            unchanged = True
+        else:
+            row = (int(m.get("sends", 0)), int(m.get("opens", 0)), int(m.get("clicks", 0)))
+            unchanged = current.get(cid) == row
+            rows.append((send_date, cid, *row))
+        final = unchanged and cid in current and send_date <= settle_before
+        state_rows.append((cid, send_date, validators.get("etag"), validators.get("last_modified"), final))
+
     con.execute("BEGIN TRANSACTION;")
     try:
-        # Apaga janela e insere novamente (idempotente por janela)
-        con.execute("DELETE FROM fact_rd_email_campaign WHERE date BETWEEN ? AND ?;", [start_iso, end_iso])
+        # Upsert por campaignId: só grava campanhas novas ou com métricas alteradas
+        n = 0
         if rows:
+            values = ", ".join(["(?, ?, ?, ?, ?)"] * len(rows))
+            n = upsert_dataset(
+                con,
+                "rd_email_campaign",
+                f"""
+                SELECT CAST(d AS DATE) AS date, CAST(cid AS TEXT) AS campaignId, CAST(se AS BIGINT) AS sends,
+                       CAST(op AS BIGINT) AS opens, CAST(cl AS BIGINT) AS clicks
+                FROM (VALUES {values}) v(d, cid, se, op, cl)
+                """,
+                [x for r in rows for x in r],
+            )
+        if state_rows:
             con.executemany(
-                "INSERT INTO fact_rd_email_campaign(date, campaignId, sends, opens, clicks) VALUES (?, ?, ?, ?, ?);",
-                rows,
+                """
+                INSERT INTO rd_campaign_state VALUES (?, CAST(? AS DATE), ?, ?, ?, current_timestamp::TIMESTAMP)
+                ON CONFLICT (campaignId) DO UPDATE SET send_date = excluded.send_date, etag = excluded.etag,
+                    last_modified = excluded.last_modified, is_final = excluded.is_final,
+                    checked_at = excluded.checked_at;
+                """,
+                [list(r) for r in state_rows],
             )
+        _set_sync_state(
+            con, "email_campaigns", cursor=w_end, window_start=w_start, window_end=w_end, next_page=1, status="done"
+        )
         con.execute("COMMIT;")
     except Exception:
         con.execute("ROLLBACK;")
         con.close()
         raise
     con.close()
-    return f"RD: atualizado fact_rd_email_campaign para {start_iso}..{end_iso} (n={len(rows)})"
+    skipped = len(ids) - len(pending)
+    return (
+        f"RD: atualizado fact_rd_email_campaign para {start_iso}..{end_iso} (n={len(ids)}, consultadas={len(pending)}, "
+        f"assentadas={skipped}, 304={not_modified}, recusadas={rejected}, novas/alteradas={n})"
+    )
 
 
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+from datetime import datetime
+import hashlib
+import hmac
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+import uuid
+
+import duckdb
+import pyarrow as pa
+
+from configs.settings import get_settings
+from services.warehouse import get_con, upsert_dataset
+
+
+WEBHOOK_PATH = "/rd/webhook"
+
+EVENT_SCHEMA = pa.schema(
+    [
+        ("event_id", pa.string()),
+        ("date", pa.string()),
+        ("received_at", pa.string()),
+        ("event_type", pa.string()),
+        ("contactId", pa.string()),
+        ("email", pa.string()),
+        ("stage", pa.string()),
+        ("campaignId", pa.string()),
+        ("payload", pa.string()),
+    ]
+)
+
+
+class WebhookLog:
+    """Log durável de eventos recebidos (JSONL com fsync), consumido em micro-lotes.
+
+    `append` grava em events.jsonl; `seal` renomeia o arquivo ativo para batch-<ns>.jsonl e devolve
+    os lotes pendentes. Um lote só é apagado depois do commit no warehouse, então eventos
+    sobrevivem a quedas do processo e são reprocessados na próxima descarga.
+    """
+
+    def __init__(self, directory: Optional[Path] = None) -> None:
+        self.directory = directory or (get_settings().data_dir / "rd_webhook")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.active = self.directory / "events.jsonl"
+        self._lock = threading.Lock()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            with open(self.active, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def seal(self) -> List[Path]:
+        with self._lock:
+            if self.active.exists() and self.active.stat().st_size > 0:
+                os.replace(self.active, self.directory / f"batch-{time.time_ns()}.jsonl")
+        return sorted(self.directory.glob("batch-*.jsonl"))
+
+
+def _events_from_record(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Normaliza um registro do log em eventos (um por lead, ou o próprio evento de e-mail)."""
+    body = record.get("body") or {}
+    received_at = record.get("received_at") or datetime.now().isoformat(timespec="seconds")
+    kind = record.get("type")
+    out: List[Dict[str, Any]] = []
+    # Conversão / mudança de estágio: {"leads": [...]} (kind vem da URL configurada no RD)
+    items = body.get("leads") if isinstance(body, dict) and isinstance(body.get("leads"), list) else [body]
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        raw = json.dumps(item, ensure_ascii=False, sort_keys=True)
+        when = (
+            (item.get("last_conversion") or {}).get("created_at")
+            or item.get("event_timestamp")
+            or item.get("created_at")
+            or received_at
+        )
+        contact = item.get("uuid") or item.get("id") or item.get("contact_uuid") or item.get("email")
+        out.append(
+            {
+                "event_id": hashlib.sha1(f"{kind}|{raw}".encode("utf-8")).hexdigest(),
+                "date": str(when)[:10],
+                "received_at": received_at,
+                "event_type": kind or item.get("event_type") or "conversion",
+                "contactId": str(contact) if contact else None,
+                "email": item.get("email") or item.get("contact_email"),
+                "stage": item.get("lead_stage") or item.get("lifecycle_stage"),
+                "campaignId": str(item["campaign_id"]) if item.get("campaign_id") is not None else None,
+                "payload": raw,
+            }
+        )
+    return out
+
+
+def flush_webhook_log(log: WebhookLog, con: Optional[duckdb.DuckDBPyConnection] = None) -> int:
+    """Descarrega os lotes pendentes no warehouse (eventos + estágio atual do contato).
+
+    Idempotente: event_id é o hash do conteúdo, então um lote reprocessado não duplica linhas.
+    Retorna o número de eventos lidos.
+    """
+    batches = log.seal()
+    if not batches:
+        return 0
+    events: List[Dict[str, Any]] = []
+    for path in batches:
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                events.extend(_events_from_record(json.loads(line)))
+
+    own = con is None
+    con = con or get_con()
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fact_rd_webhook_event (
+            event_id TEXT,
+            date DATE,
+            received_at TIMESTAMP,
+            event_type TEXT,
+            contactId TEXT,
+            email TEXT,
+            stage TEXT,
+            campaignId TEXT,
+            payload TEXT
+        );
+        """
+    )
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fact_rd_contact (
+            contactId TEXT,
+            email TEXT,
+            stage TEXT,
+            updated_at TIMESTAMP,
+            seen_on DATE
+        );
+        """
+    )
+    tmp = f"_tmp_rd_webhook_{uuid.uuid4().hex}"
+    con.execute("BEGIN TRANSACTION;")
+    try:
+        if events:
+            table = pa.Table.from_pylist(events, schema=EVENT_SCHEMA)
+            con.register(tmp, table)
+            upsert_dataset(
+                con,
+                "rd_webhook_event",
+                f"""
+                SELECT event_id, TRY_CAST(date AS DATE) AS date, TRY_CAST(received_at AS TIMESTAMP) AS received_at,
+                       event_type, contactId, email, stage, campaignId, payload
+                FROM {tmp}
+                """,
+                dedupe_order="received_at",
+            )
+            # Estágio mais recente por contato (só eventos que trazem estágio)
+            upsert_dataset(
+                con,
+                "rd_contact",
+                f"""
+                SELECT contactId, email, stage, TRY_CAST(received_at AS TIMESTAMP) AS updated_at,
+                       TRY_CAST(date AS DATE) AS seen_on
+                FROM {tmp}
+                WHERE contactId IS NOT NULL AND stage IS NOT NULL
+                QUALIFY row_number() OVER (PARTITION BY contactId ORDER BY received_at DESC) = 1
+                """,
+            )
+            con.unregister(tmp)
+        con.execute("COMMIT;")
+    except Exception:
+        con.execute("ROLLBACK;")
+        if own:
+            con.close()
+        raise
+    if own:
+        con.close()
+    for path in batches:
+        path.unlink()
+    return len(events)
+
+
+class WebhookFlusher(threading.Thread):
+    """Descarrega o log a cada `interval` segundos até `stop()` (com uma descarga final).
+
+    Falhas não derrubam a thread (o lote fica para a próxima tentativa): vão para `on_error` e
+    ficam em `last_error` até a próxima descarga bem-sucedida.
+    """
+
+    def __init__(
+        self,
+        log: WebhookLog,
+        interval: float = 5.0,
+        on_flush: Optional[Callable[[int], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ) -> None:
+        super().__init__(name="rd-webhook-flusher", daemon=True)
+        self.log = log
+        self.interval = interval
+        self.on_flush = on_flush
+        self.on_error = on_error
+        self.last_error: Optional[Exception] = None
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self._flush_once()
+        self._flush_once()
+
+    def _flush_once(self) -> None:
+        try:
+            n = flush_webhook_log(self.log)
+        except Exception as e:  # mantém o servidor no ar; o lote fica para a próxima tentativa
+            self.last_error = e
+            if self.on_error:
+                self.on_error(e)
+            return
+        self.last_error = None
+        if n and self.on_flush:
+            self.on_flush(n)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+def make_webhook_server(
+    log: WebhookLog, host: str = "127.0.0.1", port: int = 8051, secret: Optional[str] = None
+) -> ThreadingHTTPServer:
+    """Servidor HTTP que recebe POSTs do RD em /rd/webhook e os grava no log antes de responder 202.
+
+    O tipo do evento vem de `?type=` (uma URL por gatilho configurado no RD). Com `secret`, exige
+    `?token=` ou o header X-Webhook-Token.
+    """
+
+    class _WebhookHandler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, body: bytes = b"") -> None:
+            self.send_response(code)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):  # type: ignore[override]
+            if urlparse(self.path).path == "/health":
+                self._reply(200, b"ok")
+            else:
+                self._reply(404, b"Not Found")
+
+        def do_POST(self):  # type: ignore[override]
+            parsed = urlparse(self.path)
+            if parsed.path != WEBHOOK_PATH:
+                self._reply(404, b"Not Found")
+                return
+            qs = parse_qs(parsed.query)
+            token = (qs.get("token") or [None])[0] or self.headers.get("X-Webhook-Token")
+            # Comparação em tempo constante: não vaza o segredo pelo tempo de resposta
+            if secret and not hmac.compare_digest((token or "").encode("utf-8"), secret.encode("utf-8")):
+                self._reply(401, b"Unauthorized")
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._reply(400, b"JSON invalido")
+                return
+            log.append(
+                {
+                    "received_at": datetime.now().isoformat(timespec="milliseconds"),
+                    "type": (qs.get("type") or [None])[0],
+                    "body": body,
+                }
+            )
+            self._reply(202, b"accepted")
+
+        def log_message(self, format: str, *args: Any) -> None:  # silencia o log padrão por requisição
+            return
+
+    return ThreadingHTTPServer((host, port), _WebhookHandler)
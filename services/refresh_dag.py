@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+import time
+from typing import Callable, Dict, List, Optional
+import uuid
+
+from services.warehouse import changes_since, ensure_change_log, get_con, prune_change_log
+
+
+@dataclass
+class Node:
+    """Nó do DAG de refresh.
+
+    `consumer`/`inputs`: quando definidos, o nó é pulado se nenhuma das tabelas de entrada
+    registrou mudança (etl_change_log) desde a última execução do consumidor.
+    """
+
+    name: str
+    fn: Callable[[], str]
+    deps: List[str] = field(default_factory=list)
+    consumer: Optional[str] = None
+    inputs: List[str] = field(default_factory=list)
+
+
+@dataclass
+class NodeResult:
+    name: str
+    status: str  # ok | error | skipped
+    message: str = ""
+    started_at: Optional[datetime] = None
+    seconds: float = 0.0
+
+
+def _validate(nodes: List[Node]) -> Dict[str, Node]:
+    by_name = {n.name: n for n in nodes}
+    for n in nodes:
+        missing = [d for d in n.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"DAG: nó {n.name} depende de nós inexistentes: {missing}")
+    # Detecta ciclos (DFS)
+    state: Dict[str, int] = {}
+
+    def visit(name: str) -> None:
+        if state.get(name) == 1:
+            raise ValueError(f"DAG: ciclo detectado em {name}")
+        if state.get(name) == 2:
+            return
+        state[name] = 1
+        for d in by_name[name].deps:
+            visit(d)
+        state[name] = 2
+
+    for n in nodes:
+        visit(n.name)
+    return by_name
+
+
+def _inputs_unchanged(node: Node) -> bool:
+    if not node.consumer or not node.inputs:
+        return False
+    con = get_con()
+    try:
+        dates, _ = changes_since(con, node.consumer, node.inputs)
+    finally:
+        con.close()
+    return dates == []
+
+
+def _run_node(node: Node) -> NodeResult:
+    started = datetime.now()
+    t0 = time.perf_counter()
+    try:
+        if _inputs_unchanged(node):
+            return NodeResult(node.name, "skipped", "entradas inalteradas", started, time.perf_counter() - t0)
+        msg = node.fn()
+        return NodeResult(node.name, "ok", str(msg), started, time.perf_counter() - t0)
+    except Exception as e:
+        return NodeResult(node.name, "error", f"{type(e).__name__}: {e}", started, time.perf_counter() - t0)
+
+
+def run_dag(
+    nodes: List[Node],
+    *,
+    max_workers: int = 4,
+    record: bool = True,
+    on_result: Optional[Callable[[NodeResult], None]] = None,
+) -> Dict[str, NodeResult]:
+    """Executa o DAG: nós independentes em paralelo; cada nó dispara assim que suas dependências concluem.
+
+    Falha de uma dependência não bloqueia os dependentes: as materializações consomem apenas mudanças
+    já commitadas (etl_change_log), então rodam com o que as demais fontes entregaram. Com
+    `record=True`, grava status e tempo de cada nó em etl_run_log.
+    """
+    by_name = _validate(nodes)
+    results: Dict[str, NodeResult] = {}
+    pending = dict(by_name)
+    running: Dict[Future, str] = {}
+
+    if record:
+        # Cria o log de mudanças antes dos workers para evitar conflito de catálogo entre threads
+        con = get_con()
+        try:
+            ensure_change_log(con)
+        finally:
+            con.close()
+
+    def finish(res: NodeResult) -> None:
+        results[res.name] = res
+        if on_result:
+            on_result(res)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for name, node in list(pending.items()):
+                if not all(d in results for d in node.deps):
+                    continue
+                del pending[name]
+                running[pool.submit(_run_node, node)] = name
+            if not running:
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in done:
+                running.pop(fut)
+                finish(fut.result())
+
+    if record:
+        _record_run(results)
+        # Com todas as materializações concluídas, o log já consumido pode ser apagado
+        con = get_con()
+        try:
+            prune_change_log(con)
+        finally:
+            con.close()
+    return results
+
+
+def _record_run(results: Dict[str, NodeResult]) -> None:
+    run_id = uuid.uuid4().hex
+    con = get_con()
+    try:
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS etl_run_log (
+                run_id TEXT,
+                node TEXT,
+                status TEXT,
+                started_at TIMESTAMP,
+                seconds DOUBLE,
+                message TEXT
+            );
+            """
+        )
+        con.executemany(
+            "INSERT INTO etl_run_log VALUES (?, ?, ?, ?, ?, ?);",
+            [[run_id, r.name, r.status, r.started_at, r.seconds, r.message] for r in results.values()],
+        )
+    finally:
+        con.close()
+
+
+def default_nodes(days: int = 30, map_csv_path: Optional[str] = None) -> List[Node]:
+    """DAG padrão: fontes GA4/YouTube/RD e mapeamento UTM → materializações derivadas."""
+    from services import comms_impact_refresh, engagement_refresh, ga4_refresh, rd_refresh, snapshots, utm_service, youtube_refresh
+
+    nodes = [
+        Node("ga4_sessions", lambda: ga4_refresh.refresh_sessions_last_n_days(days)),
+        Node("ga4_events", lambda: ga4_refresh.refresh_events_last_n_days(days)),
+        Node("ga4_pages", lambda: ga4_refresh.refresh_pages_last_n_days(days)),
+        Node("ga4_utm", lambda: ga4_refresh.refresh_sessions_by_utm_last_n_days(days)),
+        Node("youtube", lambda: youtube_refresh.refresh_yt_channel_and_videos(days)),
+        Node("yt_dim_video", youtube_refresh.enrich_dim_video, deps=["youtube"]),
+        Node("rd_campaigns", lambda: rd_refresh.refresh_rd_email_campaign_last_n_days(days)),
+        Node("map_utm_campaign", lambda: utm_service.import_map_utm_campaign(map_csv_path)),
+        Node(
+            "engagement",
+            engagement_refresh.materialize_engagement_daily,
+            deps=["ga4_sessions", "youtube"],
+            consumer="engagement_daily",
+            inputs=list(engagement_refresh.UPSTREAM_TABLES),
+        ),
+        Node(
+            "comms_daily",
+            comms_impact_refresh.materialize_comms_impact_daily,
+            deps=["ga4_utm", "map_utm_campaign"],
+            consumer="comms_impact_daily",
+            inputs=list(comms_impact_refresh.DAILY_UPSTREAM_TABLES),
+        ),
+        Node(
+            "comms_summary",
+            comms_impact_refresh.materialize_comms_impact_summary,
+            deps=["comms_daily", "rd_campaigns"],
+            consumer="comms_impact_summary",
+            inputs=list(comms_impact_refresh.SUMMARY_UPSTREAM_TABLES),
+        ),
+    ]
+    # Snapshots do dashboard por último, com o warehouse já na versão final deste refresh
+    nodes.append(Node("dashboard_snapshots", snapshots.build_snapshots, deps=[n.name for n in nodes]))
+    return nodes
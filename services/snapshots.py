@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import duckdb
+
+from configs.settings import get_settings
+from services import data_service as ds
+from services.warehouse import get_read_con, warehouse_version
+
+
+# Pontos por série enviados ao navegador (LTTB no servidor)
+CHART_MAX_POINTS = 1000
+# Intervalo mínimo entre consultas da versão do warehouse ao servir snapshots
+VERSION_CHECK_SECONDS = 5.0
+
+# Cards por período (start, end); os nomes são os usados pelo dashboard em `load_card`
+CARDS: Dict[str, Callable[[str, str], Any]] = {
+    "kpis": ds.get_kpis,
+    "engagement_kpis": ds.get_engagement_kpis,
+    "wow": lambda s, e: ds.get_wow_comparatives(e),
+    "mtd": lambda s, e: ds.get_mtd_vs_prev_month(e),
+    "v7v28": lambda s, e: ds.get_7_vs_28(e),
+    "engagement_series": lambda s, e: ds.get_engagement_series(s, e, max_points=CHART_MAX_POINTS),
+    "yt_channel_daily": lambda s, e: ds.get_yt_channel_daily(s, e, max_points=CHART_MAX_POINTS),
+    "top_pages": lambda s, e: ds.get_top_pages(s, e, 10),
+    "top_countries": lambda s, e: ds.get_top_countries(s, e, 10),
+    "top_days": ds.get_top_days,
+    "video_funnel": ds.get_video_funnel,
+    "yt_top_videos": lambda s, e: ds.get_yt_top_videos(s, e, 20),
+    "yt_retention": lambda s, e: ds.get_yt_retention_by_video(s, e, 20),
+    "pages_pareto": lambda s, e: ds.get_pages_pareto(s, e, 20),
+    "utm": lambda s, e: ds.get_utm_aggregate(s, e, 20),
+    "rd_kpis": ds.get_rd_kpis,
+}
+# Cards que não dependem do período (calculados uma vez por snapshot)
+GLOBAL_CARDS: Dict[str, Callable[[], Any]] = {
+    "pages_weekly": lambda: ds.get_pages_weekly_comparison(8),
+    "comms_summary": lambda: ds.get_comms_summary(10),
+}
+
+_cache: Dict[str, Any] = {"mtime": None, "snapshot": None, "version": None, "checked": 0.0}
+_cache_lock = threading.Lock()
+
+
+def _snapshot_path() -> Path:
+    return get_settings().data_dir / "snapshots" / "dashboard.json"
+
+
+def default_windows(today: Optional[date] = None) -> Dict[str, Tuple[str, str]]:
+    """Janelas pré-calculadas: 7d (padrão do dashboard), 28d, MTD e mês anterior."""
+    today = today or date.today()
+    first = today.replace(day=1)
+    prev_last = first - timedelta(days=1)
+    return {
+        "7d": ((today - timedelta(days=7)).isoformat(), today.isoformat()),
+        "28d": ((today - timedelta(days=28)).isoformat(), today.isoformat()),
+        "mtd": (first.isoformat(), today.isoformat()),
+        "prev_month": (prev_last.replace(day=1).isoformat(), prev_last.isoformat()),
+    }
+
+
+def build_snapshots() -> str:
+    """Pré-calcula todos os cards das janelas padrão e grava data/snapshots/dashboard.json.
+
+    O snapshot carrega a versão do warehouse (seq do etl_change_log) em que foi calculado; é
+    servido apenas enquanto essa versão e o dia continuarem os mesmos. Cards que falham ficam
+    de fora e são consultados ao vivo.
+    """
+    con = get_read_con()
+    try:
+        version = warehouse_version(con)
+    finally:
+        con.close()
+    windows: Dict[str, Any] = {}
+    failed = 0
+    for name, (start_s, end_s) in default_windows().items():
+        cards: Dict[str, Any] = {}
+        for card, fn in CARDS.items():
+            try:
+                cards[card] = fn(start_s, end_s)
+            except Exception:
+                failed += 1
+        windows[name] = {"start": start_s, "end": end_s, "cards": cards}
+    global_cards: Dict[str, Any] = {}
+    for card, fn in GLOBAL_CARDS.items():
+        try:
+            global_cards[card] = fn()
+        except Exception:
+            failed += 1
+    snapshot = {
+        "version": version,
+        "as_of": date.today().isoformat(),
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+        "windows": windows,
+        "global": global_cards,
+    }
+    path = _snapshot_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(snapshot, ensure_ascii=False, separators=(",", ":"), default=str), encoding="utf-8")
+    os.replace(tmp, path)
+    return f"Snapshots do dashboard gerados (versão {version}, {len(windows)} janelas, {failed} cards indisponíveis)"
+
+
+def _current_snapshot() -> Optional[Dict[str, Any]]:
+    """Snapshot em memória (relido só quando o arquivo muda), se ainda válido para o warehouse atual."""
+    path = _snapshot_path()
+    with _cache_lock:
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        if _cache["mtime"] != mtime:
+            try:
+                _cache["snapshot"] = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                return None
+            _cache["mtime"] = mtime
+            _cache["checked"] = 0.0
+        snap = _cache["snapshot"]
+        if snap.get("as_of") != date.today().isoformat():
+            return None
+        now = time.monotonic()
+        if now - _cache["checked"] > VERSION_CHECK_SECONDS:
+            try:
+                con = get_read_con()
+            except duckdb.Error:  # warehouse bloqueado por outro processo: consulta ao vivo
+                return None
+            try:
+                _cache["version"] = warehouse_version(con)
+            finally:
+                con.close()
+            _cache["checked"] = now
+        return snap if snap.get("version") == _cache["version"] else None
+
+
+def load_card(card: str, start_s: Optional[str] = None, end_s: Optional[str] = None) -> Any:
+    """Dados de um card: do snapshot quando o período coincide com uma janela padrão, senão ao vivo."""
+    snap = _current_snapshot()
+    if card in GLOBAL_CARDS:
+        if snap is not None and card in snap.get("global", {}):
+            return snap["global"][card]
+        return GLOBAL_CARDS[card]()
+    if snap is not None:
+        for window in snap.get("windows", {}).values():
+            if window["start"] == start_s and window["end"] == end_s and card in window["cards"]:
+                return window["cards"][card]
+    return CARDS[card](start_s, end_s)
@@ -2,16 +2,13 @@ from __future__ import annotations
 
 from pathlib import Path
 
-import duckdb
-
 from configs.settings import get_settings
+from services.warehouse import get_con, log_changes
 
 
 def _get_db_con():
-    s = get_settings()
-    db_path = s.data_dir / "warehouse" / "warehouse.duckdb"
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    return duckdb.connect(str(db_path))
+    # Mesma conexão de escrita do warehouse: roda também como job dentro do processo do dashboard
+    return get_con()
 
 
 def import_map_utm_campaign(csv_path: str | None = None) -> str:
@@ -41,12 +38,12 @@ def import_map_utm_campaign(csv_path: str | None = None) -> str:
     )
     con.execute("BEGIN TRANSACTION;")
     try:
-        con.execute("DELETE FROM map_utm_campaign;")
+        con.execute("CREATE OR REPLACE TEMP TABLE _map_new AS SELECT * FROM map_utm_campaign LIMIT 0;")
         if path.exists():
             norm_path = str(path).replace("\\", "/")
             con.execute(
                 """
-                INSERT INTO map_utm_campaign(utm_source, utm_medium, utm_campaign, campaignId, campaign_name, utm_source_norm, utm_medium_norm, utm_campaign_norm)
+                INSERT INTO _map_new(utm_source, utm_medium, utm_campaign, campaignId, campaign_name, utm_source_norm, utm_medium_norm, utm_campaign_norm)
                 SELECT
                   utm_source,
                   utm_medium,
@@ -60,12 +57,31 @@ def import_map_utm_campaign(csv_path: str | None = None) -> str:
                 """,
                 [norm_path],
             )
+        # Só reescreve (e sinaliza mudança) se o conteúdo do CSV difere da tabela atual
+        diff = con.execute(
+            """
+            SELECT COUNT(*) FROM (
+              (SELECT * FROM map_utm_campaign EXCEPT ALL SELECT * FROM _map_new)
+              UNION ALL
+              (SELECT * FROM _map_new EXCEPT ALL SELECT * FROM map_utm_campaign)
+            );
+            """
+        ).fetchone()
+        changed = bool(diff and diff[0])
+        if changed:
+            con.execute("DELETE FROM map_utm_campaign;")
+            con.execute("INSERT INTO map_utm_campaign SELECT * FROM _map_new;")
+            # Mapeamento afeta todas as datas: consumidores (comms impact) fazem recálculo completo
+            log_changes(con, "map_utm_campaign", [None])
+        con.execute("DROP TABLE _map_new;")
         con.execute("COMMIT;")
     except Exception:
         con.execute("ROLLBACK;")
         con.close()
         raise
     con.close()
+    if not changed:
+        return f"map_utm_campaign sem mudanças ({path})"
     return f"map_utm_campaign importado de {path if path.exists() else '(arquivo não encontrado; tabela limpa)'}"
 
 
@@ -0,0 +1,383 @@
+from __future__ import annotations
+
+from datetime import date
+from pathlib import Path
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import duckdb
+
+from configs.datasets import get_dataset, natural_key
+from configs.settings import get_settings
+
+
+# O DuckDB recusa, no mesmo processo, conexões ao arquivo com configurações diferentes
+# (somente leitura x escrita) enquanto alguma das duas estiver aberta
+_CONFIG_CONFLICT = "different configuration"
+# Espera máxima da conexão de escrita por leitores somente leitura do próprio processo
+WRITE_CONNECT_WAIT_SECONDS = 10.0
+
+
+def get_db_path() -> Path:
+    s = get_settings()
+    db_path = s.data_dir / "warehouse" / "warehouse.duckdb"
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    return db_path
+
+
+def get_con() -> duckdb.DuckDBPyConnection:
+    """Conexão de escrita.
+
+    No processo do dashboard os jobs de refresh convivem com leitores somente leitura
+    (`get_read_con`); eles duram uma consulta, então a abertura é repetida até que fechem.
+    """
+    db_path = get_db_path()
+    deadline = time.monotonic() + WRITE_CONNECT_WAIT_SECONDS
+    while True:
+        try:
+            return duckdb.connect(str(db_path))
+        except duckdb.ConnectionException as e:
+            if _CONFIG_CONFLICT not in str(e) or time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def get_read_con() -> duckdb.DuckDBPyConnection:
+    """Conexão somente leitura para consultas (dashboard, servidor de API).
+
+    Leitores somente leitura de processos diferentes não se bloqueiam; com uma conexão de escrita,
+    o arquivo fica travado para todos os outros processos. Se este processo já tem uma conexão de
+    escrita aberta (job de refresh em andamento), usa a mesma configuração.
+    """
+    db_path = get_db_path()
+    if not db_path.exists():
+        duckdb.connect(str(db_path)).close()
+    try:
+        return duckdb.connect(str(db_path), read_only=True)
+    except duckdb.ConnectionException as e:
+        if _CONFIG_CONFLICT not in str(e):
+            raise
+        return duckdb.connect(str(db_path))
+
+
+def _index_name(table: str) -> str:
+    return f"ux_{table}__natural_key"
+
+
+def ensure_natural_key(con: duckdb.DuckDBPyConnection, table: str, key: Sequence[str]) -> None:
+    """Garante índice UNIQUE na chave natural da tabela.
+
+    Tabelas legadas (criadas antes do índice) podem conter duplicatas acumuladas por
+    execuções antigas em modo append; nesse caso mantém a linha mais recente (maior rowid)
+    de cada chave antes de criar o índice.
+    """
+    exists = con.execute(
+        "SELECT COUNT(*) FROM duckdb_indexes() WHERE table_name = ? AND index_name = ?;",
+        [table, _index_name(table)],
+    ).fetchone()
+    if exists and exists[0]:
+        return
+    cols = ", ".join(key)
+    try:
+        con.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {_index_name(table)} ON {table}({cols});")
+    except duckdb.ConstraintException:
+        con.execute(
+            f"""
+            CREATE OR REPLACE TABLE {table} AS
+            SELECT * FROM {table}
+            QUALIFY row_number() OVER (PARTITION BY {cols} ORDER BY rowid DESC) = 1;
+            """
+        )
+        con.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {_index_name(table)} ON {table}({cols});")
+
+
+def upsert(
+    con: duckdb.DuckDBPyConnection,
+    table: str,
+    key: Sequence[str],
+    source_sql: str,
+    params: Optional[List[Any]] = None,
+    dedupe_order: Optional[str] = None,
+    insert_only: Sequence[str] = (),
+) -> int:
+    """Aplica `INSERT ... ON CONFLICT DO UPDATE` com detecção de mudança.
+
+    `source_sql` é um SELECT cujas colunas têm os nomes das colunas de `table`. Linhas
+    idênticas às já gravadas não são reescritas. Retorna o número de linhas novas ou alteradas.
+    Colunas em `insert_only` (ex.: data da primeira vez visto) são gravadas só na inserção e não
+    contam como mudança.
+    A origem deve ser única na chave; com `dedupe_order` (expressão ORDER BY) fica a primeira
+    linha de cada chave nessa ordem, sem ele chaves repetidas levantam ValueError.
+    """
+    params = params or []
+    ensure_natural_key(con, table, key)
+    cols = [r[0] for r in con.execute(f"DESCRIBE {source_sql}", params).fetchall()]
+    missing = [k for k in key if k not in cols]
+    if missing:
+        raise ValueError(f"{table}: colunas da chave natural ausentes na origem: {missing}")
+    values = [c for c in cols if c not in key and c not in insert_only]
+    col_list = ", ".join(cols)
+    key_list = ", ".join(key)
+    if values:
+        set_clause = ", ".join(f"{c} = excluded.{c}" for c in values)
+        changed = " OR ".join(f"{table}.{c} IS DISTINCT FROM excluded.{c}" for c in values)
+        conflict = f"DO UPDATE SET {set_clause} WHERE {changed}"
+    else:
+        conflict = "DO NOTHING"
+    returning = "date" if "date" in cols else "NULL"
+    # ON CONFLICT no DuckDB aplica só uma das linhas repetidas no mesmo comando, sem erro
+    if dedupe_order:
+        dedupe = f"QUALIFY row_number() OVER (PARTITION BY {key_list} ORDER BY {dedupe_order}) = 1"
+    else:
+        dup = con.execute(
+            f"SELECT {key_list} FROM ({source_sql}) src GROUP BY ALL HAVING COUNT(*) > 1 LIMIT 1;", params
+        ).fetchone()
+        if dup:
+            raise ValueError(f"{table}: chave natural repetida na origem: {dict(zip(key, dup))}")
+        dedupe = ""
+    rows = con.execute(
+        f"""
+        INSERT INTO {table} ({col_list})
+        SELECT {col_list} FROM ({source_sql}) src
+        {dedupe}
+        ON CONFLICT ({key_list}) {conflict}
+        RETURNING {returning};
+        """,
+        params,
+    ).fetchall()
+    if rows:
+        log_changes(con, table, {r[0] for r in rows})
+    return len(rows)
+
+
+def delete_missing(
+    con: duckdb.DuckDBPyConnection,
+    table: str,
+    key: Sequence[str],
+    source_sql: str,
+    params: Optional[List[Any]] = None,
+    scope_sql: str = "TRUE",
+    scope_params: Optional[List[Any]] = None,
+) -> int:
+    """Remove de `table` (restrito a `scope_sql`) as chaves que não aparecem mais na origem.
+
+    Complementa `upsert` quando a origem é recalculada inteira para um escopo (datas, campanhas).
+    """
+    match = " AND ".join(f"src.{k} IS NOT DISTINCT FROM {table}.{k}" for k in key)
+    has_date = "date" in [r[0] for r in con.execute(f"DESCRIBE {table};").fetchall()]
+    rows = con.execute(
+        f"""
+        DELETE FROM {table}
+        WHERE ({scope_sql})
+          AND NOT EXISTS (SELECT 1 FROM ({source_sql}) src WHERE {match})
+        RETURNING {"date" if has_date else "NULL"};
+        """,
+        (scope_params or []) + (params or []),
+    ).fetchall()
+    if rows:
+        log_changes(con, table, {r[0] for r in rows})
+    return len(rows)
+
+
+# --- Log de mudanças (manutenção incremental das materializações) ---
+# Cada upsert/delete registra as datas afetadas. Tabelas sem coluna `date` (dim_video, rd_contact,
+# map_utm_campaign, ...) registram NULL, que obriga os consumidores delas a reconstruir tudo; só as
+# tabelas que o consumidor lê contam, e hoje a única entrada incremental sem data é
+# map_utm_campaign, cuja reimportação deve mesmo recalcular tudo. Linhas já consumidas por todos os
+# consumidores são apagadas por `prune_change_log`, chamada uma vez ao fim do DAG de refresh (e não
+# dentro das materializações, que rodam em paralelo e disputariam as mesmas linhas).
+
+def ensure_change_log(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute("CREATE SEQUENCE IF NOT EXISTS etl_change_seq;")
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS etl_change_log (
+            seq BIGINT DEFAULT nextval('etl_change_seq'),
+            table_name TEXT,
+            date DATE,
+            logged_at TIMESTAMP DEFAULT current_timestamp
+        );
+        """
+    )
+    con.execute("CREATE TABLE IF NOT EXISTS etl_watermark (consumer TEXT PRIMARY KEY, seq BIGINT);")
+
+
+def log_changes(con: duckdb.DuckDBPyConnection, table: str, dates: Iterable[Any]) -> None:
+    """Registra as datas alteradas em `table`. Data None significa mudança sem escopo de data
+    (reconstrução completa para quem lê `table`)."""
+    ensure_change_log(con)
+    values = sorted({str(d) if d is not None else None for d in dates}, key=lambda d: d or "")
+    if not values:
+        return
+    con.execute(
+        "INSERT INTO etl_change_log(table_name, date) SELECT ?, CAST(unnest(?) AS DATE);",
+        [table, values],
+    )
+
+
+def changes_since(
+    con: duckdb.DuckDBPyConnection, consumer: str, tables: Sequence[str]
+) -> Tuple[Optional[List[date]], int]:
+    """Datas alteradas em `tables` desde a última execução de `consumer`.
+
+    Retorna (datas, seq). `datas` é None quando o consumidor precisa de reconstrução completa:
+    primeira execução ou mudança sem escopo de data. `seq` deve ser passado a `advance_watermark`
+    após o commit da materialização.
+    """
+    ensure_change_log(con)
+    wm = con.execute("SELECT seq FROM etl_watermark WHERE consumer = ?;", [consumer]).fetchone()
+    max_seq = (con.execute("SELECT MAX(seq) FROM etl_change_log;").fetchone() or (None,))[0] or 0
+    if wm is None:
+        return None, max_seq
+    rows = con.execute(
+        """
+        SELECT DISTINCT date FROM etl_change_log
+        WHERE seq > ? AND seq <= ? AND table_name IN (SELECT unnest(?))
+        """,
+        [wm[0], max_seq, list(tables)],
+    ).fetchall()
+    if any(r[0] is None for r in rows):
+        return None, max_seq
+    return sorted(r[0] for r in rows), max_seq
+
+
+def warehouse_version(con: duckdb.DuckDBPyConnection) -> int:
+    """Versão do estado do warehouse: último seq do log de mudanças (0 se ainda não existe)."""
+    try:
+        return int((con.execute("SELECT MAX(seq) FROM etl_change_log;").fetchone() or (None,))[0] or 0)
+    except duckdb.CatalogException:
+        return 0
+
+
+def advance_watermark(con: duckdb.DuckDBPyConnection, consumer: str, seq: int) -> None:
+    ensure_change_log(con)
+    con.execute(
+        "INSERT INTO etl_watermark(consumer, seq) VALUES (?, ?) ON CONFLICT (consumer) DO UPDATE SET seq = excluded.seq;",
+        [consumer, seq],
+    )
+
+
+def prune_change_log(con: duckdb.DuckDBPyConnection) -> int:
+    """Apaga do log as linhas que todos os consumidores já processaram (seq <= menor watermark).
+
+    Roda em transação própria. A última linha é mantida: MAX(seq) é a versão do warehouse
+    (`warehouse_version`). Consumidores novos não dependem do histórico, pois a primeira execução é
+    sempre completa. Se outra conexão apagar as mesmas linhas ao mesmo tempo, desiste (retorna 0):
+    elas saem na próxima execução.
+    """
+    ensure_change_log(con)
+    con.execute("BEGIN TRANSACTION;")
+    try:
+        rows = con.execute(
+            """
+            DELETE FROM etl_change_log
+            WHERE seq <= (SELECT MIN(seq) FROM etl_watermark)
+              AND seq < (SELECT MAX(seq) FROM etl_change_log)
+            RETURNING seq;
+            """
+        ).fetchall()
+        con.execute("COMMIT;")
+    except duckdb.TransactionException:
+        con.execute("ROLLBACK;")
+        return 0
+    except Exception:
+        con.execute("ROLLBACK;")
+        raise
+    return len(rows)
+
+
+def upsert_dataset(
+    con: duckdb.DuckDBPyConnection,
+    dataset_id: str,
+    source_sql: str,
+    params: Optional[List[Any]] = None,
+    dedupe_order: Optional[str] = None,
+) -> int:
+    """Upsert na tabela do dataset usando a chave natural (e `insert_only`) declarada em datasets.yml."""
+    ds = get_dataset(dataset_id)
+    return upsert(
+        con, ds["table"], natural_key(dataset_id), source_sql, params, dedupe_order, ds.get("insert_only") or ()
+    )
+
+
+# --- Carga direta de Parquet (cache das APIs) ---
+
+def _column_type(ds: Dict[str, Any], col: str) -> str:
+    types = ds.get("types") or {}
+    if col in types:
+        return str(types[col])
+    if col == "date":
+        return "DATE"
+    return "TEXT" if col in (ds.get("dimensions") or []) else "BIGINT"
+
+
+def report_fields(dataset_id: str) -> Tuple[List[str], List[str]]:
+    """Campos da API (dimensões, métricas) que alimentam as colunas do dataset."""
+    ds = get_dataset(dataset_id)
+    fields = ds.get("source_fields") or {}
+    dims = [fields.get(c, c) for c in ds.get("dimensions") or []]
+    mets = [fields.get(c, c) for c in ds.get("metrics") or []]
+    return dims, mets
+
+
+def create_table_sql(dataset_id: str) -> str:
+    ds = get_dataset(dataset_id)
+    cols = list(ds.get("dimensions") or []) + list(ds.get("metrics") or [])
+    body = ", ".join(f"{c} {_column_type(ds, c)}" for c in cols)
+    return f"CREATE TABLE IF NOT EXISTS {ds['table']} ({body});"
+
+
+def parquet_projection(dataset_id: str) -> str:
+    """SELECT sobre `read_parquet(?)` com renomes/casts gerados a partir do dataset.
+
+    Agrupa pela chave natural: dimensões fora da chave (ex.: pageTitle) usam MAX, métricas SUM
+    (ou MAX se listadas em `non_additive`, como usuários). Casts são TRY_CAST, como os casts não
+    estritos de antes: um valor inválido vira NULL; linhas sem data válida são descartadas.
+    """
+    ds = get_dataset(dataset_id)
+    fields = ds.get("source_fields") or {}
+    key = natural_key(dataset_id)
+    non_additive = set(ds.get("non_additive") or [])
+    select: List[str] = []
+    where = "TRUE"
+    for c in ds.get("dimensions") or []:
+        src = f'"{fields.get(c, c)}"'
+        if c == "date":
+            expr = f"CAST(try_strptime(CAST({src} AS TEXT), '%Y%m%d') AS DATE)"
+            where = f"{expr} IS NOT NULL"
+        else:
+            expr = f"TRY_CAST({src} AS {_column_type(ds, c)})"
+        select.append(f"{expr if c in key else f'MAX({expr})'} AS {c}")
+    for c in ds.get("metrics") or []:
+        agg = "MAX" if c in non_additive else "SUM"
+        select.append(f'{agg}(TRY_CAST("{fields.get(c, c)}" AS {_column_type(ds, c)})) AS {c}')
+    group_by = ", ".join(str(i + 1) for i, c in enumerate(ds.get("dimensions") or []) if c in key)
+    return f"SELECT {', '.join(select)} FROM read_parquet(?) WHERE {where} GROUP BY {group_by}"
+
+
+def load_parquet_dataset(
+    con: duckdb.DuckDBPyConnection,
+    dataset_id: str,
+    parquet_path: Path,
+    window: Optional[Tuple[str, str]] = None,
+) -> Optional[int]:
+    """Ingere um Parquet do cache direto no warehouse (`INSERT ... SELECT ... FROM read_parquet`).
+
+    As linhas não passam pelo Python. Com `window` (início, fim), o arquivo é a verdade para essas
+    datas: chaves do warehouse que não vieram nele são removidas. Retorna None quando o cache está
+    vazio (o GA4Client grava um Parquet sem colunas para marcar respostas vazias); caso contrário,
+    linhas novas/alteradas/removidas.
+    """
+    import polars as pl
+
+    if not pl.read_parquet_schema(parquet_path):
+        return None
+    ds = get_dataset(dataset_id)
+    con.execute(create_table_sql(dataset_id))
+    src, params = parquet_projection(dataset_id), [str(parquet_path).replace("\\", "/")]
+    n = upsert_dataset(con, dataset_id, src, params)
+    if window:
+        n += delete_missing(
+            con, ds["table"], natural_key(dataset_id), src, params, "date BETWEEN ? AND ?", list(window)
+        )
+    return n
@@ -1,65 +1,149 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 from pathlib import Path
+from typing import Callable, Optional
 import uuid
 
 import duckdb
 import polars as pl
 
-from configs.settings import get_settings
-from integrations.youtube.client import YouTubeClient
+from configs.datasets import get_dataset
+from integrations.youtube.client import ReportSpec, YouTubeClient
+from services.warehouse import get_con, upsert_dataset
+
+
+# Relatórios de período único (sem paginação); novos recortes entram aqui e rodam em paralelo
+YT_REPORTS = [
+    ReportSpec("channel_daily", dimensions="day", sort="day"),
+]
 
 
 def _get_db_con():
-    s = get_settings()
-    db_path = s.data_dir / "warehouse" / "warehouse.duckdb"
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    return duckdb.connect(str(db_path))
+    # Mesma conexão de escrita do warehouse: roda também como job dentro do processo do dashboard
+    return get_con()
+
+
+def _upsert_video_period(con: duckdb.DuckDBPyConnection, df_vid: pl.DataFrame, start_s: str, end_s: str) -> int:
+    df_vid = df_vid.rename({"video": "videoId"}).with_columns([
+        pl.col("videoId").cast(pl.Utf8),
+        pl.col("views").cast(pl.Int64, strict=False),
+        pl.col("estimatedMinutesWatched").cast(pl.Int64, strict=False),
+        pl.col("averageViewDuration").cast(pl.Float64, strict=False),
+    ])
+    df_vid = df_vid.with_columns([
+        pl.lit(start_s).alias("startDate"),
+        pl.lit(end_s).alias("endDate"),
+    ])
+    tmp = f"_tmp_yt_vid_{uuid.uuid4().hex}"
+    con.register(tmp, df_vid.to_pandas())
+    try:
+        return upsert_dataset(
+            con,
+            "yt_video_period",
+            f"SELECT videoId, views, estimatedMinutesWatched, averageViewDuration, CAST(startDate AS DATE) AS startDate, CAST(endDate AS DATE) AS endDate FROM {tmp}",
+            # A paginação por views pode repetir um vídeo na fronteira entre páginas
+            dedupe_order="views DESC NULLS LAST",
+        )
+    finally:
+        con.unregister(tmp)
 
 
-def refresh_yt_channel_and_videos(days: int) -> str:
-    """Coleta duas visões suportadas pela YouTube Analytics API:
+def refresh_yt_channel_and_videos(days: int, on_step: Optional[Callable[[str], None]] = None) -> str:
+    """Coleta três visões suportadas pela YouTube Analytics API:
     - Canal diário (dimensions=day)
-    - Top vídeos no período (dimensions=video)
-    Materializa em fact_yt_channel_daily e fact_yt_video_period.
+    - Vídeos no período (dimensions=video), paginando todo o catálogo
+    - Diário por vídeo (dia × lote de vídeos) para os vídeos já conhecidos + top do período
+    Materializa em fact_yt_channel_daily, fact_yt_video_period e fact_yt_video_daily.
+    `on_step` recebe o nome de cada etapa para relatórios de progresso.
     """
+    step = on_step or (lambda _: None)
     end = date.today()
     start = end - timedelta(days=days)
     start_s, end_s = start.isoformat(), end.isoformat()
 
+    # Conexões de escrita curtas: o lock do warehouse nunca fica preso enquanto a API é consultada
+    con = _get_db_con()
+    try:
+        # Tabela canal diário
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fact_yt_channel_daily (
+                date DATE,
+                views BIGINT,
+                estimatedMinutesWatched BIGINT,
+                averageViewDuration DOUBLE
+            );
+            """
+        )
+        # Tabela top vídeos período
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fact_yt_video_period (
+                videoId TEXT,
+                views BIGINT,
+                estimatedMinutesWatched BIGINT,
+                averageViewDuration DOUBLE,
+                startDate DATE,
+                endDate DATE
+            );
+            """
+        )
+
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fact_yt_video_daily (
+                date DATE,
+                videoId TEXT,
+                views BIGINT,
+                estimatedMinutesWatched BIGINT,
+                averageViewDuration DOUBLE
+            );
+            """
+        )
+        # Vídeos já vistos em coletas anteriores também entram no diário por vídeo
+        known_ids = set()
+        for tbl in ("fact_yt_video_period", "fact_yt_video_daily"):
+            known_ids.update(r[0] for r in con.execute(f"SELECT DISTINCT videoId FROM {tbl};").fetchall())
+    finally:
+        con.close()
+
+    # Top vídeos no período (catálogo inteiro, paginado); cada página é gravada ao chegar
+    def write_page(page: pl.DataFrame) -> None:
+        page_con = _get_db_con()
+        page_con.execute("BEGIN TRANSACTION;")
+        try:
+            _upsert_video_period(page_con, page, start_s, end_s)
+            page_con.execute("COMMIT;")
+        except Exception:
+            page_con.execute("ROLLBACK;")
+            raise
+        finally:
+            page_con.close()
+
     yt = YouTubeClient.from_env()
-    # Canal diário
-    df_day = yt.fetch_channel_daily(start_s, end_s)
-    # Top vídeos no período
-    df_vid = yt.fetch_top_videos_period(start_s, end_s, max_results=50)
+    # Relatórios simples (canal diário, ...) rodam em segundo plano enquanto os vídeos são paginados;
+    # ao sair do `with` (inclusive por erro) a thread é aguardada, nunca fica chamando a API solta
+    with ThreadPoolExecutor(max_workers=1) as bg:
+        reports_future = bg.submit(yt.run_reports, YT_REPORTS, start_s, end_s)
+        try:
+            step("buscando vídeos do período")
+            df_vid = yt.fetch_top_videos_period(start_s, end_s, on_page=write_page)
 
-    con = _get_db_con()
-    # Tabela canal diário
-    con.execute(
-        """
-        CREATE TABLE IF NOT EXISTS fact_yt_channel_daily (
-            date DATE,
-            views BIGINT,
-            estimatedMinutesWatched BIGINT,
-            averageViewDuration DOUBLE
-        );
-        """
-    )
-    # Tabela top vídeos período
-    con.execute(
-        """
-        CREATE TABLE IF NOT EXISTS fact_yt_video_period (
-            videoId TEXT,
-            views BIGINT,
-            estimatedMinutesWatched BIGINT,
-            averageViewDuration DOUBLE,
-            startDate DATE,
-            endDate DATE
-        );
-        """
-    )
+            # Diário por vídeo: vídeos do período + vídeos já vistos em coletas anteriores
+            video_ids = set(df_vid["video"].cast(pl.Utf8).to_list()) if df_vid is not None and df_vid.height > 0 else set()
+            video_ids.update(known_ids)
+            step("buscando diário por vídeo")
+            df_vday = yt.fetch_video_daily(start_s, end_s, video_ids)
+            reports = reports_future.result()
+        except Exception:
+            reports_future.cancel()
+            raise
 
+    df_day = reports.get("channel_daily")
+    step("gravando canal e diário por vídeo")
+    con = _get_db_con()
     con.execute("BEGIN TRANSACTION;")
     try:
         if df_day is not None and df_day.height > 0:
@@ -71,33 +155,24 @@ def refresh_yt_channel_and_videos(days: int) -> str:
             ])
             tmp1 = f"_tmp_yt_day_{uuid.uuid4().hex}"
             con.register(tmp1, df_day.to_pandas())
-            con.execute(
-                "DELETE FROM fact_yt_channel_daily WHERE date BETWEEN ? AND ?;",
-                [start_s, end_s],
-            )
-            con.execute(
-                f"INSERT INTO fact_yt_channel_daily SELECT CAST(date AS DATE), views, estimatedMinutesWatched, averageViewDuration FROM {tmp1};"
+            upsert_dataset(
+                con,
+                "yt_channel_daily",
+                f"SELECT CAST(date AS DATE) AS date, views, estimatedMinutesWatched, averageViewDuration FROM {tmp1}",
             )
 
-        if df_vid is not None and df_vid.height > 0:
-            df_vid = df_vid.rename({"video": "videoId"}).with_columns([
-                pl.col("videoId").cast(pl.Utf8),
-                pl.col("views").cast(pl.Int64, strict=False),
-                pl.col("estimatedMinutesWatched").cast(pl.Int64, strict=False),
-                pl.col("averageViewDuration").cast(pl.Float64, strict=False),
-            ])
-            df_vid = df_vid.with_columns([
-                pl.lit(start_s).alias("startDate"),
-                pl.lit(end_s).alias("endDate"),
-            ])
-            tmp2 = f"_tmp_yt_vid_{uuid.uuid4().hex}"
-            con.register(tmp2, df_vid.to_pandas())
-            con.execute(
-                "DELETE FROM fact_yt_video_period WHERE startDate = ? AND endDate = ?;",
-                [start_s, end_s],
-            )
-            con.execute(
-                f"INSERT INTO fact_yt_video_period SELECT videoId, views, estimatedMinutesWatched, averageViewDuration, CAST(startDate AS DATE), CAST(endDate AS DATE) FROM {tmp2};"
+        if df_vday is not None and df_vday.height > 0:
+            tmp3 = f"_tmp_yt_vday_{uuid.uuid4().hex}"
+            con.register(tmp3, df_vday.to_pandas())
+            upsert_dataset(
+                con,
+                "yt_video_daily",
+                f"""
+                SELECT CAST(day AS DATE) AS date, CAST(video AS TEXT) AS videoId, CAST(views AS BIGINT) AS views,
+                       CAST(estimatedMinutesWatched AS BIGINT) AS estimatedMinutesWatched,
+                       CAST(averageViewDuration AS DOUBLE) AS averageViewDuration
+                FROM {tmp3}
+                """,
             )
 
         con.execute("COMMIT;")
@@ -106,6 +181,106 @@ def refresh_yt_channel_and_videos(days: int) -> str:
         con.close()
         raise
     con.close()
-    return f"YouTube: canal diário e top vídeos atualizados para {start_s}..{end_s}"
+    n_period = df_vid.height if df_vid is not None else 0
+    return (
+        f"YouTube: canal diário, vídeos no período ({n_period}) e diário por vídeo ({len(video_ids)} vídeos) "
+        f"atualizados para {start_s}..{end_s}"
+    )
 
 
+def ensure_dim_video(con: duckdb.DuckDBPyConnection) -> None:
+    """Cria dim_video (chave videoId). A versão antiga, chaveada só por título (import CSV), é
+    recriada: os títulos do GA4 continuam disponíveis em fact_events.video_title."""
+    cols = [r[0] for r in con.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = 'dim_video';"
+    ).fetchall()]
+    if cols and "videoId" not in cols:
+        con.execute("DROP TABLE dim_video;")
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS dim_video (
+            videoId TEXT,
+            title TEXT,
+            duration_sec BIGINT,
+            published_at TIMESTAMP,
+            fetched_at TIMESTAMP
+        );
+        """
+    )
+
+
+def enrich_dim_video(ttl_minutes: Optional[int] = None) -> str:
+    """Resolve título/duração/publicação dos vídeos presentes nos fatos do YouTube em dim_video.
+
+    Só consulta a Data API (videos.list, 50 IDs por chamada) para vídeos ausentes ou com
+    `fetched_at` mais antigo que o TTL (freshness_ttl_minutes do dataset yt_video_dim).
+    Vídeos não retornados (removidos/privados) são gravados sem título para não serem
+    consultados de novo antes do TTL.
+    """
+    ttl = ttl_minutes if ttl_minutes is not None else int(get_dataset("yt_video_dim").get("freshness_ttl_minutes") or 10080)
+    con = _get_db_con()
+    ensure_dim_video(con)
+    sources = []
+    for tbl in ("fact_yt_video_period", "fact_yt_video_daily"):
+        try:
+            con.execute(f"SELECT 1 FROM {tbl} LIMIT 0;")
+            sources.append(f"SELECT videoId FROM {tbl}")
+        except duckdb.CatalogException:
+            pass
+    if not sources:
+        con.close()
+        return "dim_video: nenhum fato do YouTube para enriquecer."
+    stale = [
+        r[0]
+        for r in con.execute(
+            f"""
+            SELECT DISTINCT f.videoId
+            FROM ({" UNION ".join(sources)}) f
+            LEFT JOIN dim_video d USING (videoId)
+            WHERE f.videoId IS NOT NULL
+              AND (d.videoId IS NULL OR d.fetched_at < current_timestamp - to_minutes(CAST(? AS BIGINT)))
+            """,
+            [ttl],
+        ).fetchall()
+    ]
+    if not stale:
+        con.close()
+        return "dim_video: todos os vídeos em cache (TTL vigente)."
+
+    try:
+        df = YouTubeClient.from_env().fetch_video_metadata(stale)
+    except Exception:
+        con.close()
+        raise
+    found = pl.DataFrame({"videoId": stale}, schema={"videoId": pl.Utf8})
+    if df.height > 0:
+        found = found.join(df, on="videoId", how="left")
+    else:
+        found = found.with_columns(
+            pl.lit(None, pl.Utf8).alias("title"),
+            pl.lit(None, pl.Int64).alias("duration_sec"),
+            pl.lit(None, pl.Utf8).alias("published_at"),
+        )
+
+    con.execute("BEGIN TRANSACTION;")
+    try:
+        tmp = f"_tmp_yt_meta_{uuid.uuid4().hex}"
+        con.register(tmp, found.to_pandas())
+        upsert_dataset(
+            con,
+            "yt_video_dim",
+            f"""
+            SELECT CAST(videoId AS TEXT) AS videoId, CAST(title AS TEXT) AS title,
+                   CAST(duration_sec AS BIGINT) AS duration_sec,
+                   CAST(published_at AS TIMESTAMP) AS published_at,
+                   current_timestamp::TIMESTAMP AS fetched_at
+            FROM {tmp}
+            """,
+        )
+        con.execute("COMMIT;")
+    except Exception:
+        con.execute("ROLLBACK;")
+        con.close()
+        raise
+    con.close()
+    return f"dim_video: {df.height} de {len(stale)} vídeos resolvidos via Data API"
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+import duckdb
+import pyarrow as pa
+import pytest
+
+from services.api_server import ARROW_MIME, ReadOnlyPool, make_api_server
+from services.warehouse import log_changes
+
+
+def _get(url: str, headers: dict | None = None):
+    req = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, dict(resp.headers), resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+@pytest.fixture()
+def api(tmp_path):
+    db = tmp_path / "wh.duckdb"
+    con = duckdb.connect(str(db))
+    con.execute("CREATE TABLE fact_sessions (date DATE, users BIGINT, sessions BIGINT, pageviews BIGINT);")
+    con.execute("INSERT INTO fact_sessions VALUES ('2024-01-01', 10, 12, 30), ('2024-01-02', 5, 6, 9);")
+    log_changes(con, "fact_sessions", [None])
+    con.close()
+    pool = ReadOnlyPool(db, idle_seconds=0.2)
+    srv = make_api_server(pool, port=0, gzip_min_bytes=10)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}", db, pool
+    srv.shutdown()
+    srv.server_close()
+    pool.close()
+
+
+def test_json_etag_revalidation_and_gzip(api) -> None:
+    base, db, pool = api
+    url = f"{base}/api/kpis?start_date=2024-01-01&end_date=2024-01-31"
+    status, headers, body = _get(url, {"Accept-Encoding": "gzip"})
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(body)) == {"users": 15.0, "sessions": 18.0, "pageviews": 39.0}
+    etag = headers["ETag"]
+
+    status, _, body = _get(url, {"If-None-Match": etag})
+    assert status == 304 and body == b""
+
+    # Novo commit no warehouse muda a versão e invalida o ETag
+    pool.close()
+    con = duckdb.connect(str(db))
+    log_changes(con, "fact_sessions", [None])
+    con.close()
+    status, headers, _ = _get(url, {"If-None-Match": etag})
+    assert status == 200 and headers["ETag"] != etag
+
+
+def test_arrow_stream_and_bad_requests(api) -> None:
+    base, _, _ = api
+    status, headers, body = _get(f"{base}/api/kpis?start_date=2024-01-01&end_date=2024-01-01", {"Accept": ARROW_MIME})
+    assert status == 200 and headers["Content-Type"] == ARROW_MIME
+    table = pa.ipc.open_stream(body).read_all()
+    assert table.to_pylist() == [{"users": 10.0, "sessions": 12.0, "pageviews": 30.0}]
+    assert _get(f"{base}/api/kpis?start_date=2024-01-01")[0] == 400
+    assert _get(f"{base}/api/nope")[0] == 404
+
+
+def test_dashboard_reads_while_api_holds_the_warehouse(tmp_path) -> None:
+    db = tmp_path / "warehouse" / "warehouse.duckdb"
+    db.parent.mkdir()
+    con = duckdb.connect(str(db))
+    con.execute("CREATE TABLE fact_sessions (date DATE, users BIGINT, sessions BIGINT, pageviews BIGINT);")
+    con.execute("INSERT INTO fact_sessions VALUES ('2024-01-01', 10, 12, 30);")
+    con.close()
+    pool = ReadOnlyPool(db, idle_seconds=60)
+    pool.acquire()
+    try:
+        # Outro processo (o dashboard) lendo pelo data_service enquanto a API mantém a conexão aberta
+        code = "from services.data_service import get_kpis; print(get_kpis('2024-01-01', '2024-01-31')['sessions'])"
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).resolve().parent.parent,
+            env={**os.environ, "DATA_DIR": str(tmp_path)},
+            capture_output=True,
+            text=True,
+        )
+        assert out.returncode == 0, out.stderr
+        assert out.stdout.strip() == "12.0"
+    finally:
+        pool.release()
+        pool.close()
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+from integrations.auth import CredentialManager
+
+
+def _manager(path, refresh) -> CredentialManager:
+    return CredentialManager(
+        path,
+        load=lambda p: json.loads(p.read_text(encoding="utf-8")),
+        refresh=refresh,
+        dump=json.dumps,
+        expires_at=lambda t: float(t["expires_at"]),
+    )
+
+
+def test_concurrent_refresh_is_single_flight_and_notifies(tmp_path) -> None:
+    path = tmp_path / "token.json"
+    path.write_text(json.dumps({"access_token": "old", "expires_at": time.time() + 10}), encoding="utf-8")
+    calls = []
+
+    def refresh(tok):
+        calls.append(tok["access_token"])
+        time.sleep(0.05)
+        return {"access_token": "new", "expires_at": time.time() + 3600}
+
+    mgr = _manager(path, refresh)
+    mgr._token = {"access_token": "old", "expires_at": time.time() + 10}
+    rotated = []
+    mgr.on_rotate(lambda t: rotated.append(t["access_token"]))
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(mgr.get()["access_token"])) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ["old"]
+    assert got == ["new"] * 8
+    assert rotated == ["new"]
+    assert json.loads(path.read_text(encoding="utf-8"))["access_token"] == "new"
+    assert not (tmp_path / "token.json.lock").exists()
+
+
+def test_token_rotated_by_another_process_is_reused(tmp_path) -> None:
+    path = tmp_path / "token.json"
+    mgr = _manager(path, lambda tok: (_ for _ in ()).throw(AssertionError("não deveria renovar")))
+    mgr._token = {"access_token": "old", "expires_at": time.time() + 10}
+    # Outro processo já gravou um token novo
+    path.write_text(json.dumps({"access_token": "other", "expires_at": time.time() + 3600}), encoding="utf-8")
+    assert mgr.get()["access_token"] == "other"
+
+
+def test_google_token_without_expiry_is_refreshed_once(tmp_path) -> None:
+    from types import SimpleNamespace
+
+    from integrations.auth import google_credentials
+
+    expires_at = google_credentials(tmp_path / "token.json")._expires_at
+    assert expires_at(SimpleNamespace(expiry=None, refresh_token="r")) == 0.0
+    # Sem refresh token não há o que renovar
+    assert expires_at(SimpleNamespace(expiry=None, refresh_token=None)) is None
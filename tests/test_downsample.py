@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+import numpy as np
+
+from services.downsample import downsample_rows, lttb_indices
+
+
+def test_lttb_keeps_endpoints_budget_and_spikes() -> None:
+    x = np.arange(5000, dtype=float)
+    y = np.sin(x / 200.0)
+    y[1234] = 50.0
+    y[3210] = -50.0
+    idx = lttb_indices(x, y, 300)
+    assert len(idx) == 300
+    assert idx[0] == 0 and idx[-1] == 4999
+    assert np.all(np.diff(idx) > 0)
+    assert 1234 in idx and 3210 in idx
+
+
+def test_downsample_rows_bounds_payload_per_metric() -> None:
+    start = date(2023, 1, 1)
+    rows = [
+        {"date": (start + timedelta(days=i)).isoformat(), "sessions": i % 97, "minutes": (i * 7) % 89}
+        for i in range(1500)
+    ]
+    out = downsample_rows(rows, "date", ["sessions", "minutes"], 200)
+    assert 200 <= len(out) <= 400
+    assert out[0] is rows[0] and out[-1] is rows[-1]
+    assert downsample_rows(rows[:50], "date", ["sessions"], 200) == rows[:50]
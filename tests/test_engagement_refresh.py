@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from datetime import date
+
+import duckdb
+
+from services import engagement_refresh
+from services.warehouse import log_changes
+
+
+def test_engagement_daily_keeps_to_dim_date(tmp_path, monkeypatch) -> None:
+    db = str(tmp_path / "wh.duckdb")
+    con = duckdb.connect(db)
+    con.execute("CREATE TABLE dim_date AS SELECT CAST(d AS DATE) AS date FROM (VALUES ('2024-01-01'), ('2024-01-02')) t(d);")
+    con.execute("CREATE TABLE fact_sessions (date DATE, users BIGINT, sessions BIGINT, pageviews BIGINT);")
+    # 2023-12-31 está nas fontes mas fora do calendário
+    con.execute("INSERT INTO fact_sessions VALUES ('2023-12-31', 1, 1, 1), ('2024-01-01', 5, 6, 9);")
+    con.execute(
+        "CREATE TABLE fact_yt_channel_daily (date DATE, views BIGINT, estimatedMinutesWatched BIGINT, averageViewDuration DOUBLE);"
+    )
+    con.close()
+    monkeypatch.setattr(engagement_refresh, "_get_con", lambda: duckdb.connect(db))
+
+    engagement_refresh.materialize_engagement_daily(full=True)
+    con = duckdb.connect(db)
+    assert con.execute("SELECT date, sessions FROM fact_engagement_daily ORDER BY date").fetchall() == [
+        (date(2024, 1, 1), 6),
+        (date(2024, 1, 2), 0),
+    ]
+    # Incremental: a data alterada fora de dim_date também é ignorada
+    con.execute("UPDATE fact_sessions SET sessions = 7 WHERE date = '2024-01-01';")
+    log_changes(con, "fact_sessions", ["2023-12-31", "2024-01-01"])
+    con.close()
+    engagement_refresh.materialize_engagement_daily()
+    con = duckdb.connect(db)
+    assert con.execute("SELECT date, sessions FROM fact_engagement_daily ORDER BY date").fetchall() == [
+        (date(2024, 1, 1), 7),
+        (date(2024, 1, 2), 0),
+    ]
+    con.close()
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from pathlib import Path
+import subprocess
+import sys
+
+
+ROOT = Path(__file__).resolve().parent.parent
+# Módulos importados na inicialização do dashboard
+BOOT_MODULES = [
+    "services.data_service",
+    "services.snapshots",
+    "services.jobs",
+    "services.report_service",
+    "integrations.slack.client",
+]
+HEAVY = ["google", "googleapiclient", "grpc", "requests", "polars", "numpy", "pyarrow", "pandas", "tenacity"]
+
+
+def test_boot_modules_do_not_import_heavy_sdks() -> None:
+    code = (
+        "import sys\n"
+        + "".join(f"import {m}\n" for m in BOOT_MODULES)
+        + f"print(','.join(sorted({{k.split('.')[0] for k in sys.modules}} & set({HEAVY!r}))))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
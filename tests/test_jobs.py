@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from services import jobs
+
+
+def test_identical_jobs_are_deduplicated_and_progress_is_persisted(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(jobs, "_jobs_dir", lambda: tmp_path)
+    release = threading.Event()
+    runs = []
+
+    def fake(ctx: jobs.JobContext, days: int) -> str:
+        runs.append(days)
+        ctx.step("buscando")
+        release.wait(5)
+        ctx.step("gravando")
+        return f"ok {days}"
+
+    monkeypatch.setitem(jobs.JOB_KINDS, "fake", fake)
+    first = jobs.submit_job("fake", days=7)
+    second = jobs.submit_job("fake", days=7)
+    assert second["id"] == first["id"]
+    other = jobs.submit_job("fake", days=14)
+    assert other["id"] != first["id"]
+
+    deadline = time.time() + 5
+    while (jobs.get_job(first["id"]) or {}).get("step") != "buscando" and time.time() < deadline:
+        time.sleep(0.01)
+    assert jobs.get_job(first["id"])["status"] == "running"
+    release.set()
+    while jobs.get_job(other["id"])["status"] != "done" and time.time() < deadline:
+        time.sleep(0.01)
+    done = jobs.get_job(first["id"])
+    assert done["status"] == "done" and done["message"] == "ok 7"
+    assert [s["name"] for s in done["steps"]] == ["buscando", "gravando"]
+    assert runs == [7, 14]
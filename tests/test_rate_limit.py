@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from email.utils import formatdate
+import time
+
+from integrations.rd.rate_limit import AdaptiveRateLimiter
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, secs: float) -> None:
+        self.now += secs
+
+
+def test_token_bucket_paces_after_burst() -> None:
+    clock = _FakeClock()
+    lim = AdaptiveRateLimiter(rate=2.0, burst=2, clock=clock, sleep=clock.sleep)
+    for _ in range(4):
+        lim.acquire()
+    # 2 tokens de rajada + 2 a 2/s
+    assert abs(clock.now - 1.0) < 1e-9
+
+
+def test_429_halves_rate_and_honours_retry_after_then_recovers() -> None:
+    clock = _FakeClock()
+    lim = AdaptiveRateLimiter(rate=8.0, burst=5, increase=1.0, max_rate=10.0, clock=clock, sleep=clock.sleep)
+    lim.observe(429, {"Retry-After": "3"})
+    assert lim.rate == 4.0
+    lim.acquire()
+    assert clock.now >= 3.0
+    for _ in range(10):
+        lim.observe(200, {})
+    assert lim.rate == 10.0
+
+
+def test_retry_after_accepts_http_date() -> None:
+    clock = _FakeClock()
+    lim = AdaptiveRateLimiter(rate=8.0, burst=5, clock=clock, sleep=clock.sleep)
+    lim.observe(429, {"Retry-After": formatdate(time.time() + 30, usegmt=True)})
+    lim.acquire()
+    # HTTP-date tem resolução de segundos
+    assert 28.0 <= clock.now <= 30.0
+    # Data já passada não pausa além do ritmo normal
+    clock.now = 0.0
+    lim = AdaptiveRateLimiter(rate=8.0, burst=5, clock=clock, sleep=clock.sleep)
+    lim.observe(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    lim.acquire()
+    assert clock.now <= 1.0
+
+
+def test_exhausted_quota_header_pauses_until_reset() -> None:
+    clock = _FakeClock()
+    lim = AdaptiveRateLimiter(rate=100.0, burst=5, clock=clock, sleep=clock.sleep)
+    lim.observe(200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "7"})
+    lim.acquire()
+    assert abs(clock.now - 7.0) < 1e-9
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+import pytest
+
+pytest.importorskip("requests")
+
+from integrations.rd.client import RDClient  # noqa: E402
+
+
+class _Resp:
+    def __init__(self, status_code: int, data: Dict[str, int] | None = None) -> None:
+        self.status_code = status_code
+        self.headers: Dict[str, str] = {}
+        self._data = data or {}
+
+    def json(self) -> Dict[str, int]:
+        return self._data
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+def test_metrics_template_kept_when_only_one_campaign_is_rejected(tmp_path, monkeypatch) -> None:
+    client = RDClient("id", "secret", discovery_path=tmp_path / "discovery.json")
+    known = f"{client.base_url}/marketing/email/campaigns/{{cid}}/metrics"
+    client._save_discovery("email_metrics", {"template": known})
+    calls: List[str] = []
+    # Campanha "gone" é recusada (400/404/422) pelos dois templates; "ok" responde no conhecido
+    responses = {"gone": _Resp(422), "ok": _Resp(200, {"sends": 3, "opens": 2, "clicks": 1})}
+
+    def fake_get(url: str, **_: object) -> _Resp:
+        calls.append(url)
+        return responses[url.split("/")[-2]]
+
+    monkeypatch.setattr(client, "_get", fake_get)
+    assert client.fetch_email_metrics("gone") == {"sends": 0, "opens": 0, "clicks": 0}
+    assert len(calls) == 2
+    # Na consulta condicional a recusa é distinta de 304 (validadores None): nada a gravar nem assentar
+    assert client.fetch_email_metrics_conditional("gone") == (None, None)
+    assert client._discovered("email_metrics")["value"]["template"] == known
+
+    calls.clear()
+    assert client.fetch_email_metrics("ok") == {"sends": 3, "opens": 2, "clicks": 1}
+    assert calls == [known.format(cid="ok")]
+
+    # Só quando a alternativa responde o template conhecido é substituído
+    other = f"{client.base_url}/platform/emails/campaigns/{{cid}}/metrics"
+    monkeypatch.setattr(client, "_get", lambda url, **_: _Resp(404) if "/marketing/" in url else _Resp(200))
+    client.fetch_email_metrics("moved")
+    assert client._discovered("email_metrics")["value"]["template"] == other
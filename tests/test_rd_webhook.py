@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from datetime import date
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import duckdb
+import pytest
+
+from services.rd_webhook import WebhookLog, flush_webhook_log, make_webhook_server
+
+
+def _post(url: str, body: dict) -> int:
+    req = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), method="POST")
+    req.add_header("Content-Type", "application/json")
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return resp.status
+
+
+def test_fake_sender_events_are_logged_and_flushed(tmp_path) -> None:
+    log = WebhookLog(tmp_path / "rd_webhook")
+    srv = make_webhook_server(log, port=0, secret="s3cr3t")
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}/rd/webhook"
+    lead = {
+        "uuid": "u1",
+        "email": "a@x.com",
+        "lead_stage": "Lead",
+        "last_conversion": {"created_at": "2024-03-01T10:00:00"},
+    }
+    try:
+        assert _post(f"{base}?type=conversion&token=s3cr3t", {"leads": [lead]}) == 202
+        # Reentrega do mesmo evento não duplica
+        assert _post(f"{base}?type=conversion&token=s3cr3t", {"leads": [lead]}) == 202
+        with pytest.raises(urllib.error.HTTPError):
+            _post(f"{base}?type=conversion", {"leads": [lead]})
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+    con = duckdb.connect(str(tmp_path / "wh.duckdb"))
+    assert flush_webhook_log(log, con) == 2
+    assert con.execute("SELECT COUNT(*), MIN(date) FROM fact_rd_webhook_event").fetchone() == (1, date(2024, 3, 1))
+    assert con.execute("SELECT contactId, stage FROM fact_rd_contact").fetchall() == [("u1", "Lead")]
+    assert list((tmp_path / "rd_webhook").glob("batch-*.jsonl")) == []
+    assert flush_webhook_log(log, con) == 0
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from services.refresh_dag import Node, run_dag
+
+
+def test_independent_nodes_run_concurrently_and_downstream_waits() -> None:
+    order: list[str] = []
+    lock = threading.Lock()
+
+    def work(name: str, secs: float):
+        def fn() -> str:
+            time.sleep(secs)
+            with lock:
+                order.append(name)
+            return name
+        return fn
+
+    nodes = [
+        Node("a", work("a", 0.2)),
+        Node("b", work("b", 0.2)),
+        Node("c", work("c", 0.0), deps=["a", "b"]),
+    ]
+    t0 = time.perf_counter()
+    results = run_dag(nodes, max_workers=4, record=False)
+    assert time.perf_counter() - t0 < 0.35
+    assert order[-1] == "c"
+    assert all(r.status == "ok" for r in results.values())
+
+
+def test_failure_is_recorded_without_blocking_dependents() -> None:
+    def boom() -> str:
+        raise RuntimeError("sem credenciais")
+
+    results = run_dag([Node("src", boom), Node("mat", lambda: "ok", deps=["src"])], record=False)
+    assert results["src"].status == "error"
+    assert "sem credenciais" in results["src"].message
+    assert results["mat"].status == "ok"
+
+
+def test_cycle_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        run_dag([Node("a", lambda: "", deps=["b"]), Node("b", lambda: "", deps=["a"])], record=False)
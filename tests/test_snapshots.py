@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import duckdb
+
+from services import snapshots
+from services.warehouse import log_changes
+
+
+def test_snapshot_served_for_default_window_until_warehouse_changes(tmp_path, monkeypatch) -> None:
+    db = str(tmp_path / "wh.duckdb")
+    monkeypatch.setattr(snapshots, "get_read_con", lambda: duckdb.connect(db, read_only=True))
+    monkeypatch.setattr(snapshots, "_snapshot_path", lambda: tmp_path / "snapshots" / "dashboard.json")
+    monkeypatch.setattr(snapshots, "VERSION_CHECK_SECONDS", 0.0)
+    calls = []
+
+    def kpis(s: str, e: str) -> dict:
+        calls.append((s, e))
+        return {"sessions": float(len(calls))}
+
+    monkeypatch.setattr(snapshots, "CARDS", {"kpis": kpis})
+    monkeypatch.setattr(snapshots, "GLOBAL_CARDS", {})
+    con = duckdb.connect(db)
+    log_changes(con, "fact_sessions", [None])
+    con.close()
+
+    snapshots.build_snapshots()
+    assert len(calls) == 4  # 7d, 28d, MTD, mês anterior
+    start_s, end_s = snapshots.default_windows()["7d"]
+    assert snapshots.load_card("kpis", start_s, end_s) == {"sessions": 1.0}
+    assert len(calls) == 4
+    # Período fora das janelas padrão: consulta ao vivo
+    snapshots.load_card("kpis", "2020-01-01", "2020-01-31")
+    assert len(calls) == 5
+
+    con = duckdb.connect(db)
+    log_changes(con, "fact_sessions", [None])
+    con.close()
+    snapshots.load_card("kpis", start_s, end_s)
+    assert len(calls) == 6
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from datetime import date
+
+import duckdb
+import pytest
+
+from configs.datasets import natural_key
+from services.warehouse import upsert
+
+
+def _con() -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect(":memory:")
+    con.execute("CREATE TABLE fact_x (date DATE, k TEXT, v BIGINT);")
+    return con
+
+
+SRC = "SELECT CAST(d AS DATE) AS date, k, CAST(v AS BIGINT) AS v FROM (VALUES (?, ?, ?), (?, ?, ?)) t(d, k, v)"
+
+
+def test_upsert_writes_only_new_or_changed_rows() -> None:
+    con = _con()
+    params = ["2024-01-01", "a", 1, "2024-01-02", "a", 2]
+    assert upsert(con, "fact_x", ["date", "k"], SRC, params) == 2
+    assert upsert(con, "fact_x", ["date", "k"], SRC, params) == 0
+    params[5] = 3
+    assert upsert(con, "fact_x", ["date", "k"], SRC, params) == 1
+    assert con.execute("SELECT COUNT(*), SUM(v) FROM fact_x").fetchone() == (2, 4)
+
+
+def test_upsert_collapses_legacy_duplicates() -> None:
+    con = _con()
+    con.execute("INSERT INTO fact_x VALUES ('2024-01-01', 'a', 1), ('2024-01-01', 'a', 1), ('2024-01-01', 'a', 1);")
+    upsert(con, "fact_x", ["date", "k"], SRC, ["2024-01-01", "a", 1, "2024-01-02", "b", 1])
+    assert con.execute("SELECT COUNT(*), SUM(v) FROM fact_x").fetchone() == (2, 2)
+
+
+def test_upsert_rejects_or_orders_duplicate_source_keys() -> None:
+    con = _con()
+    params = ["2024-01-01", "a", 1, "2024-01-01", "a", 2]
+    with pytest.raises(ValueError, match="chave natural repetida"):
+        upsert(con, "fact_x", ["date", "k"], SRC, params)
+    assert upsert(con, "fact_x", ["date", "k"], SRC, params, dedupe_order="v DESC") == 1
+    assert con.execute("SELECT v FROM fact_x").fetchall() == [(2,)]
+
+
+def test_upsert_insert_only_columns_do_not_count_as_changes() -> None:
+    con = _con()
+    assert upsert(con, "fact_x", ["k"], SRC, ["2024-01-01", "a", 1, "2024-01-01", "b", 1], insert_only=["date"]) == 2
+    assert upsert(con, "fact_x", ["k"], SRC, ["2024-01-02", "a", 1, "2024-01-02", "b", 2], insert_only=["date"]) == 1
+    rows = con.execute("SELECT k, CAST(date AS TEXT), v FROM fact_x ORDER BY k").fetchall()
+    assert rows == [("a", "2024-01-01", 1), ("b", "2024-01-01", 2)]
+
+
+def test_natural_key_from_datasets_yml() -> None:
+    assert natural_key("ga4_pages_daily") == ["date", "pagePath"]
+    assert natural_key("rd_email_campaign") == ["campaignId"]
+
+
+def test_load_parquet_dataset_renames_casts_and_groups(tmp_path) -> None:
+    import polars as pl
+
+    from services.warehouse import load_parquet_dataset
+
+    path = tmp_path / "ga4.parquet"
+    pl.DataFrame(
+        {
+            "date": ["20240101", "20240101", "20240102", "(other)"],
+            "pagePath": ["/a", "/a", "/a", "/a"],
+            "pageTitle": ["A", "A (old)", "A", "A"],
+            "screenPageViews": [3.0, 2.0, 1.0, 7.0],
+            "sessions": [1.0, 1.0, 1.0, 1.0],
+            "totalUsers": [1.0, 1.0, 1.0, 1.0],
+        }
+    ).write_parquet(path)
+    con = duckdb.connect(":memory:")
+    assert load_parquet_dataset(con, "ga4_pages_daily", path) == 2
+    # Pageviews somam entre títulos do mesmo path; usuários não (MAX); data inválida é descartada
+    rows = con.execute(
+        "SELECT CAST(date AS TEXT), screenPageViews, totalUsers FROM fact_ga4_pages_daily ORDER BY 1"
+    ).fetchall()
+    assert rows == [("2024-01-01", 5, 1), ("2024-01-02", 1, 1)]
+
+    # Página que sumiu da janela reconsultada é removida; fora da janela fica
+    pl.DataFrame(
+        {"date": ["20240102"], "pagePath": ["/b"], "pageTitle": ["B"],
+         "screenPageViews": [1.0], "sessions": [1.0], "totalUsers": [1.0]}
+    ).write_parquet(path)
+    assert load_parquet_dataset(con, "ga4_pages_daily", path, window=("2024-01-02", "2024-01-31")) == 2
+    rows = con.execute("SELECT CAST(date AS TEXT), pagePath FROM fact_ga4_pages_daily ORDER BY 1").fetchall()
+    assert rows == [("2024-01-01", "/a"), ("2024-01-02", "/b")]
+
+    empty = tmp_path / "empty.parquet"
+    pl.DataFrame().write_parquet(empty)
+    assert load_parquet_dataset(con, "ga4_pages_daily", empty) is None
+
+
+def test_change_log_pruned_after_all_consumers_advance() -> None:
+    from services.warehouse import advance_watermark, changes_since, log_changes, prune_change_log, warehouse_version
+
+    con = duckdb.connect(":memory:")
+    advance_watermark(con, "b", 0)
+    log_changes(con, "fact_x", ["2024-01-01", "2024-01-02"])
+    _, seq_a = changes_since(con, "a", ["fact_x"])
+    advance_watermark(con, "a", seq_a)
+    log_changes(con, "fact_x", ["2024-01-03"])
+    assert changes_since(con, "a", ["fact_x"])[0] == [date(2024, 1, 3)]
+    # "b" ainda não consumiu nada: nada é apagado
+    assert prune_change_log(con) == 0
+    assert con.execute("SELECT COUNT(*) FROM etl_change_log").fetchone() == (3,)
+
+    _, seq_b = changes_since(con, "b", ["fact_x"])
+    advance_watermark(con, "b", seq_b)
+    # Avançar o watermark não apaga nada por si só
+    assert con.execute("SELECT COUNT(*) FROM etl_change_log").fetchone() == (3,)
+    # Datas 01 e 02 já consumidas por ambos; a 03 ainda falta para "a"
+    assert prune_change_log(con) == 2
+    advance_watermark(con, "a", seq_b)
+    # A última linha fica mesmo consumida: é a versão do warehouse
+    assert prune_change_log(con) == 0
+    assert con.execute("SELECT COUNT(*) FROM etl_change_log").fetchone() == (1,)
+    assert warehouse_version(con) == seq_b
+    assert changes_since(con, "a", ["fact_x"])[0] == []
+
+
+def test_parallel_consumers_advance_watermarks_without_conflict(tmp_path) -> None:
+    from services.warehouse import advance_watermark, changes_since, log_changes, prune_change_log
+
+    db = duckdb.connect(str(tmp_path / "wh.duckdb"))
+    log_changes(db, "fact_x", ["2024-01-01"])
+    _, first = changes_since(db, "a", ["fact_x"])
+    advance_watermark(db, "a", first)
+    advance_watermark(db, "b", first)
+    log_changes(db, "fact_x", ["2024-01-02"])
+    _, seq = changes_since(db, "a", ["fact_x"])
+    # Duas materializações concorrentes, cada uma na sua conexão e transação; a linha de `first`
+    # já pode ser apagada, mas nenhuma das duas pode tentar apagá-la
+    con_a, con_b = db.cursor(), db.cursor()
+    con_a.execute("BEGIN TRANSACTION;")
+    con_b.execute("BEGIN TRANSACTION;")
+    advance_watermark(con_a, "a", seq)
+    advance_watermark(con_b, "b", seq)
+    con_a.execute("COMMIT;")
+    con_b.execute("COMMIT;")
+    assert db.execute("SELECT consumer, seq FROM etl_watermark ORDER BY consumer").fetchall() == [("a", seq), ("b", seq)]
+    assert prune_change_log(db) == 1
+    db.close()
+
+
+def test_create_table_sql_keeps_original_fact_sessions_column_order() -> None:
+    from services.warehouse import create_table_sql
+
+    assert create_table_sql("ga4_sessions_daily") == (
+        "CREATE TABLE IF NOT EXISTS fact_sessions (date DATE, pageviews BIGINT, sessions BIGINT, users BIGINT);"
+    )
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+import json
+from typing import Any, Dict, List
+
+from integrations.youtube.client import YT_TZ, YouTubeClient, _data_valid
+
+
+class _FakeReports:
+    def __init__(self, calls: List[List[str]]) -> None:
+        self.calls = calls
+        self.params: Dict[str, Any] = {}
+
+    def reports(self) -> "_FakeReports":
+        return self
+
+    def query(self, **params: Any) -> "_FakeReports":
+        # A API recusa relatórios dimensions=video sem sort e maxResults
+        assert params["sort"] == "-views"
+        assert params["maxResults"] == len(params["filters"][len("video==") :].split(","))
+        self.params = params
+        return self
+
+    def execute(self) -> Dict[str, Any]:
+        videos = self.params["filters"][len("video==") :].split(",")
+        self.calls.append(videos)
+        return {"rows": [[v, 10, 5, 30.0] for v in videos]}
+
+
+def test_settlement_uses_fetch_time_in_pacific_day() -> None:
+    day = date(2024, 1, 1)
+    day_end = datetime(2024, 1, 2, tzinfo=YT_TZ)
+    assert _data_valid(day_end + timedelta(hours=73), day, settle_hours=72, ttl_hours=6)
+    assert not _data_valid(day_end + timedelta(hours=10), day, settle_hours=72, ttl_hours=6)
+    assert _data_valid(datetime.now(timezone.utc), date.today(), settle_hours=72, ttl_hours=6)
+
+
+def test_video_daily_refetches_unsettled_rows_when_new_videos_join_the_shard(tmp_path, monkeypatch) -> None:
+    calls: List[List[str]] = []
+    client = YouTubeClient(cache_dir=tmp_path)
+    monkeypatch.setattr(client, "_yt_service", lambda: _FakeReports(calls))
+    day = "2024-01-01"
+
+    assert client.fetch_video_daily(day, day, ["a"]).height == 1
+    assert calls == [["a"]]
+    # Linha de "a" buscada antes de assentar e já fora do TTL
+    index_path = tmp_path / "video_daily" / f"{day}.ids.json"
+    early = datetime(2024, 1, 2, 10, tzinfo=YT_TZ).isoformat()
+    index_path.write_text(json.dumps({"a": early}), encoding="utf-8")
+
+    # Gravar "b" no shard não pode tornar "a" definitivo
+    assert client.fetch_video_daily(day, day, ["a", "b"]).height == 2
+    assert calls[1] == ["a", "b"]
+    # Agora ambas foram buscadas depois do assentamento: cache definitivo
+    assert client.fetch_video_daily(day, day, ["a", "b"]).height == 2
+    assert len(calls) == 2